@@ -0,0 +1,139 @@
+"""Partition notification by month
+
+Revision ID: 21461d5f3482
+Revises: 9ff1f682762a
+Create Date: 2026-10-17 05:02:51.348166
+
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '21461d5f3482'
+down_revision = '9ff1f682762a'
+branch_labels = None
+depends_on = None
+
+# Months created past the current one, app.core.partitions keeps this going
+MONTHS_AHEAD = 3
+
+COLUMNS = "type, message, reference_id, id, user_id, is_read, created_at"
+
+# Same triggers as 9ff1f682762a, its functions are kept
+TRIGGERS = {
+    "notification_counter_insert": ("INSERT", "NEW TABLE AS new_rows"),
+    "notification_counter_update": (
+        "UPDATE",
+        "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    ),
+    "notification_counter_delete": ("DELETE", "OLD TABLE AS old_rows"),
+}
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_table(partitioned):
+    pk = ['id', 'created_at'] if partitioned else ['id']
+    kw = {'postgresql_partition_by': 'RANGE (created_at)'} if partitioned else {}
+    op.create_table('notification',
+    sa.Column('type', postgresql.ENUM('MENTION', 'LIKE', name='notificationtype', create_type=False), nullable=False),
+    sa.Column('message', sqlmodel.sql.sqltypes.AutoString(length=500), nullable=False),
+    sa.Column('reference_id', sa.Uuid(), nullable=True),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('is_read', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=not partitioned),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint(*pk),
+    **kw
+    )
+
+
+def create_indexes():
+    op.create_index('ix_notification_user_id_created_at_id', 'notification', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_notification_user_id_unread', 'notification', ['user_id'], unique=False, postgresql_where=sa.text('NOT is_read'))
+
+
+def create_triggers():
+    for name, (event, referencing) in TRIGGERS.items():
+        op.execute(
+            f"""
+            CREATE TRIGGER {name} AFTER {event} ON notification
+            REFERENCING {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION {name}()
+            """
+        )
+
+
+def set_aside(name):
+    # Free the names of the table's constraint and indexes for the new table
+    op.rename_table('notification', name)
+    op.execute(f"ALTER TABLE {name} DROP CONSTRAINT notification_pkey")
+    op.execute(f"ALTER TABLE {name} DROP CONSTRAINT notification_user_id_fkey")
+    op.drop_index('ix_notification_user_id_created_at_id', table_name=name)
+    op.drop_index('ix_notification_user_id_unread', table_name=name)
+    for trigger in TRIGGERS:
+        op.execute(f"DROP TRIGGER {trigger} ON {name}")
+
+
+# Copies every notification, writers to the table wait until it commits. Run it
+# when a full copy of the table is acceptable
+def upgrade():
+    set_aside('notification_unpartitioned')
+    create_table(partitioned=True)
+
+    # From the oldest notification's month, rows outside every month land in
+    # the default partition
+    oldest = op.get_bind().execute(
+        sa.text("SELECT min(created_at) FROM notification_unpartitioned")
+    ).scalar()
+    today = datetime.now(timezone.utc).date()
+    month = (oldest.astimezone(timezone.utc).date() if oldest else today).replace(day=1)
+    last = add_months(today.replace(day=1), MONTHS_AHEAD)
+    while month <= last:
+        end = add_months(month, 1)
+        op.execute(
+            f"""
+            CREATE TABLE notification_p{month:%Y_%m} PARTITION OF notification
+            FOR VALUES FROM ('{month} 00:00+00') TO ('{end} 00:00+00')
+            """
+        )
+        month = end
+    op.execute("CREATE TABLE notification_default PARTITION OF notification DEFAULT")
+
+    # Rows created without a time get the migration's
+    op.execute(
+        f"""
+        INSERT INTO notification ({COLUMNS})
+        SELECT type, message, reference_id, id, user_id, is_read,
+               coalesce(created_at, now())
+        FROM notification_unpartitioned
+        """
+    )
+    op.drop_table('notification_unpartitioned')
+    # Indexes of the parent are created on every partition
+    create_indexes()
+    # After the copy, which moved rows without changing unread counts
+    create_triggers()
+
+
+def downgrade():
+    set_aside('notification_partitioned')
+    create_table(partitioned=False)
+    op.execute(
+        f"""
+        INSERT INTO notification ({COLUMNS})
+        SELECT {COLUMNS} FROM notification_partitioned
+        """
+    )
+    op.drop_table('notification_partitioned')
+    create_indexes()
+    create_triggers()
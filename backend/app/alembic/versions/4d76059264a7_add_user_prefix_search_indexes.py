@@ -0,0 +1,31 @@
+"""Add user prefix search indexes
+
+Revision ID: 4d76059264a7
+Revises: b14fd846578e
+Create Date: 2026-10-17 05:23:26.028298
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '4d76059264a7'
+down_revision = 'b14fd846578e'
+branch_labels = None
+depends_on = None
+
+
+# CONCURRENTLY keeps the table writable while the indexes build, it can't run in
+# a transaction. If a build fails, drop the INVALID index it leaves and rerun
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_user_email_prefix', 'user', [sa.literal_column('lower(email)').label('email')], unique=False, postgresql_ops={'email': 'text_pattern_ops'}, postgresql_concurrently=True)
+        op.create_index('ix_user_full_name_prefix', 'user', [sa.literal_column('lower(full_name)').label('full_name')], unique=False, postgresql_ops={'full_name': 'text_pattern_ops'}, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_full_name_prefix', table_name='user', postgresql_concurrently=True)
+        op.drop_index('ix_user_email_prefix', table_name='user', postgresql_concurrently=True)
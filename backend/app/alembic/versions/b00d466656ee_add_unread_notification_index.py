@@ -0,0 +1,29 @@
+"""Add unread notification index
+
+Revision ID: b00d466656ee
+Revises: fe9da676d714
+Create Date: 2026-10-17 04:43:02.582433
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b00d466656ee'
+down_revision = 'fe9da676d714'
+branch_labels = None
+depends_on = None
+
+
+# CONCURRENTLY keeps the table writable while the index builds, it can't run in
+# a transaction. If a build fails, drop the INVALID index it leaves and rerun
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_notification_user_id_unread', 'notification', ['user_id'], unique=False, postgresql_where=sa.text('NOT is_read'), postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_notification_user_id_unread', table_name='notification', postgresql_concurrently=True)
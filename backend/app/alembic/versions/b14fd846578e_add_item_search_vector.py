@@ -0,0 +1,32 @@
+"""Add item search vector
+
+Revision ID: b14fd846578e
+Revises: 21461d5f3482
+Create Date: 2026-10-17 05:18:24.314144
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'b14fd846578e'
+down_revision = '21461d5f3482'
+branch_labels = None
+depends_on = None
+
+
+# Adding a stored generated column rewrites item, blocking it meanwhile. The GIN
+# index is then built CONCURRENTLY, outside of a transaction, keeping it writable.
+# If the build fails, drop the INVALID index it leaves and rerun
+def upgrade():
+    op.add_column('item', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', coalesce(description, '')), 'B')", persisted=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_item_search_vector', 'item', ['search_vector'], unique=False, postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_item_search_vector', table_name='item', postgresql_using='gin', postgresql_concurrently=True)
+    op.drop_column('item', 'search_vector')
@@ -0,0 +1,36 @@
+"""Add keyset pagination indexes
+
+Revision ID: fe9da676d714
+Revises: e2583f9ff24f
+Create Date: 2026-10-17 04:38:08.537128
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'fe9da676d714'
+down_revision = 'e2583f9ff24f'
+branch_labels = None
+depends_on = None
+
+
+# CONCURRENTLY keeps the tables writable while the indexes build, it can't run in
+# a transaction. If a build fails it leaves an INVALID index, drop it and rerun;
+# the indexes that were built are skipped
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_item_created_at_id', 'item', ['created_at', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_item_owner_id_created_at_id', 'item', ['owner_id', 'created_at', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_notification_user_id_created_at_id', 'notification', ['user_id', 'created_at', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_user_created_at_id', 'user', ['created_at', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_created_at_id', table_name='user', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_notification_user_id_created_at_id', table_name='notification', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_item_owner_id_created_at_id', table_name='item', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_item_created_at_id', table_name='item', postgresql_concurrently=True, if_exists=True)
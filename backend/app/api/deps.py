@@ -1,52 +1,282 @@
-from collections.abc import Generator
+import hashlib
+import time
+import uuid
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
-from sqlmodel import Session
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.datastructures import Headers
 
+from app.api.profiling import timed_auth
+from app.api.replicas import COOKIE, HEADER, wrote_recently
 from app.core import security
+from app.core.cache import (
+    read_your_writes_cache,
+    token_cache,
+    token_version_cache,
+    user_cache,
+)
 from app.core.config import settings
-from app.core.db import engine
-from app.models import TokenPayload, User
+from app.core.db import async_engine, async_replicas, engine, replicas
+from app.models import Principal, TokenPayload, User
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 
 
-def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+def reads_from_replica(request: Request) -> bool:
+    """
+    GET and HEAD go to a replica unless the client wrote in the last
+    READ_YOUR_WRITES_SECONDS, other methods go to the primary and start that
+    window. The window is carried by the client in the cookie or header of
+    app.api.replicas, seen by every worker, and for clients sending neither
+    kept by this worker's cache.
+    """
+    if not settings.POSTGRES_REPLICA_SERVERS:
+        return False
+    user_id = get_bearer_user_id(request.headers)
+    if request.method not in ("GET", "HEAD"):
+        if user_id:
+            read_your_writes_cache.set(user_id, True)
+        return False
+    if wrote_recently(request.headers.get(HEADER)) or wrote_recently(
+        request.cookies.get(COOKIE)
+    ):
+        return False
+    return user_id is None or read_your_writes_cache.get(user_id) is None
+
+
+def get_bearer_user_id(headers: Headers) -> str | None:
+    """User id of a valid bearer token, checked through the token cache only."""
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return get_token_data(token).sub
+    except HTTPException:
+        return None
+
+
+def get_replica_session() -> Session | None:
+    """Session on a replica that accepted a connection, None if all are down."""
+    while (replica := replicas.choose()) is not None:
+        session = Session(replica)
+        try:
+            session.connection()
+        except OperationalError:
+            session.close()
+            replicas.mark_down(replica)
+        else:
+            return session
+    return None
+
+
+async def get_async_replica_session() -> AsyncSession | None:
+    while (replica := async_replicas.choose()) is not None:
+        session = AsyncSession(replica, expire_on_commit=False)
+        try:
+            await session.connection()
+        except OperationalError:
+            await session.close()
+            async_replicas.mark_down(replica)
+        else:
+            return session
+    return None
+
+
+def get_db(request: Request) -> Generator[Session, None, None]:
+    session = get_replica_session() if reads_from_replica(request) else None
+    with session or Session(engine) as session:
+        yield session
+
+
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    session = None
+    if reads_from_replica(request):
+        session = await get_async_replica_session()
+    # Objects are serialized after commit, expiring them would need lazy IO
+    async with session or AsyncSession(async_engine, expire_on_commit=False) as session:
         yield session
 
 
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def invalid_credentials() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Could not validate credentials",
+    )
+
+
+def get_token_data(token: str) -> TokenPayload:
+    # The same token arrives on every request of a session, skip the HMAC check
+    # and validation once it has been verified
+    key = hashlib.sha256(token.encode()).digest()
+    token_data = token_cache.get(key)
+    if token_data is not None:
+        return token_data
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
         token_data = TokenPayload(**payload)
     except (InvalidTokenError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate credentials",
-        )
-    user = session.get(User, token_data.sub)
+        raise invalid_credentials()
+    if "exp" in payload:
+        token_cache.set(key, token_data, ttl=payload["exp"] - time.time())
+    return token_data
+
+
+def check_user(user: User | None, token_data: TokenPayload) -> User:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    if token_data.ver is not None and token_data.ver != user.token_version:
+        # Revoked by a password, activation or privilege change
+        raise invalid_credentials()
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return user
 
 
+def get_cached_user(user_id: str | None) -> User | None:
+    """
+    Detached User rebuilt from user_cache, to be merged into the request session
+    with load=False so no SELECT is emitted.
+    """
+    data = user_cache.get(user_id) if user_id else None
+    if data is None:
+        return None
+    user = User(**data)
+    make_transient_to_detached(user)
+    return user
+
+
+def cache_user(user: User | None) -> None:
+    if user:
+        user_cache.set(str(user.id), user.model_dump(exclude={"hashed_password"}))
+
+
+def load_user(session: Session, token_data: TokenPayload) -> User:
+    cached_user = get_cached_user(token_data.sub)
+    user: User | None
+    if cached_user:
+        user = session.merge(cached_user, load=False)
+    else:
+        user = session.get(User, token_data.sub)
+        cache_user(user)
+    return check_user(user, token_data)
+
+
+async def load_user_async(session: AsyncSession, token_data: TokenPayload) -> User:
+    cached_user = get_cached_user(token_data.sub)
+    user: User | None
+    if cached_user:
+        user = await session.merge(cached_user, load=False)
+    else:
+        user = await session.get(User, token_data.sub)
+        cache_user(user)
+    return check_user(user, token_data)
+
+
+def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    with timed_auth():
+        return load_user(session, get_token_data(token))
+
+
+async def get_current_user_async(session: AsyncSessionDep, token: TokenDep) -> User:
+    with timed_auth():
+        return await load_user_async(session, get_token_data(token))
+
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+AsyncCurrentUser = Annotated[User, Depends(get_current_user_async)]
+
+
+def get_claims_principal(token_data: TokenPayload) -> Principal | None:
+    """Principal from the token claims, None for tokens issued without them."""
+    if token_data.ver is None or token_data.is_superuser is None:
+        return None
+    if token_data.is_active is False:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    try:
+        user_id = uuid.UUID(token_data.sub)
+    except (TypeError, ValueError):
+        raise invalid_credentials()
+    return Principal(id=user_id, is_superuser=token_data.is_superuser)
+
+
+def check_token_version(token_data: TokenPayload, version: int | None) -> None:
+    if version is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if version != token_data.ver:
+        raise invalid_credentials()
+
+
+def get_token_version(session: Session, user_id: uuid.UUID) -> int | None:
+    version = token_version_cache.get(str(user_id))
+    if version is None:
+        statement = select(User.token_version).where(User.id == user_id)
+        version = session.exec(statement).first()
+        if version is not None:
+            token_version_cache.set(str(user_id), version)
+    return version
+
+
+async def get_token_version_async(
+    session: AsyncSession, user_id: uuid.UUID
+) -> int | None:
+    version = token_version_cache.get(str(user_id))
+    if version is None:
+        statement = select(User.token_version).where(User.id == user_id)
+        version = (await session.exec(statement)).first()
+        if version is not None:
+            token_version_cache.set(str(user_id), version)
+    return version
+
+
+def get_current_principal(session: SessionDep, token: TokenDep) -> Principal:
+    """
+    Authorize read-only routes. Claims tokens only cost a cached token_version
+    lookup, other tokens fall back to loading the user.
+    """
+    with timed_auth():
+        token_data = get_token_data(token)
+        principal = get_claims_principal(token_data)
+        if principal is None:
+            user = load_user(session, token_data)
+            return Principal(id=user.id, is_superuser=user.is_superuser)
+        check_token_version(token_data, get_token_version(session, principal.id))
+        return principal
+
+
+async def get_current_principal_async(
+    session: AsyncSessionDep, token: TokenDep
+) -> Principal:
+    with timed_auth():
+        token_data = get_token_data(token)
+        principal = get_claims_principal(token_data)
+        if principal is None:
+            user = await load_user_async(session, token_data)
+            return Principal(id=user.id, is_superuser=user.is_superuser)
+        version = await get_token_version_async(session, principal.id)
+        check_token_version(token_data, version)
+        return principal
+
+
+CurrentPrincipal = Annotated[Principal, Depends(get_current_principal)]
+AsyncCurrentPrincipal = Annotated[Principal, Depends(get_current_principal_async)]
 
 
 def get_current_active_superuser(current_user: CurrentUser) -> User:
@@ -55,3 +285,7 @@ def get_current_active_superuser(current_user: CurrentUser) -> User:
             status_code=403, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+
+async def get_current_active_superuser_async(current_user: AsyncCurrentUser) -> User:
+    return get_current_active_superuser(current_user)
@@ -0,0 +1,60 @@
+import hashlib
+import uuid
+from collections.abc import Iterable
+from typing import Annotated, Any
+
+from fastapi import Header, HTTPException, Response
+
+IfNoneMatch = Annotated[str | None, Header()]
+IfMatch = Annotated[str | None, Header()]
+
+
+def entity_tag(id: uuid.UUID, version: int) -> str:
+    """
+    ETag of a row, changed by every update of it as the version is bumped by a
+    trigger. The id keeps rows served at the same URL, like /users/me, apart.
+    """
+    return f'"{id.hex}-{version}"'
+
+
+def list_tag(rows: Iterable[tuple[uuid.UUID, int]], *values: Any) -> str:
+    """ETag of a page of rows, given as (id, version), and values like counts."""
+    digest = hashlib.blake2b(repr((list(rows), values)).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def matches(header: str, tag: str, *, weak: bool) -> bool:
+    """
+    Whether an If-Match or If-None-Match header lists tag. The weak comparison
+    of If-None-Match ignores W/ prefixes, the strong one of If-Match never
+    matches weak tags.
+    """
+    if header.strip() == "*":
+        return True
+    tags = (t.strip() for t in header.split(","))
+    if weak:
+        return tag.removeprefix("W/") in (t.removeprefix("W/") for t in tags)
+    return not tag.startswith("W/") and tag in tags
+
+
+def not_modified(
+    response: Response, tag: str, if_none_match: str | None
+) -> Response | None:
+    """
+    Set the ETag of response, return a 304 to answer instead when the client
+    has it. Clients revalidate their copy each time, it is for their user only.
+    """
+    headers = {"ETag": tag, "Cache-Control": "private, no-cache"}
+    response.headers.update(headers)
+    if if_none_match is not None and matches(if_none_match, tag, weak=True):
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+def check_if_match(tag: str, if_match: str | None) -> None:
+    """Refuse a write when If-Match doesn't list tag, the row changed since."""
+    if if_match is not None and not matches(if_match, tag, weak=False):
+        raise HTTPException(
+            status_code=412,
+            detail="The resource was modified, its ETag no longer matches If-Match",
+        )
@@ -0,0 +1,133 @@
+import csv
+import io
+from collections.abc import AsyncIterator, Iterable, Iterator, Sequence
+from typing import Any, Literal
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic_core import to_json, to_jsonable_python
+from sqlalchemy import Row, Select, select
+from sqlmodel import Session, SQLModel, col
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.deps import (
+    get_async_replica_session,
+    get_replica_session,
+    reads_from_replica,
+)
+from app.core.config import settings
+from app.core.db import async_engine, engine
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES: dict[ExportFormat, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def select_public(model: Any, public: type[SQLModel]) -> Select[Any]:
+    """
+    The columns of the fields of public, newest first, as the list routes sort.
+    Plain rows skip building an ORM object and a public model per row.
+    """
+    columns = [col(getattr(model, name)) for name in public.model_fields]
+    return select(*columns).order_by(col(model.created_at).desc(), col(model.id).desc())
+
+
+def drain(buffer: io.StringIO) -> str:
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+class Writer:
+    """Serializes the batches of rows of an export in format."""
+
+    def __init__(self, format: ExportFormat) -> None:
+        self.format = format
+        self.buffer = io.StringIO()
+        self.csv = csv.writer(self.buffer)
+
+    def header(self, keys: Iterable[str]) -> None:
+        # Sent with the first batch, or by end for an empty CSV export
+        if self.format == "csv":
+            self.csv.writerow(keys)
+
+    def rows(self, rows: Sequence[Row[Any]]) -> str:
+        # Serialized as the list routes serialize the public models
+        values = [to_jsonable_python(row._asdict()) for row in rows]
+        if self.format == "csv":
+            self.csv.writerows(value.values() for value in values)
+        else:
+            self.buffer.writelines(to_json(value).decode() + "\n" for value in values)
+        return drain(self.buffer)
+
+    def end(self) -> str:
+        return drain(self.buffer)
+
+
+def stream_rows(
+    statement: Select[Any], format: ExportFormat, replica: bool
+) -> Iterator[str]:
+    """
+    Rows of statement in format, a batch of EXPORT_BATCH_SIZE at a time from a
+    server-side cursor so memory stays flat. Opens its own session, on a replica
+    if replica and one is up, the request's is closed before the response is
+    streamed.
+    """
+    session = get_replica_session() if replica else None
+    with session or Session(engine) as session:
+        result = session.execute(
+            statement, execution_options={"yield_per": settings.EXPORT_BATCH_SIZE}
+        )
+        writer = Writer(format)
+        writer.header(result.keys())
+        for rows in result.partitions():
+            yield writer.rows(rows)
+        if end := writer.end():
+            yield end
+
+
+async def stream_rows_async(
+    statement: Select[Any], format: ExportFormat, replica: bool
+) -> AsyncIterator[str]:
+    """stream_rows on the async engines, for DB_ASYNC."""
+    session = await get_async_replica_session() if replica else None
+    async with session or AsyncSession(async_engine) as session:
+        result = await session.stream(
+            statement, execution_options={"yield_per": settings.EXPORT_BATCH_SIZE}
+        )
+        writer = Writer(format)
+        writer.header(result.keys())
+        async for rows in result.partitions():
+            yield writer.rows(rows)
+        if end := writer.end():
+            yield end
+
+
+def export_response(
+    request: Request, statement: Select[Any], format: ExportFormat, name: str
+) -> StreamingResponse:
+    """Stream the export from a replica as the other GETs read, or the primary."""
+    rows = stream_rows(statement, format, reads_from_replica(request))
+    return streaming_response(rows, format, name)
+
+
+def export_response_async(
+    request: Request, statement: Select[Any], format: ExportFormat, name: str
+) -> StreamingResponse:
+    """export_response for the async routes."""
+    rows = stream_rows_async(statement, format, reads_from_replica(request))
+    return streaming_response(rows, format, name)
+
+
+def streaming_response(
+    rows: Iterator[str] | AsyncIterator[str], format: ExportFormat, name: str
+) -> StreamingResponse:
+    return StreamingResponse(
+        rows,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'},
+    )
@@ -1,15 +1,30 @@
 from fastapi import APIRouter
 
-from app.api.routes import items, login, private, users, utils
+from app.api.routes import (
+    items,
+    items_async,
+    login,
+    private,
+    users,
+    users_async,
+    utils,
+)
 from app.core.config import settings
-from app.routers import notifications
+from app.routers import notifications, notifications_async
 
 api_router = APIRouter()
 api_router.include_router(login.router)
-api_router.include_router(users.router)
+if settings.DB_ASYNC:
+    api_router.include_router(users_async.router)
+else:
+    api_router.include_router(users.router)
 api_router.include_router(utils.router)
-api_router.include_router(items.router)
-api_router.include_router(notifications.router)
+if settings.DB_ASYNC:
+    api_router.include_router(items_async.router)
+    api_router.include_router(notifications_async.router)
+else:
+    api_router.include_router(items.router)
+    api_router.include_router(notifications.router)
 
 
 if settings.ENVIRONMENT == "local":
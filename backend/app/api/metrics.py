@@ -0,0 +1,150 @@
+import secrets
+import time
+from typing import Annotated
+
+from anyio import to_thread
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api.profiling import TimedRoute
+from app.core.config import settings
+from app.core.db import get_engines, get_pool_stats
+from app.core.metrics import registry
+from app.websockets.notifications import manager
+
+# Route label of requests no route matched, e.g. 404s and rate limited ones,
+# rather than their paths
+UNMATCHED = "unmatched"
+
+request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to send the whole response, by route and method.",
+)
+requests_total = registry.counter(
+    "http_requests_total", "Requests answered, by route, method and status."
+)
+request_errors_total = registry.counter(
+    "http_request_errors_total",
+    "Requests answered with a 5xx or failed, by route and method.",
+)
+requests_in_progress = registry.gauge(
+    "http_requests_in_progress", "Requests being handled."
+)
+threadpool_borrowed = registry.gauge(
+    "threadpool_tokens_borrowed",
+    "Threads running sync routes and dependencies, of threadpool_tokens_total.",
+    per_worker=True,
+)
+threadpool_total = registry.gauge(
+    "threadpool_tokens_total", "Size of the worker's threadpool.", per_worker=True
+)
+threadpool_waiting = registry.gauge(
+    "threadpool_tasks_waiting", "Calls waiting for a free thread.", per_worker=True
+)
+pool_size = registry.gauge("db_pool_size", "Connections kept by the pool, by engine.")
+pool_connections = registry.gauge(
+    "db_pool_connections", "Connections by engine and state: checked_out or idle."
+)
+pool_overflow = registry.gauge(
+    "db_pool_overflow", "Connections opened past the pool size, by engine."
+)
+pool_checkouts = registry.counter(
+    "db_pool_checkouts_total", "Connections checked out, by engine."
+)
+pool_timeouts = registry.counter(
+    "db_pool_timeouts_total", "Checkouts that timed out waiting, by engine."
+)
+pool_wait = registry.counter(
+    "db_pool_wait_seconds_total", "Time checkouts waited for a connection."
+)
+websocket_connections = registry.gauge(
+    "websocket_connections", "Open notification WebSockets.", per_worker=True
+)
+
+
+def collect_threadpool() -> None:
+    limiter = to_thread.current_default_thread_limiter()
+    threadpool_borrowed.set(limiter.borrowed_tokens)
+    threadpool_total.set(limiter.total_tokens)
+    threadpool_waiting.set(limiter.statistics().tasks_waiting)
+
+
+def collect_db_pools() -> None:
+    for name, engine in get_engines().items():
+        stats = get_pool_stats(engine)
+        pool_size.set(stats.pool_size, engine=name)
+        pool_connections.set(stats.checked_out, engine=name, state="checked_out")
+        pool_connections.set(stats.idle, engine=name, state="idle")
+        pool_overflow.set(stats.overflow, engine=name)
+        pool_checkouts.set(stats.checkouts, engine=name)
+        pool_timeouts.set(stats.timeouts, engine=name)
+        pool_wait.set(stats.wait_seconds_avg * stats.checkouts, engine=name)
+
+
+def collect_websockets() -> None:
+    websocket_connections.set(
+        sum(len(connections) for connections in manager.active_connections.values())
+    )
+
+
+registry.collectors += [collect_threadpool, collect_db_pools, collect_websockets]
+
+
+class MetricsMiddleware:
+    """Count and time every HTTP request, labelled by its route's unique id."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        # Unhandled exceptions are answered with a 500 further out
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_progress.dec()
+            # Routing adds the matched route to scope
+            route = getattr(scope.get("route"), "unique_id", UNMATCHED)
+            method = scope["method"]
+            request_duration.observe(
+                time.perf_counter() - started, route=route, method=method
+            )
+            requests_total.inc(route=route, method=method, status=str(status))
+            if status >= 500:
+                request_errors_total.inc(route=route, method=method)
+
+
+router = APIRouter(tags=["metrics"], route_class=TimedRoute)
+
+
+@router.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+async def metrics(authorization: Annotated[str | None, Header()] = None) -> str:
+    """
+    Prometheus metrics of all the workers, see app.core.metrics. Open without
+    METRICS_TOKEN in local development only.
+    """
+    if settings.METRICS_TOKEN is None:
+        if settings.ENVIRONMENT != "local":
+            raise HTTPException(status_code=401, detail="METRICS_TOKEN is not set")
+    elif not secrets.compare_digest(
+        authorization or "", f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    registry.collect()
+    # Writing and compacting METRICS_DIR waits on the lock other workers hold,
+    # off the event loop
+    return await to_thread.run_sync(registry.render)
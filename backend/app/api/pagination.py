@@ -0,0 +1,130 @@
+import base64
+import uuid
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Annotated, Any, NamedTuple, TypeVar
+
+from fastapi import HTTPException, Query
+from sqlalchemy import BigInteger, ColumnElement, Select, cast, column, table, tuple_
+from sqlalchemy.dialects.postgresql import REGCLASS
+from sqlmodel import col, func, select
+
+from app.core.config import settings
+
+S = TypeVar("S", bound=Select[Any])
+
+# Page size of the list routes, capped as the whole page is held in memory
+Limit = Annotated[int, Query(ge=1, le=settings.PAGE_LIMIT_MAX)]
+
+
+class Cursor(NamedTuple):
+    created_at: datetime
+    id: uuid.UUID
+
+
+# Position in search results, ordered by rank
+class RankCursor(NamedTuple):
+    rank: float
+    id: uuid.UUID
+
+
+def _encode(key: str, id: uuid.UUID) -> str:
+    raw = f"{key}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> tuple[str, uuid.UUID]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    key, _, id = raw.partition("|")
+    return key, uuid.UUID(id)
+
+
+def encode_cursor(created_at: datetime, id: uuid.UUID) -> str:
+    return _encode(created_at.isoformat(), id)
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        created_at, id = _decode(cursor)
+        return Cursor(datetime.fromisoformat(created_at), id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_rank_cursor(rank: float, id: uuid.UUID) -> str:
+    # repr round-trips the float exactly
+    return _encode(repr(rank), id)
+
+
+def decode_rank_cursor(cursor: str) -> RankCursor:
+    try:
+        rank, id = _decode(cursor)
+        return RankCursor(float(rank), id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def exact_count(model: Any, *whereclause: Any) -> ColumnElement[int]:
+    return select(func.count()).select_from(model).where(*whereclause).scalar_subquery()
+
+
+def estimated_count(model: Any) -> ColumnElement[int]:
+    """
+    Row count of the whole table from the planner statistics autovacuum keeps,
+    instead of scanning it. Exact until the table has been analyzed once.
+    """
+    pg_class = table("pg_class", column("oid"), column("reltuples"))
+    reltuples = (
+        select(cast(pg_class.c.reltuples, BigInteger))
+        .where(pg_class.c.oid == cast(f'"{model.__tablename__}"', REGCLASS))
+        .where(pg_class.c.reltuples >= 0)
+        .scalar_subquery()
+    )
+    return func.coalesce(reltuples, exact_count(model))
+
+
+def paginate(
+    statement: S,
+    model: Any,
+    *,
+    cursor: str | None,
+    skip: int,
+    limit: int,
+) -> S:
+    """
+    Newest first page of statement. With a cursor, the rows after it are read
+    from the (created_at, id) index, without counting past skipped rows. One
+    extra row is fetched to tell if there is a next page, see get_page.
+
+    Count columns added to statement are computed once, in the same round trip.
+    """
+    statement = statement.order_by(col(model.created_at).desc(), col(model.id).desc())
+    if cursor:
+        after = decode_cursor(cursor)
+        statement = statement.where(
+            tuple_(col(model.created_at), col(model.id)) < tuple(after),
+            # Implied by the above, but spelled out the planner can skip the
+            # partitions of later months
+            col(model.created_at) <= after.created_at,
+        )
+    else:
+        statement = statement.offset(skip)
+    return statement.limit(limit + 1)
+
+
+def get_page(
+    rows: Sequence[Any], limit: int, *, counts: int = 0
+) -> tuple[list[Any], str | None, tuple[int, ...] | None]:
+    """
+    Rows of a paginate() statement with the cursor of the next page, if any, and
+    the values of its count columns, None if it had none or the page is empty.
+    """
+    count_values = None
+    if counts:
+        count_values = tuple(rows[0][1:]) if rows else None
+        rows = [row[0] for row in rows]
+    data = list(rows[:limit])
+    if len(rows) <= limit or not data:
+        return data, None, count_values
+    last: Any = data[-1]
+    return data, encode_cursor(last.created_at, last.id), count_values
@@ -0,0 +1,134 @@
+import asyncio
+import functools
+import time
+from collections.abc import Callable, Coroutine, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.db import QueryStats, current_query_stats
+
+
+@dataclass
+class RequestTimings:
+    auth: float = 0.0
+    # perf_counter() when the endpoint returned, the rest until the response
+    # starts is serializing it
+    endpoint_returned: float | None = None
+
+
+current_timings: ContextVar[RequestTimings | None] = ContextVar(
+    "current_timings", default=None
+)
+
+
+@contextmanager
+def timed_auth() -> Iterator[None]:
+    """Add the block's time to the request's auth timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current_timings.get()
+        if timings is not None:
+            timings.auth += time.perf_counter() - started
+
+
+def record_endpoint_returned() -> None:
+    timings = current_timings.get()
+    if timings is not None:
+        timings.endpoint_returned = time.perf_counter()
+
+
+class TimedRoute(APIRoute):
+    """APIRoute recording when its endpoint returns, for the serialize timing."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        call = self.dependant.call
+        assert call is not None
+        wrapper: Callable[..., Any]
+        if asyncio.iscoroutinefunction(call):
+
+            @functools.wraps(call)
+            async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    record_endpoint_returned()
+
+        else:
+
+            @functools.wraps(call)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    record_endpoint_returned()
+
+        # The handler calls dependant.call, after the parameters were read from
+        # the endpoint's own signature
+        self.dependant.call = wrapper
+        return super().get_route_handler()
+
+
+def server_timing(
+    stats: QueryStats, timings: RequestTimings, *, started: float, now: float
+) -> str:
+    entries = [
+        f"auth;dur={timings.auth * 1000:.1f}",
+        f'db;dur={stats.seconds * 1000:.1f};desc="{stats.statements} queries"',
+    ]
+    if timings.endpoint_returned is not None:
+        entries.append(f"serialize;dur={(now - timings.endpoint_returned) * 1000:.1f}")
+    entries.append(f"total;dur={(now - started) * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class ProfilingMiddleware:
+    """
+    Count the SQL statements of each request and the time they took, and time
+    its authentication and serialization.
+
+    With SERVER_TIMING_ENABLED the times go out in a Server-Timing header, with
+    ENVIRONMENT=local the counts also in X-DB-Queries and X-DB-Time-Ms.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        # Routing adds the matched route to scope, slow queries are tagged with it
+        stats = QueryStats(scope=scope)
+        timings = RequestTimings()
+        stats_token = current_query_stats.set(stats)
+        timings_token = current_timings.set(timings)
+
+        async def send_with_timings(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if settings.SERVER_TIMING_ENABLED:
+                    headers["Server-Timing"] = server_timing(
+                        stats, timings, started=started, now=time.perf_counter()
+                    )
+                if settings.ENVIRONMENT == "local":
+                    headers["X-DB-Queries"] = str(stats.statements)
+                    headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.1f}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            current_query_stats.reset(stats_token)
+            current_timings.reset(timings_token)
@@ -0,0 +1,320 @@
+import hashlib
+import ipaddress
+import logging
+import math
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Literal, Protocol
+from urllib.parse import parse_qs
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api.deps import get_bearer_user_id
+from app.core.config import settings
+from app.core.db import async_engine
+
+logger = logging.getLogger(__name__)
+
+# Login forms are tiny, larger bodies are passed through without an email key
+MAX_FORM_BYTES = 16 * 1024
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Token bucket allowing bursts of capacity, refilled over period seconds."""
+
+    key: Literal["ip", "user", "email"]
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+@dataclass(frozen=True)
+class Policy:
+    name: str
+    method: str
+    # Matched against the whole path, an "email" group is used for email limits,
+    # otherwise the "username" field of a login form
+    path: re.Pattern[str]
+    limits: tuple[Limit, ...]
+
+
+API = re.escape(settings.API_V1_STR)
+
+POLICIES = (
+    Policy(
+        "login",
+        "POST",
+        re.compile(f"{API}/login/access-token"),
+        (Limit("ip", 20, 60), Limit("email", 5, 60)),
+    ),
+    Policy(
+        "password-recovery",
+        "POST",
+        re.compile(f"{API}/password-recovery/(?P<email>[^/]+)"),
+        (Limit("ip", 5, 60), Limit("email", 3, 3600)),
+    ),
+    Policy(
+        "reset-password",
+        "POST",
+        re.compile(f"{API}/reset-password/"),
+        (Limit("ip", 10, 60),),
+    ),
+    Policy(
+        "signup",
+        "POST",
+        re.compile(f"{API}/users/signup"),
+        (Limit("ip", 5, 60),),
+    ),
+    Policy(
+        "update-password",
+        "PATCH",
+        re.compile(f"{API}/users/me/password"),
+        (Limit("user", 5, 60),),
+    ),
+    Policy(
+        "user-search",
+        "GET",
+        re.compile(f"{API}/users/search"),
+        # A keystroke a second while typing mentions, not a walk of every prefix
+        (Limit("user", 60, 60),),
+    ),
+    Policy(
+        "test-email",
+        "POST",
+        re.compile(f"{API}/utils/test-email/"),
+        (Limit("user", 5, 60),),
+    ),
+)
+
+
+class RateLimitBackend(Protocol):
+    async def take(self, key: str, limit: Limit) -> float:
+        """Take a token, return 0 when allowed, else seconds until one is free."""
+        ...
+
+
+class MemoryBackend:
+    """Buckets in this worker's memory, the least recently used are evicted."""
+
+    def __init__(self, *, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, limit: Limit) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0.0 if allowed else (1 - tokens) / limit.rate
+
+
+# Refill and take in a single statement, the row lock taken by ON CONFLICT makes
+# concurrent takes on the same key queue up instead of racing
+TAKE_TOKEN = text(
+    """
+    INSERT INTO ratelimitbucket AS b (key, tokens, allowed, updated_at, expires_at)
+    VALUES (
+        :key, :capacity - 1, true, now(), now() + make_interval(secs => :period)
+    )
+    ON CONFLICT (key) DO UPDATE SET
+        (tokens, allowed, updated_at, expires_at) = (
+            SELECT
+                CASE WHEN refill.tokens >= 1
+                    THEN refill.tokens - 1 ELSE refill.tokens END,
+                refill.tokens >= 1,
+                now(),
+                now() + make_interval(secs => :period)
+            FROM (
+                SELECT least(
+                    :capacity,
+                    b.tokens
+                    + extract(epoch FROM now() - b.updated_at)::float8 * :rate
+                ) AS tokens
+            ) AS refill
+        )
+    RETURNING tokens, allowed
+    """
+)
+
+# A bucket untouched for its whole period is full again, its row can go
+PRUNE_BUCKETS = text("DELETE FROM ratelimitbucket WHERE expires_at < now()")
+
+
+class PostgresBackend:
+    """
+    Buckets in the UNLOGGED ratelimitbucket table, shared by every worker and
+    host. Fails open: a database error lets the request through.
+    """
+
+    def __init__(self, *, prune_probability: float = 0.001) -> None:
+        self.prune_probability = prune_probability
+
+    async def take(self, key: str, limit: Limit) -> float:
+        params = {
+            "key": key,
+            "capacity": float(limit.capacity),
+            "period": float(limit.period),
+            "rate": limit.rate,
+        }
+        try:
+            async with async_engine.begin() as conn:
+                tokens, allowed = (await conn.execute(TAKE_TOKEN, params)).one()
+                if random.random() < self.prune_probability:
+                    await conn.execute(PRUNE_BUCKETS)
+        except SQLAlchemyError:
+            logger.exception("Rate limit backend failed, allowing request")
+            return 0.0
+        return 0.0 if allowed else (1 - tokens) / limit.rate
+
+
+def get_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "postgres":
+        return PostgresBackend()
+    return MemoryBackend()
+
+
+backend = get_backend()
+
+
+def bucket_key(policy: Policy, limit: Limit, value: str) -> str:
+    """
+    Key of the bucket of value. Values are hashed, client supplied emails can be
+    long enough to overflow ratelimitbucket.key and make the backend fail open.
+    """
+    digest = hashlib.sha256(value.encode()).hexdigest()
+    return f"{policy.name}:{limit.key}:{digest}"
+
+
+def match_policy(method: str, path: str) -> tuple[Policy, re.Match[str]] | None:
+    for policy in POLICIES:
+        if policy.method == method:
+            match = policy.path.fullmatch(path)
+            if match:
+                return policy, match
+    return None
+
+
+async def read_body(receive: Receive) -> tuple[bytes | None, list[Message]]:
+    """
+    Body of the request, None when it is larger than MAX_FORM_BYTES, and the
+    messages read to get it, to be replayed to the app.
+    """
+    body = b""
+    messages = []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return None, messages
+        body += message.get("body", b"")
+        if len(body) > MAX_FORM_BYTES:
+            return None, messages
+        if not message.get("more_body", False):
+            return body, messages
+
+
+def replay(messages: list[Message], receive: Receive) -> Receive:
+    async def replay_receive() -> Message:
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return replay_receive
+
+
+def is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in settings.TRUSTED_PROXIES)
+
+
+def client_ip(scope: Scope, headers: Headers) -> str:
+    """
+    The connection's peer, or when that is one of TRUSTED_PROXIES the address
+    X-Forwarded-For lists before the trusted proxies it went through. Addresses
+    further left were added by the client and could be anything.
+    """
+    peer = scope["client"][0] if scope.get("client") else "unknown"
+    if not is_trusted_proxy(peer):
+        return peer
+    forwarded = ",".join(headers.getlist("x-forwarded-for"))
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+class RateLimitMiddleware:
+    """
+    Enforce POLICIES before routing, so rejected requests never reach the
+    database, the hashing pool or SMTP. Behind a proxy, set TRUSTED_PROXIES so
+    the IP limits are per client rather than shared through the proxy.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        matched = None
+        if scope["type"] == "http" and settings.RATE_LIMIT_ENABLED:
+            matched = match_policy(scope["method"], scope["path"])
+        if matched is None:
+            await self.app(scope, receive, send)
+            return
+
+        policy, match = matched
+        headers = Headers(scope=scope)
+        keys = {"ip": client_ip(scope, headers)}
+        if any(limit.key == "user" for limit in policy.limits):
+            keys["user"] = get_bearer_user_id(headers) or f"ip:{keys['ip']}"
+        if any(limit.key == "email" for limit in policy.limits):
+            email = match.groupdict().get("email")
+            content_type = headers.get("content-type", "")
+            if email is None and content_type.startswith(
+                "application/x-www-form-urlencoded"
+            ):
+                body, messages = await read_body(receive)
+                receive = replay(messages, receive)
+                if body is not None:
+                    form = parse_qs(body.decode(errors="replace"))
+                    email = form.get("username", [None])[0]
+            if email:
+                keys["email"] = email.strip().lower()
+
+        retry_after = 0.0
+        for limit in policy.limits:
+            if limit.key in keys:
+                key = bucket_key(policy, limit, keys[limit.key])
+                retry_after = max(retry_after, await backend.take(key, limit))
+        if retry_after > 0:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests, please try again later"},
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
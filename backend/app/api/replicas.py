@@ -0,0 +1,62 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+# Set on the responses to writes, until when the client's reads go to the primary.
+# Browsers send the cookie back to the same site, clients on another origin like
+# the frontend, which don't send credentials, echo the header in their requests
+COOKIE = "read_your_writes_until"
+HEADER = "X-Read-Your-Writes-Until"
+
+
+def wrote_recently(until_value: str | None) -> bool:
+    """
+    Whether the window of a recent write, from COOKIE or HEADER, is still
+    running. Values further ahead than READ_YOUR_WRITES_SECONDS weren't set by us
+    and are ignored.
+    """
+    try:
+        until = float(until_value or "")
+    except ValueError:
+        return False
+    now = time.time()
+    return now < until <= now + settings.READ_YOUR_WRITES_SECONDS
+
+
+class ReadYourWritesMiddleware:
+    """
+    Stamp the responses to writes with COOKIE and HEADER. The next requests
+    carry one of them to whichever worker serves them, each keeps the reads on
+    the primary while it runs, unlike read_your_writes_cache that only its own
+    worker sees.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] in ("GET", "HEAD", "OPTIONS")
+            or not settings.POSTGRES_REPLICA_SERVERS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                seconds = settings.READ_YOUR_WRITES_SECONDS
+                until = f"{time.time() + seconds:.3f}"
+                headers = MutableHeaders(scope=message)
+                headers[HEADER] = until
+                headers.append(
+                    "Set-Cookie",
+                    f"{COOKIE}={until}; Max-Age={seconds}; "
+                    f"Path={settings.API_V1_STR}; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
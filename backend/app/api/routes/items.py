@@ -1,61 +1,235 @@
 import uuid
-from typing import Any
+from typing import Annotated, Any
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import col, func, select
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import col, delete, select
 
-from app.api.deps import CurrentUser, SessionDep
-from app.models import Item, ItemCreate, ItemPublic, ItemsPublic, ItemUpdate, Message
-from app.services.mentions import create_mention_notifications
+from app.api.deps import CurrentPrincipal, CurrentUser, SessionDep
+from app.api.etag import (
+    IfMatch,
+    IfNoneMatch,
+    check_if_match,
+    entity_tag,
+    not_modified,
+)
+from app.api.export import ExportFormat, export_response, select_public
+from app.api.pagination import (
+    Limit,
+    decode_rank_cursor,
+    estimated_count,
+    exact_count,
+    get_page,
+    paginate,
+)
+from app.api.profiling import TimedRoute
+from app.models import (
+    Item,
+    ItemCreate,
+    ItemIds,
+    ItemPublic,
+    ItemsBulkResult,
+    ItemsCreate,
+    ItemSearchResults,
+    ItemsPublic,
+    ItemsUpdate,
+    ItemUpdate,
+    Message,
+)
+from app.services.items import (
+    build_insert,
+    build_search,
+    build_update,
+    bulk_result,
+    check_entries,
+    search_results,
+    select_for_write,
+)
+from app.services.mentions import (
+    create_mention_notifications,
+    create_mention_notifications_batch,
+)
 
-router = APIRouter(prefix="/items", tags=["items"])
+router = APIRouter(prefix="/items", tags=["items"], route_class=TimedRoute)
 
 
 @router.get("/", response_model=ItemsPublic)
 def read_items(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+    session: SessionDep,
+    current_user: CurrentPrincipal,
+    skip: int = 0,
+    limit: Limit = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
+    estimate_count: bool = False,
 ) -> Any:
     """
-    Retrieve items.
+    Retrieve items. Pass the next_cursor of a page as cursor to get the next one.
+
+    include_count=false skips counting, superusers can ask for a fast estimate of
+    the count with estimate_count=true.
     """
+    filters = []
+    if not current_user.is_superuser:
+        filters.append(Item.owner_id == current_user.id)
+    counts = []
+    if include_count and estimate_count and current_user.is_superuser:
+        counts.append(estimated_count(Item))
+    elif include_count:
+        counts.append(exact_count(Item, *filters))
 
-    if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Item)
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Item).order_by(col(Item.created_at).desc()).offset(skip).limit(limit)
-        )
-        items = session.exec(statement).all()
-    else:
-        count_statement = (
-            select(func.count())
-            .select_from(Item)
-            .where(Item.owner_id == current_user.id)
-        )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Item)
-            .where(Item.owner_id == current_user.id)
-            .order_by(col(Item.created_at).desc())
-            .offset(skip)
-            .limit(limit)
-        )
-        items = session.exec(statement).all()
+    statement = paginate(
+        select(Item, *counts).where(*filters),
+        Item,
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+    )
+    items, next_cursor, count_values = get_page(
+        session.exec(statement).all(), limit, counts=len(counts)
+    )
+    count = count_values[0] if count_values else None
+    if counts and count_values is None:
+        # Empty page, past the end or of an empty table
+        count = session.exec(select(counts[0])).one() if skip or cursor else 0
 
-    return ItemsPublic(data=items, count=count)
+    return ItemsPublic(data=items, count=count, next_cursor=next_cursor)
+
+
+@router.get("/search", response_model=ItemSearchResults)
+def search_items(
+    session: SessionDep,
+    current_user: CurrentPrincipal,
+    q: Annotated[str, Query(min_length=1, max_length=255)],
+    limit: Limit = 100,
+    cursor: str | None = None,
+) -> Any:
+    """
+    Search the title and description of the items read_items would return, best
+    match first. Pass the next_cursor of a page as cursor to get the next one.
+    """
+    statement = build_search(
+        q,
+        owner_id=None if current_user.is_superuser else current_user.id,
+        after=decode_rank_cursor(cursor) if cursor else None,
+        limit=limit,
+    )
+    return search_results(session.exec(statement).all(), limit)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+def export_items(
+    request: Request, current_user: CurrentPrincipal, format: ExportFormat = "ndjson"
+) -> StreamingResponse:
+    """
+    Export all the items read_items pages through, newest first, as NDJSON or CSV
+    with the fields of ItemPublic. Streamed from a server-side cursor.
+    """
+    statement = select_public(Item, ItemPublic)
+    if not current_user.is_superuser:
+        statement = statement.where(col(Item.owner_id) == current_user.id)
+    return export_response(request, statement, format, "items")
+
+
+# Declared before the /{id} routes, which would take "bulk" for an id
+@router.post("/bulk", response_model=ItemsBulkResult)
+def create_items(
+    *, session: SessionDep, current_user: CurrentUser, items_in: ItemsCreate
+) -> Any:
+    """
+    Create many items in one transaction, with one INSERT for the items and one
+    for the notifications of their @mentions.
+    """
+    items = [
+        Item.model_validate(item_in, update={"owner_id": current_user.id})
+        for item_in in items_in.items
+    ]
+    session.exec(build_insert(items))
+    create_mention_notifications_batch(
+        session, {item.id: item.description for item in items}, current_user
+    )
+    session.commit()
+    ids = [item.id for item in items]
+    return bulk_result(ids, [None] * len(ids), items)
+
+
+@router.put("/bulk", response_model=ItemsBulkResult)
+def update_items(
+    *, session: SessionDep, current_user: CurrentUser, items_in: ItemsUpdate
+) -> Any:
+    """
+    Update many items in one transaction. Entries the single item update would
+    refuse get that error in their result and are skipped, the others are
+    applied with one UPDATE.
+    """
+    ids = [entry.id for entry in items_in.items]
+    rows = session.exec(select_for_write(ids)).all()
+    descriptions = {id: description for id, _, description in rows}
+    errors = check_entries(
+        ids, {id: owner_id for id, owner_id, _ in rows}, current_user
+    )
+    entries = [
+        entry
+        for entry, error in zip(items_in.items, errors, strict=True)
+        if error is None
+    ]
+    items = []
+    if entries:
+        items = list(session.exec(build_update(entries)).scalars())
+    # Notify the @mentions new to a description
+    texts = {
+        entry.id: entry.description
+        for entry in entries
+        if entry.description and entry.description != descriptions[entry.id]
+    }
+    create_mention_notifications_batch(session, texts, current_user)
+    # Before committing expires the items
+    result = bulk_result(ids, errors, items)
+    session.commit()
+    return result
+
+
+@router.delete("/bulk", response_model=ItemsBulkResult)
+def delete_items(
+    *, session: SessionDep, current_user: CurrentUser, items_in: ItemIds
+) -> Any:
+    """
+    Delete many items in one transaction. Entries the single item delete would
+    refuse get that error in their result and are skipped.
+    """
+    ids = items_in.ids
+    rows = session.exec(select_for_write(ids)).all()
+    owners = {id: owner_id for id, owner_id, _ in rows}
+    errors = check_entries(ids, owners, current_user)
+    deleted = [id for id, error in zip(ids, errors, strict=True) if error is None]
+    if deleted:
+        session.exec(delete(Item).where(col(Item.id).in_(deleted)))
+    session.commit()
+    return bulk_result(ids, errors, [])
 
 
 @router.get("/{id}", response_model=ItemPublic)
-def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+def read_item(
+    session: SessionDep,
+    current_user: CurrentPrincipal,
+    response: Response,
+    id: uuid.UUID,
+    if_none_match: IfNoneMatch = None,
+) -> Any:
     """
-    Get item by ID.
+    Get item by ID. Answers 304 Not Modified when If-None-Match has its ETag.
     """
     item = session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return item
+    tag = entity_tag(item.id, item.version)
+    return not_modified(response, tag, if_none_match) or item
 
 
 @router.post("/", response_model=ItemPublic)
@@ -67,18 +241,19 @@ def create_item(
     """
     item = Item.model_validate(item_in, update={"owner_id": current_user.id})
     session.add(item)
-    session.commit()
-    session.refresh(item)
-
-    # Create notifications for @mentions in description
+    # Create notifications for @mentions in description, in the same transaction
     create_mention_notifications(
         session=session,
         text=item_in.description,
         mentioner=current_user,
         reference_id=item.id,
     )
-
-    return item
+    # Before committing expires the item, flushed for the values the INSERT
+    # returns
+    session.flush()
+    result = ItemPublic.model_validate(item)
+    session.commit()
+    return result
 
 
 @router.put("/{id}", response_model=ItemPublic)
@@ -86,27 +261,31 @@ def update_item(
     *,
     session: SessionDep,
     current_user: CurrentUser,
+    response: Response,
     id: uuid.UUID,
     item_in: ItemUpdate,
+    if_match: IfMatch = None,
 ) -> Any:
     """
-    Update an item.
+    Update an item. With If-Match, only if its ETag is listed, else 412
+    Precondition Failed.
     """
-    item = session.get(Item, id)
+    # Locked so it can't change between checking If-Match and updating it
+    item = session.get(Item, id, with_for_update=True)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
+    check_if_match(entity_tag(item.id, item.version), if_match)
 
     # Check if description is being updated with new mentions
     old_description = item.description
     update_dict = item_in.model_dump(exclude_unset=True)
     item.sqlmodel_update(update_dict)
     session.add(item)
-    session.commit()
-    session.refresh(item)
 
-    # Create notifications for new @mentions in updated description
+    # Create notifications for new @mentions in updated description, in the same
+    # transaction
     if item_in.description and item_in.description != old_description:
         create_mention_notifications(
             session=session,
@@ -114,8 +293,13 @@ def update_item(
             mentioner=current_user,
             reference_id=item.id,
         )
-
-    return item
+    # Before committing expires the item, flushed for the version and time the
+    # UPDATE returns
+    session.flush()
+    result = ItemPublic.model_validate(item)
+    response.headers["ETag"] = entity_tag(item.id, item.version)
+    session.commit()
+    return result
 
 
 @router.delete("/{id}")
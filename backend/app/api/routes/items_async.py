@@ -0,0 +1,312 @@
+import uuid
+from typing import Annotated, Any
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import col, delete, select
+
+from app.api.deps import AsyncCurrentPrincipal, AsyncCurrentUser, AsyncSessionDep
+from app.api.etag import (
+    IfMatch,
+    IfNoneMatch,
+    check_if_match,
+    entity_tag,
+    not_modified,
+)
+from app.api.export import ExportFormat, export_response_async, select_public
+from app.api.pagination import (
+    Limit,
+    decode_rank_cursor,
+    estimated_count,
+    exact_count,
+    get_page,
+    paginate,
+)
+from app.api.profiling import TimedRoute
+from app.models import (
+    Item,
+    ItemCreate,
+    ItemIds,
+    ItemPublic,
+    ItemsBulkResult,
+    ItemsCreate,
+    ItemSearchResults,
+    ItemsPublic,
+    ItemsUpdate,
+    ItemUpdate,
+    Message,
+)
+from app.services.items import (
+    build_insert,
+    build_search,
+    build_update,
+    bulk_result,
+    check_entries,
+    search_results,
+    select_for_write,
+)
+from app.services.mentions import (
+    create_mention_notifications_async,
+    create_mention_notifications_batch_async,
+)
+
+# Async twin of app.api.routes.items, mounted instead of it when DB_ASYNC is set
+router = APIRouter(prefix="/items", tags=["items"], route_class=TimedRoute)
+
+
+@router.get("/", response_model=ItemsPublic)
+async def read_items(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentPrincipal,
+    skip: int = 0,
+    limit: Limit = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
+    estimate_count: bool = False,
+) -> Any:
+    """
+    Retrieve items. Pass the next_cursor of a page as cursor to get the next one.
+
+    include_count=false skips counting, superusers can ask for a fast estimate of
+    the count with estimate_count=true.
+    """
+    filters = []
+    if not current_user.is_superuser:
+        filters.append(Item.owner_id == current_user.id)
+    counts = []
+    if include_count and estimate_count and current_user.is_superuser:
+        counts.append(estimated_count(Item))
+    elif include_count:
+        counts.append(exact_count(Item, *filters))
+
+    statement = paginate(
+        select(Item, *counts).where(*filters),
+        Item,
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+    )
+    items, next_cursor, count_values = get_page(
+        (await session.exec(statement)).all(), limit, counts=len(counts)
+    )
+    count = count_values[0] if count_values else None
+    if counts and count_values is None:
+        # Empty page, past the end or of an empty table
+        count = (await session.exec(select(counts[0]))).one() if skip or cursor else 0
+
+    return ItemsPublic(data=items, count=count, next_cursor=next_cursor)
+
+
+@router.get("/search", response_model=ItemSearchResults)
+async def search_items(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentPrincipal,
+    q: Annotated[str, Query(min_length=1, max_length=255)],
+    limit: Limit = 100,
+    cursor: str | None = None,
+) -> Any:
+    """
+    Search the title and description of the items read_items would return, best
+    match first. Pass the next_cursor of a page as cursor to get the next one.
+    """
+    statement = build_search(
+        q,
+        owner_id=None if current_user.is_superuser else current_user.id,
+        after=decode_rank_cursor(cursor) if cursor else None,
+        limit=limit,
+    )
+    return search_results((await session.exec(statement)).all(), limit)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+async def export_items(
+    request: Request,
+    current_user: AsyncCurrentPrincipal,
+    format: ExportFormat = "ndjson",
+) -> StreamingResponse:
+    """
+    Export all the items read_items pages through, newest first, as NDJSON or CSV
+    with the fields of ItemPublic. Streamed from a server-side cursor.
+    """
+    statement = select_public(Item, ItemPublic)
+    if not current_user.is_superuser:
+        statement = statement.where(col(Item.owner_id) == current_user.id)
+    return export_response_async(request, statement, format, "items")
+
+
+# Declared before the /{id} routes, which would take "bulk" for an id
+@router.post("/bulk", response_model=ItemsBulkResult)
+async def create_items(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentUser, items_in: ItemsCreate
+) -> Any:
+    """
+    Create many items in one transaction, with one INSERT for the items and one
+    for the notifications of their @mentions.
+    """
+    items = [
+        Item.model_validate(item_in, update={"owner_id": current_user.id})
+        for item_in in items_in.items
+    ]
+    await session.exec(build_insert(items))
+    await create_mention_notifications_batch_async(
+        session, {item.id: item.description for item in items}, current_user
+    )
+    await session.commit()
+    ids = [item.id for item in items]
+    return bulk_result(ids, [None] * len(ids), items)
+
+
+@router.put("/bulk", response_model=ItemsBulkResult)
+async def update_items(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentUser, items_in: ItemsUpdate
+) -> Any:
+    """
+    Update many items in one transaction. Entries the single item update would
+    refuse get that error in their result and are skipped, the others are
+    applied with one UPDATE.
+    """
+    ids = [entry.id for entry in items_in.items]
+    rows = (await session.exec(select_for_write(ids))).all()
+    descriptions = {id: description for id, _, description in rows}
+    errors = check_entries(
+        ids, {id: owner_id for id, owner_id, _ in rows}, current_user
+    )
+    entries = [
+        entry
+        for entry, error in zip(items_in.items, errors, strict=True)
+        if error is None
+    ]
+    items = []
+    if entries:
+        items = list((await session.exec(build_update(entries))).scalars())
+    # Notify the @mentions new to a description
+    texts = {
+        entry.id: entry.description
+        for entry in entries
+        if entry.description and entry.description != descriptions[entry.id]
+    }
+    await create_mention_notifications_batch_async(session, texts, current_user)
+    await session.commit()
+    return bulk_result(ids, errors, items)
+
+
+@router.delete("/bulk", response_model=ItemsBulkResult)
+async def delete_items(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentUser, items_in: ItemIds
+) -> Any:
+    """
+    Delete many items in one transaction. Entries the single item delete would
+    refuse get that error in their result and are skipped.
+    """
+    ids = items_in.ids
+    rows = (await session.exec(select_for_write(ids))).all()
+    owners = {id: owner_id for id, owner_id, _ in rows}
+    errors = check_entries(ids, owners, current_user)
+    deleted = [id for id, error in zip(ids, errors, strict=True) if error is None]
+    if deleted:
+        await session.exec(delete(Item).where(col(Item.id).in_(deleted)))
+    await session.commit()
+    return bulk_result(ids, errors, [])
+
+
+@router.get("/{id}", response_model=ItemPublic)
+async def read_item(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentPrincipal,
+    response: Response,
+    id: uuid.UUID,
+    if_none_match: IfNoneMatch = None,
+) -> Any:
+    """
+    Get item by ID. Answers 304 Not Modified when If-None-Match has its ETag.
+    """
+    item = await session.get(Item, id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if not current_user.is_superuser and (item.owner_id != current_user.id):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    tag = entity_tag(item.id, item.version)
+    return not_modified(response, tag, if_none_match) or item
+
+
+@router.post("/", response_model=ItemPublic)
+async def create_item(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentUser, item_in: ItemCreate
+) -> Any:
+    """
+    Create new item.
+    """
+    item = Item.model_validate(item_in, update={"owner_id": current_user.id})
+    session.add(item)
+    # Create notifications for @mentions in description, in the same transaction
+    await create_mention_notifications_async(
+        session=session,
+        text=item_in.description,
+        mentioner=current_user,
+        reference_id=item.id,
+    )
+    await session.commit()
+    return item
+
+
+@router.put("/{id}", response_model=ItemPublic)
+async def update_item(
+    *,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    response: Response,
+    id: uuid.UUID,
+    item_in: ItemUpdate,
+    if_match: IfMatch = None,
+) -> Any:
+    """
+    Update an item. With If-Match, only if its ETag is listed, else 412
+    Precondition Failed.
+    """
+    # Locked so it can't change between checking If-Match and updating it
+    item = await session.get(Item, id, with_for_update=True)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if not current_user.is_superuser and (item.owner_id != current_user.id):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    check_if_match(entity_tag(item.id, item.version), if_match)
+
+    # Check if description is being updated with new mentions
+    old_description = item.description
+    update_dict = item_in.model_dump(exclude_unset=True)
+    item.sqlmodel_update(update_dict)
+    session.add(item)
+
+    # Create notifications for new @mentions in updated description, in the same
+    # transaction
+    if item_in.description and item_in.description != old_description:
+        await create_mention_notifications_async(
+            session=session,
+            text=item_in.description,
+            mentioner=current_user,
+            reference_id=item.id,
+        )
+    await session.commit()
+    response.headers["ETag"] = entity_tag(item.id, item.version)
+    return item
+
+
+@router.delete("/{id}")
+async def delete_item(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
+) -> Message:
+    """
+    Delete an item.
+    """
+    item = await session.get(Item, id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if not current_user.is_superuser and (item.owner_id != current_user.id):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    await session.delete(item)
+    await session.commit()
+    return Message(message="Item deleted successfully")
@@ -1,15 +1,29 @@
+import shutil
+import tempfile
 import uuid
-from typing import Any
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlmodel import col, delete, select
 
 from app import crud
 from app.api.deps import (
+    CurrentPrincipal,
     CurrentUser,
     SessionDep,
     get_current_active_superuser,
 )
+from app.api.etag import (
+    IfMatch,
+    IfNoneMatch,
+    check_if_match,
+    entity_tag,
+    not_modified,
+)
+from app.api.pagination import Limit, estimated_count, exact_count, get_page, paginate
+from app.api.profiling import TimedRoute
+from app.core.cache import invalidate_user
 from app.core.config import settings
 from app.core.security import get_password_hash, verify_password
 from app.models import (
@@ -20,13 +34,16 @@ from app.models import (
     UserCreate,
     UserPublic,
     UserRegister,
+    UserSearchResults,
     UsersPublic,
     UserUpdate,
     UserUpdateMe,
 )
+from app.services.user_import import detect_format, stream_report
+from app.services.users import find_users
 from app.utils import generate_new_account_email, send_email
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=TimedRoute)
 
 
 @router.get(
@@ -34,20 +51,68 @@ router = APIRouter(prefix="/users", tags=["users"])
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
-    """
-    Retrieve users.
+def read_users(
+    session: SessionDep,
+    skip: int = 0,
+    limit: Limit = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
+    estimate_count: bool = False,
+) -> Any:
     """
+    Retrieve users. Pass the next_cursor of a page as cursor to get the next one.
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    include_count=false skips counting, estimate_count=true returns a fast
+    estimate of the count.
+    """
+    counts = []
+    if include_count:
+        counts.append(estimated_count(User) if estimate_count else exact_count(User))
 
-    statement = (
-        select(User).order_by(col(User.created_at).desc()).offset(skip).limit(limit)
+    statement = paginate(
+        select(User, *counts),
+        User,
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+    )
+    users, next_cursor, count_values = get_page(
+        session.exec(statement).all(), limit, counts=len(counts)
     )
-    users = session.exec(statement).all()
+    count = count_values[0] if count_values else None
+    if counts and count_values is None:
+        # Empty page, past the end or of an empty table
+        count = session.exec(select(counts[0])).one() if skip or cursor else 0
 
-    return UsersPublic(data=users, count=count)
+    return UsersPublic(data=users, count=count, next_cursor=next_cursor)
+
+
+@router.get("/search", response_model=UserSearchResults)
+def search_users(
+    session: SessionDep,
+    current_user: CurrentPrincipal,
+    response: Response,
+    prefix: Annotated[str, Query(min_length=1, max_length=255)],
+    limit: Annotated[int, Query(ge=1, le=20)] = 10,
+) -> Any:
+    """
+    Users whose email or full name starts with prefix, ignoring case, for
+    @mention autocomplete. Superusers also find inactive users and with prefixes
+    shorter than USER_SEARCH_MIN_PREFIX_LENGTH, others find no one with those.
+    """
+    results = find_users(
+        session,
+        prefix,
+        limit=limit,
+        include_inactive=current_user.is_superuser,
+        min_length=(
+            1 if current_user.is_superuser else settings.USER_SEARCH_MIN_PREFIX_LENGTH
+        ),
+    )
+    response.headers["Cache-Control"] = (
+        f"private, max-age={settings.USER_SEARCH_CACHE_TTL_SECONDS}"
+    )
+    return UserSearchResults(data=results)
 
 
 @router.post(
@@ -77,6 +142,31 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
     return user
 
 
+@router.post(
+    "/import",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+def import_users(file: UploadFile) -> StreamingResponse:
+    """
+    Create users from a CSV file with a header row, or an NDJSON file of one
+    object per line, with the fields of create_user. Answers an NDJSON report of
+    a UserImportResult per row, streamed as each batch of rows is committed.
+    """
+    try:
+        format = detect_format(file.filename, file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The upload is closed before the response is streamed
+    upload = tempfile.TemporaryFile()
+    shutil.copyfileobj(file.file, upload)
+    upload.seek(0)
+    return StreamingResponse(
+        stream_report(upload, format), media_type="application/x-ndjson"
+    )
+
+
 @router.patch("/me", response_model=UserPublic)
 def update_user_me(
     *, session: SessionDep, user_in: UserUpdateMe, current_user: CurrentUser
@@ -95,6 +185,7 @@ def update_user_me(
     current_user.sqlmodel_update(user_data)
     session.add(current_user)
     session.commit()
+    invalidate_user(current_user.id)
     session.refresh(current_user)
     return current_user
 
@@ -115,17 +206,22 @@ def update_password_me(
         )
     hashed_password = get_password_hash(body.new_password)
     current_user.hashed_password = hashed_password
+    crud.revoke_tokens(current_user)
     session.add(current_user)
     session.commit()
+    invalidate_user(current_user.id)
     return Message(message="Password updated successfully")
 
 
 @router.get("/me", response_model=UserPublic)
-def read_user_me(current_user: CurrentUser) -> Any:
+def read_user_me(
+    current_user: CurrentUser, response: Response, if_none_match: IfNoneMatch = None
+) -> Any:
     """
-    Get current user.
+    Get current user. Answers 304 Not Modified when If-None-Match has its ETag.
     """
-    return current_user
+    tag = entity_tag(current_user.id, current_user.version)
+    return not_modified(response, tag, if_none_match) or current_user
 
 
 @router.delete("/me", response_model=Message)
@@ -139,6 +235,7 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
         )
     session.delete(current_user)
     session.commit()
+    invalidate_user(current_user.id)
     return Message(message="User deleted successfully")
 
 
@@ -186,19 +283,25 @@ def read_user_by_id(
 def update_user(
     *,
     session: SessionDep,
+    response: Response,
     user_id: uuid.UUID,
     user_in: UserUpdate,
+    if_match: IfMatch = None,
 ) -> Any:
     """
-    Update a user.
+    Update a user. With If-Match, only if its ETag is listed, else 412
+    Precondition Failed.
     """
 
-    db_user = session.get(User, user_id)
+    # Locked so it can't change between checking If-Match and updating it, and
+    # reread as the current user is in the session already, maybe from the cache
+    db_user = session.get(User, user_id, with_for_update=True, populate_existing=True)
     if not db_user:
         raise HTTPException(
             status_code=404,
             detail="The user with this id does not exist in the system",
         )
+    check_if_match(entity_tag(db_user.id, db_user.version), if_match)
     if user_in.email:
         existing_user = crud.get_user_by_email(session=session, email=user_in.email)
         if existing_user and existing_user.id != user_id:
@@ -207,6 +310,7 @@ def update_user(
             )
 
     db_user = crud.update_user(session=session, db_user=db_user, user_in=user_in)
+    response.headers["ETag"] = entity_tag(db_user.id, db_user.version)
     return db_user
 
 
@@ -228,4 +332,5 @@ def delete_user(
     session.exec(statement)
     session.delete(user)
     session.commit()
+    invalidate_user(user_id)
     return Message(message="User deleted successfully")
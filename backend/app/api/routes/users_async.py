@@ -0,0 +1,357 @@
+import shutil
+import tempfile
+import uuid
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlmodel import col, delete, select
+from starlette.concurrency import run_in_threadpool
+
+from app import crud
+from app.api.deps import (
+    AsyncCurrentPrincipal,
+    AsyncCurrentUser,
+    AsyncSessionDep,
+    get_current_active_superuser_async,
+)
+from app.api.etag import (
+    IfMatch,
+    IfNoneMatch,
+    check_if_match,
+    entity_tag,
+    not_modified,
+)
+from app.api.pagination import Limit, estimated_count, exact_count, get_page, paginate
+from app.api.profiling import TimedRoute
+from app.core.cache import invalidate_user
+from app.core.config import settings
+from app.core.security import get_password_hash_async, verify_password_async
+from app.models import (
+    Item,
+    Message,
+    UpdatePassword,
+    User,
+    UserCreate,
+    UserPublic,
+    UserRegister,
+    UserSearchResults,
+    UsersPublic,
+    UserUpdate,
+    UserUpdateMe,
+)
+from app.services.user_import import detect_format, stream_report
+from app.services.users import find_users_async
+from app.utils import generate_new_account_email, send_email
+
+# Async twin of app.api.routes.users, mounted instead of it when DB_ASYNC is set
+router = APIRouter(prefix="/users", tags=["users"], route_class=TimedRoute)
+
+
+@router.get(
+    "/",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_model=UsersPublic,
+)
+async def read_users(
+    session: AsyncSessionDep,
+    skip: int = 0,
+    limit: Limit = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
+    estimate_count: bool = False,
+) -> Any:
+    """
+    Retrieve users. Pass the next_cursor of a page as cursor to get the next one.
+
+    include_count=false skips counting, estimate_count=true returns a fast
+    estimate of the count.
+    """
+    counts = []
+    if include_count:
+        counts.append(estimated_count(User) if estimate_count else exact_count(User))
+
+    statement = paginate(
+        select(User, *counts),
+        User,
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+    )
+    users, next_cursor, count_values = get_page(
+        (await session.exec(statement)).all(), limit, counts=len(counts)
+    )
+    count = count_values[0] if count_values else None
+    if counts and count_values is None:
+        # Empty page, past the end or of an empty table
+        count = (await session.exec(select(counts[0]))).one() if skip or cursor else 0
+
+    return UsersPublic(data=users, count=count, next_cursor=next_cursor)
+
+
+@router.get("/search", response_model=UserSearchResults)
+async def search_users(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentPrincipal,
+    response: Response,
+    prefix: Annotated[str, Query(min_length=1, max_length=255)],
+    limit: Annotated[int, Query(ge=1, le=20)] = 10,
+) -> Any:
+    """
+    Users whose email or full name starts with prefix, ignoring case, for
+    @mention autocomplete. Superusers also find inactive users and with prefixes
+    shorter than USER_SEARCH_MIN_PREFIX_LENGTH, others find no one with those.
+    """
+    results = await find_users_async(
+        session,
+        prefix,
+        limit=limit,
+        include_inactive=current_user.is_superuser,
+        min_length=(
+            1 if current_user.is_superuser else settings.USER_SEARCH_MIN_PREFIX_LENGTH
+        ),
+    )
+    response.headers["Cache-Control"] = (
+        f"private, max-age={settings.USER_SEARCH_CACHE_TTL_SECONDS}"
+    )
+    return UserSearchResults(data=results)
+
+
+@router.post(
+    "/",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_model=UserPublic,
+)
+async def create_user(*, session: AsyncSessionDep, user_in: UserCreate) -> Any:
+    """
+    Create new user.
+    """
+    user = await crud.get_user_by_email_async(session=session, email=user_in.email)
+    if user:
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this email already exists in the system.",
+        )
+
+    user = await crud.create_user_async(session=session, user_create=user_in)
+    if settings.emails_enabled and user_in.email:
+        email_data = generate_new_account_email(
+            email_to=user_in.email, username=user_in.email, password=user_in.password
+        )
+        await run_in_threadpool(
+            send_email,
+            email_to=user_in.email,
+            subject=email_data.subject,
+            html_content=email_data.html_content,
+        )
+    return user
+
+
+@router.post(
+    "/import",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def import_users(file: UploadFile) -> StreamingResponse:
+    """
+    Create users from a CSV file with a header row, or an NDJSON file of one
+    object per line, with the fields of create_user. Answers an NDJSON report of
+    a UserImportResult per row, streamed as each batch of rows is committed.
+    """
+    try:
+        format = detect_format(file.filename, file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The upload is closed before the response is streamed
+    upload = tempfile.TemporaryFile()
+    await run_in_threadpool(shutil.copyfileobj, file.file, upload)
+    upload.seek(0)
+    return StreamingResponse(
+        stream_report(upload, format), media_type="application/x-ndjson"
+    )
+
+
+@router.patch("/me", response_model=UserPublic)
+async def update_user_me(
+    *, session: AsyncSessionDep, user_in: UserUpdateMe, current_user: AsyncCurrentUser
+) -> Any:
+    """
+    Update own user.
+    """
+
+    if user_in.email:
+        existing_user = await crud.get_user_by_email_async(
+            session=session, email=user_in.email
+        )
+        if existing_user and existing_user.id != current_user.id:
+            raise HTTPException(
+                status_code=409, detail="User with this email already exists"
+            )
+    user_data = user_in.model_dump(exclude_unset=True)
+    current_user.sqlmodel_update(user_data)
+    session.add(current_user)
+    await session.commit()
+    invalidate_user(current_user.id)
+    await session.refresh(current_user)
+    return current_user
+
+
+@router.patch("/me/password", response_model=Message)
+async def update_password_me(
+    *, session: AsyncSessionDep, body: UpdatePassword, current_user: AsyncCurrentUser
+) -> Any:
+    """
+    Update own password.
+    """
+    # hashed_password is not part of the cached user, load it without lazy IO
+    await session.refresh(current_user, ["hashed_password"])
+    verified, _ = await verify_password_async(
+        body.current_password, current_user.hashed_password
+    )
+    if not verified:
+        raise HTTPException(status_code=400, detail="Incorrect password")
+    if body.current_password == body.new_password:
+        raise HTTPException(
+            status_code=400, detail="New password cannot be the same as the current one"
+        )
+    hashed_password = await get_password_hash_async(body.new_password)
+    current_user.hashed_password = hashed_password
+    crud.revoke_tokens(current_user)
+    session.add(current_user)
+    await session.commit()
+    invalidate_user(current_user.id)
+    return Message(message="Password updated successfully")
+
+
+@router.get("/me", response_model=UserPublic)
+async def read_user_me(
+    current_user: AsyncCurrentUser,
+    response: Response,
+    if_none_match: IfNoneMatch = None,
+) -> Any:
+    """
+    Get current user. Answers 304 Not Modified when If-None-Match has its ETag.
+    """
+    tag = entity_tag(current_user.id, current_user.version)
+    return not_modified(response, tag, if_none_match) or current_user
+
+
+@router.delete("/me", response_model=Message)
+async def delete_user_me(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser
+) -> Any:
+    """
+    Delete own user.
+    """
+    if current_user.is_superuser:
+        raise HTTPException(
+            status_code=403, detail="Super users are not allowed to delete themselves"
+        )
+    await session.delete(current_user)
+    await session.commit()
+    invalidate_user(current_user.id)
+    return Message(message="User deleted successfully")
+
+
+@router.post("/signup", response_model=UserPublic)
+async def register_user(session: AsyncSessionDep, user_in: UserRegister) -> Any:
+    """
+    Create new user without the need to be logged in.
+    """
+    user = await crud.get_user_by_email_async(session=session, email=user_in.email)
+    if user:
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this email already exists in the system",
+        )
+    user_create = UserCreate.model_validate(user_in)
+    user = await crud.create_user_async(session=session, user_create=user_create)
+    return user
+
+
+@router.get("/{user_id}", response_model=UserPublic)
+async def read_user_by_id(
+    user_id: uuid.UUID, session: AsyncSessionDep, current_user: AsyncCurrentUser
+) -> Any:
+    """
+    Get a specific user by id.
+    """
+    user = await session.get(User, user_id)
+    if user == current_user:
+        return user
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403,
+            detail="The user doesn't have enough privileges",
+        )
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+@router.patch(
+    "/{user_id}",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_model=UserPublic,
+)
+async def update_user(
+    *,
+    session: AsyncSessionDep,
+    response: Response,
+    user_id: uuid.UUID,
+    user_in: UserUpdate,
+    if_match: IfMatch = None,
+) -> Any:
+    """
+    Update a user. With If-Match, only if its ETag is listed, else 412
+    Precondition Failed.
+    """
+
+    # Locked so it can't change between checking If-Match and updating it, and
+    # reread as the current user is in the session already, maybe from the cache
+    db_user = await session.get(
+        User, user_id, with_for_update=True, populate_existing=True
+    )
+    if not db_user:
+        raise HTTPException(
+            status_code=404,
+            detail="The user with this id does not exist in the system",
+        )
+    check_if_match(entity_tag(db_user.id, db_user.version), if_match)
+    if user_in.email:
+        existing_user = await crud.get_user_by_email_async(
+            session=session, email=user_in.email
+        )
+        if existing_user and existing_user.id != user_id:
+            raise HTTPException(
+                status_code=409, detail="User with this email already exists"
+            )
+
+    db_user = await crud.update_user_async(
+        session=session, db_user=db_user, user_in=user_in
+    )
+    response.headers["ETag"] = entity_tag(db_user.id, db_user.version)
+    return db_user
+
+
+@router.delete("/{user_id}", dependencies=[Depends(get_current_active_superuser_async)])
+async def delete_user(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, user_id: uuid.UUID
+) -> Message:
+    """
+    Delete a user.
+    """
+    user = await session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if user == current_user:
+        raise HTTPException(
+            status_code=403, detail="Super users are not allowed to delete themselves"
+        )
+    statement = delete(Item).where(col(Item.owner_id) == user_id)
+    await session.exec(statement)
+    await session.delete(user)
+    await session.commit()
+    invalidate_user(user_id)
+    return Message(message="User deleted successfully")
@@ -2,10 +2,19 @@ from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
+from app.api.profiling import TimedRoute
+from app.core.cache import (
+    CacheStats,
+    token_cache,
+    token_version_cache,
+    user_cache,
+)
+from app.core.db import PoolStats, get_engines, get_pool_stats
+from app.core.hashing import HashingPoolStats, hashing_pool
 from app.models import Message
 from app.utils import generate_test_email, send_email
 
-router = APIRouter(prefix="/utils", tags=["utils"])
+router = APIRouter(prefix="/utils", tags=["utils"], route_class=TimedRoute)
 
 
 @router.post(
@@ -26,6 +35,43 @@ def test_email(email_to: EmailStr) -> Message:
     return Message(message="Test email sent")
 
 
+@router.get(
+    "/password-hashing/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def password_hashing_stats() -> HashingPoolStats:
+    """
+    Password hashing pool queue depth and latency.
+    """
+    return hashing_pool.stats()
+
+
+@router.get(
+    "/caches/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def cache_stats() -> dict[str, CacheStats]:
+    """
+    Size and hit/miss counters of this worker's in-process caches.
+    """
+    return {
+        "token": token_cache.stats(),
+        "user": user_cache.stats(),
+        "token_version": token_version_cache.stats(),
+    }
+
+
+@router.get(
+    "/db-pool/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def db_pool_stats() -> dict[str, PoolStats]:
+    """
+    Connection pool usage and checkout wait times of this worker's engines.
+    """
+    return {name: get_pool_stats(engine) for name, engine in get_engines().items()}
+
+
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
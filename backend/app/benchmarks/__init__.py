@@ -0,0 +1 @@
+# Benchmarks, run them with `python -m app.benchmarks.<name>`
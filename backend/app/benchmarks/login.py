@@ -0,0 +1,225 @@
+import argparse
+import logging
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import httpx
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+from app.core.config import settings
+from app.core.hashing import HashingPool
+from app.core.security import _get_password_hash, _verify_password
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+PASSWORD = "benchmark-password"
+
+# Candidates tried by --calibrate, memory costs are in KiB. 19 MiB with t=2 is the
+# OWASP minimum for Argon2id
+TIME_COSTS = (1, 2, 3, 4, 6)
+MEMORY_COSTS = (19456, 32768, 47104, 65536, 131072)
+
+
+@dataclass
+class Latency:
+    p50_ms: float
+    p99_ms: float
+
+
+@dataclass
+class Candidate:
+    time_cost: int
+    memory_cost: int
+    verify: Latency
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(fn: Callable[[], object], number: int) -> Latency:
+    samples = []
+    for _ in range(number):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return Latency(
+        p50_ms=percentile(samples, 50) * 1000, p99_ms=percentile(samples, 99) * 1000
+    )
+
+
+def measure_hasher(hasher: Argon2Hasher, number: int) -> tuple[Latency, Latency]:
+    """Hash and verify latency of one hasher, on the calling core."""
+    hashed = hasher.hash(PASSWORD)
+    return (
+        measure(lambda: hasher.hash(PASSWORD), number),
+        measure(lambda: hasher.verify(PASSWORD, hashed), number),
+    )
+
+
+def calibrate(*, target_p99_ms: float, number: int) -> list[Candidate]:
+    candidates = []
+    for time_cost in TIME_COSTS:
+        for memory_cost in MEMORY_COSTS:
+            hasher = Argon2Hasher(
+                time_cost=time_cost,
+                memory_cost=memory_cost,
+                parallelism=settings.ARGON2_PARALLELISM,
+            )
+            _, verify = measure_hasher(hasher, number)
+            logger.info(
+                f"t={time_cost} m={memory_cost}: verify p50 {verify.p50_ms:.1f} ms, "
+                f"p99 {verify.p99_ms:.1f} ms"
+            )
+            candidates.append(Candidate(time_cost, memory_cost, verify))
+    return select_params(candidates, target_p99_ms=target_p99_ms)
+
+
+def select_params(
+    candidates: list[Candidate], *, target_p99_ms: float
+) -> list[Candidate]:
+    """Candidates within the target, most expensive to brute force first."""
+    within_target = [c for c in candidates if c.verify.p99_ms <= target_p99_ms]
+    return sorted(
+        within_target,
+        key=lambda c: (c.time_cost * c.memory_cost, c.memory_cost),
+        reverse=True,
+    )
+
+
+def pool_throughput(*, workers: int, number: int, concurrency: int) -> float:
+    """Verifications per second through a HashingPool with the configured cost."""
+    pool = HashingPool(workers=workers, queue_limit=number)
+    try:
+        hashed = pool.run(_get_password_hash, PASSWORD)
+        # Start every worker process before timing
+        with ThreadPoolExecutor(max_workers=workers) as warmup:
+            list(
+                warmup.map(
+                    lambda _: pool.run(_verify_password, PASSWORD, hashed),
+                    range(workers),
+                )
+            )
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            list(
+                clients.map(
+                    lambda _: pool.run(_verify_password, PASSWORD, hashed),
+                    range(number),
+                )
+            )
+        return number / (time.perf_counter() - started)
+    finally:
+        pool.shutdown()
+
+
+def login_throughput(
+    *, url: str, number: int, concurrency: int, username: str, password: str
+) -> tuple[float, Latency, int]:
+    """Logins per second against a running server, with latency and error count."""
+    endpoint = f"{url.rstrip('/')}{settings.API_V1_STR}/login/access-token"
+    data = {"username": username, "password": password}
+    samples: list[float] = []
+    statuses: list[int] = []
+
+    with httpx.Client(timeout=60) as client:
+
+        def login(_: int) -> None:
+            request_started = time.perf_counter()
+            response = client.post(endpoint, data=data)
+            samples.append(time.perf_counter() - request_started)
+            statuses.append(response.status_code)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            list(clients.map(login, range(number)))
+        elapsed = time.perf_counter() - started
+
+    latency = Latency(
+        p50_ms=percentile(samples, 50) * 1000, p99_ms=percentile(samples, 99) * 1000
+    )
+    errors = sum(status != 200 for status in statuses)
+    return number / elapsed, latency, errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Password hashing latency, login throughput and Argon2 calibration"
+    )
+    parser.add_argument("-n", "--number", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--calibrate",
+        action="store_true",
+        help="try Argon2 costs and recommend the strongest within --target-p99-ms",
+    )
+    parser.add_argument("--target-p99-ms", type=float, default=250.0)
+    parser.add_argument(
+        "--url", help="also measure POST /login/access-token on a running server"
+    )
+    parser.add_argument("--username", default=settings.FIRST_SUPERUSER)
+    parser.add_argument("--password", default=settings.FIRST_SUPERUSER_PASSWORD)
+    args = parser.parse_args()
+
+    logger.info(
+        f"Configured cost: t={settings.ARGON2_TIME_COST} "
+        f"m={settings.ARGON2_MEMORY_COST} p={settings.ARGON2_PARALLELISM}"
+    )
+    hasher = Argon2Hasher(
+        time_cost=settings.ARGON2_TIME_COST,
+        memory_cost=settings.ARGON2_MEMORY_COST,
+        parallelism=settings.ARGON2_PARALLELISM,
+    )
+    hash_latency, verify_latency = measure_hasher(hasher, args.number)
+    logger.info(
+        f"hash p50 {hash_latency.p50_ms:.1f} ms, p99 {hash_latency.p99_ms:.1f} ms; "
+        f"verify p50 {verify_latency.p50_ms:.1f} ms, "
+        f"p99 {verify_latency.p99_ms:.1f} ms"
+    )
+
+    throughput = pool_throughput(
+        workers=args.workers,
+        number=args.number * args.workers,
+        concurrency=args.concurrency,
+    )
+    logger.info(
+        f"Hashing pool with {args.workers} workers: {throughput:.1f} verifies/s, "
+        f"{throughput / args.workers:.1f} per core"
+    )
+
+    if args.url:
+        logins, latency, errors = login_throughput(
+            url=args.url,
+            number=args.number * args.concurrency,
+            concurrency=args.concurrency,
+            username=args.username,
+            password=args.password,
+        )
+        logger.info(
+            f"{args.url}: {logins:.1f} logins/s at concurrency {args.concurrency}, "
+            f"p50 {latency.p50_ms:.1f} ms, p99 {latency.p99_ms:.1f} ms, "
+            f"{errors} errors"
+        )
+
+    if args.calibrate:
+        selected = calibrate(target_p99_ms=args.target_p99_ms, number=args.number)
+        if not selected:
+            logger.warning(f"No candidate verifies within {args.target_p99_ms} ms p99")
+            return
+        best = selected[0]
+        logger.info(
+            f"Recommended for a {args.target_p99_ms:.0f} ms p99 verify target: "
+            f"ARGON2_TIME_COST={best.time_cost} ARGON2_MEMORY_COST={best.memory_cost}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import logging
+import random
+import string
+import time
+import uuid
+
+from sqlalchemy import text
+from sqlmodel import Session, col, delete, func, insert, or_, select
+
+from app.benchmarks.login import Latency, measure
+from app.core.db import engine
+from app.models import Item, User
+from app.services.items import build_search
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMAIL_DOMAIN = "search-benchmark.example.com"
+VOCABULARY_SIZE = 20_000
+
+# Items of random owners with titles of 3 and descriptions of 12 words. Words
+# are skewed towards the start of the vocabulary, like natural language, so a few
+# match a large share of the items and most only a handful
+SEED_ITEMS = text(
+    """
+    INSERT INTO item (id, title, description, owner_id, created_at)
+    SELECT
+        gen_random_uuid(),
+        array_to_string(ARRAY(
+            SELECT (CAST(:words AS text[]))[1 + floor(power(random(), 3) * :vocabulary)::int]
+            FROM generate_series(1, 3) WHERE i > 0
+        ), ' '),
+        array_to_string(ARRAY(
+            SELECT (CAST(:words AS text[]))[1 + floor(power(random(), 3) * :vocabulary)::int]
+            FROM generate_series(1, 12) WHERE i > 0
+        ), ' '),
+        (CAST(:owners AS uuid[]))[1 + floor(random() * :owner_count)::int],
+        now() - random() * interval '365 days'
+    FROM generate_series(1, :rows) AS i
+    """
+)
+
+
+def vocabulary(size: int) -> list[str]:
+    rng = random.Random(0)
+    words: set[str] = set()
+    while len(words) < size:
+        length = rng.randint(4, 9)
+        words.add("".join(rng.choices(string.ascii_lowercase, k=length)))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def seed(session: Session, *, rows: int, owners: int, batch: int) -> list[uuid.UUID]:
+    """Create the owners and their items, return the owner ids."""
+    owner_ids = [uuid.uuid4() for _ in range(owners)]
+    session.exec(
+        insert(User).values(
+            [
+                {
+                    "id": id,
+                    "email": f"{id}@{EMAIL_DOMAIN}",
+                    "hashed_password": "!",
+                    "is_active": False,
+                }
+                for id in owner_ids
+            ]
+        )
+    )
+    session.commit()
+    words = vocabulary(VOCABULARY_SIZE)
+    for done in range(0, rows, batch):
+        size = min(batch, rows - done)
+        params = {
+            "words": words,
+            "vocabulary": len(words),
+            "owners": owner_ids,
+            "owner_count": len(owner_ids),
+            "rows": size,
+        }
+        session.execute(SEED_ITEMS, params)
+        session.commit()
+        logger.info(f"Seeded {done + size} items")
+    session.execute(text("ANALYZE item"))
+    session.commit()
+    return owner_ids
+
+
+def clean(session: Session) -> None:
+    """Delete the benchmark owners, and their items with them."""
+    session.exec(delete(User).where(col(User.email).endswith(f"@{EMAIL_DOMAIN}")))
+    session.commit()
+
+
+def queries() -> dict[str, str]:
+    """Queries matching many, a few and no items of the seeded vocabulary."""
+    words = vocabulary(VOCABULARY_SIZE)
+    return {
+        "common word": words[0],
+        "uncommon word": words[VOCABULARY_SIZE // 10],
+        "rare word": words[-1],
+        "two words": f"{words[0]} {words[1]}",
+        "phrase": f'"{words[0]} {words[1]}"',
+        "no match": "zzzzzzzzzz",
+    }
+
+
+def matches(session: Session, q: str) -> int:
+    statement = build_search(q, owner_id=None, after=None, limit=10**9)
+    return session.exec(select(func.count()).select_from(statement.subquery())).one()
+
+
+def bench_search(
+    session: Session, q: str, *, owner_id: uuid.UUID | None, number: int
+) -> Latency:
+    """Latency of the first page of GET /items/search."""
+    statement = build_search(q, owner_id=owner_id, after=None, limit=100)
+    return measure(lambda: session.exec(statement).all(), number)
+
+
+def bench_scan(session: Session, q: str, *, number: int) -> Latency:
+    """Latency of the substring scan search needed before the GIN index."""
+    pattern = f"%{q}%"
+    statement = (
+        select(Item)
+        .where(
+            or_(col(Item.title).ilike(pattern), col(Item.description).ilike(pattern))
+        )
+        .order_by(col(Item.created_at).desc())
+        .limit(100)
+    )
+    return measure(lambda: session.exec(statement).all(), number)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Item search latency on a seeded table, with and without the "
+        "search vector index"
+    )
+    parser.add_argument("-n", "--number", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--owners", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=100_000)
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the seeded items for another run"
+    )
+    parser.add_argument(
+        "--no-seed", action="store_true", help="use the items kept by --keep"
+    )
+    parser.add_argument(
+        "--scan", action="store_true", help="also time an ILIKE scan of the items"
+    )
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        try:
+            if args.no_seed:
+                statement = select(User.id).where(
+                    col(User.email).endswith(f"@{EMAIL_DOMAIN}")
+                )
+                owner_ids = list(session.exec(statement).all())
+            else:
+                clean(session)
+                started = time.perf_counter()
+                owner_ids = seed(
+                    session, rows=args.rows, owners=args.owners, batch=args.batch
+                )
+                logger.info(f"Seeded in {time.perf_counter() - started:.1f} s")
+            for name, q in queries().items():
+                count = matches(session, q)
+                everyone = bench_search(session, q, owner_id=None, number=args.number)
+                owner = bench_search(
+                    session, q, owner_id=owner_ids[0], number=args.number
+                )
+                logger.info(
+                    f"{name} ({count} matches): superuser p50 "
+                    f"{everyone.p50_ms:.1f} ms, p99 {everyone.p99_ms:.1f} ms; "
+                    f"owner p50 {owner.p50_ms:.1f} ms, p99 {owner.p99_ms:.1f} ms"
+                )
+                if args.scan:
+                    scan = bench_scan(session, q.strip('"'), number=args.number)
+                    logger.info(
+                        f"{name} ILIKE scan: p50 {scan.p50_ms:.1f} ms, "
+                        f"p99 {scan.p99_ms:.1f} ms"
+                    )
+        finally:
+            if not args.keep:
+                session.rollback()
+                clean(session)
+
+
+if __name__ == "__main__":
+    main()
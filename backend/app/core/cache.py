@@ -0,0 +1,115 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Generic, TypeVar
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.models import TokenPayload, UserSearchResult
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class CacheStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Thread safe LRU cache whose entries also expire after a TTL.
+
+    Each web worker has its own instances, so entries can be stale for up to
+    the TTL after a write handled by another worker.
+    """
+
+    def __init__(self, *, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """Store value, ttl overrides the cache wide TTL for this entry."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if self.max_size <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                size=len(self._data),
+                max_size=self.max_size,
+                hits=self._hits,
+                misses=self._misses,
+            )
+
+
+# User columns needed to authorize a request, keyed by str(user.id).
+# hashed_password is left out on purpose, it is lazy loaded when a route needs it.
+user_cache: TTLCache[str, dict[str, Any]] = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS
+)
+
+# Decoded and validated access tokens keyed by the SHA-256 of the token, entries
+# expire with the token so the cache never outlives the exp claim
+token_cache: TTLCache[bytes, TokenPayload] = TTLCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+
+# User.token_version keyed by str(user.id), checked against the "ver" claim
+token_version_cache: TTLCache[str, int] = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl=settings.TOKEN_VERSION_CACHE_TTL_SECONDS,
+)
+
+# Users who wrote within READ_YOUR_WRITES_SECONDS, their reads skip the replicas
+read_your_writes_cache: TTLCache[str, bool] = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE, ttl=settings.READ_YOUR_WRITES_SECONDS
+)
+
+# GET /users/search results keyed by normalized prefix, limit and whether
+# inactive users are included. The same for every caller with those
+user_search_cache: TTLCache[tuple[str, int, bool], list[UserSearchResult]] = TTLCache(
+    max_size=settings.USER_SEARCH_CACHE_MAX_SIZE,
+    ttl=settings.USER_SEARCH_CACHE_TTL_SECONDS,
+)
+
+
+def invalidate_user(user_id: uuid.UUID | str) -> None:
+    """Drop everything this worker caches about a user, call it after writes."""
+    user_cache.invalidate(str(user_id))
+    token_version_cache.invalidate(str(user_id))
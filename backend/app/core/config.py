@@ -7,6 +7,7 @@ from pydantic import (
     BeforeValidator,
     EmailStr,
     HttpUrl,
+    IPvAnyNetwork,
     PostgresDsn,
     computed_field,
     model_validator,
@@ -68,6 +69,149 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Hot standbys serving GET and HEAD requests, as host or host:port, with the
+    # primary's user, password and database. Empty sends everything to the primary
+    POSTGRES_REPLICA_SERVERS: Annotated[
+        list[str] | str, BeforeValidator(parse_cors)
+    ] = []
+    # A user's reads go to the primary for this long after their last write, to
+    # cover replica lag
+    READ_YOUR_WRITES_SECONDS: int = 5
+    # A replica that failed to connect is skipped for this long
+    DB_REPLICA_RETRY_SECONDS: int = 30
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def SQLALCHEMY_REPLICA_URIS(self) -> list[PostgresDsn]:
+        uris = []
+        for server in self.POSTGRES_REPLICA_SERVERS:
+            host, _, port = server.partition(":")
+            uris.append(
+                PostgresDsn.build(
+                    scheme="postgresql+psycopg",
+                    username=self.POSTGRES_USER,
+                    password=self.POSTGRES_PASSWORD,
+                    host=host,
+                    port=int(port) if port else self.POSTGRES_PORT,
+                    path=self.POSTGRES_DB,
+                )
+            )
+        return uris
+
+    # Connection pool of the engine serving the routes in each web worker, the
+    # async one with DB_ASYNC and the sync one otherwise. Unset sizes split
+    # POSTGRES_MAX_CONNECTIONS, less DB_RESERVED_CONNECTIONS for migrations and
+    # psql, between the WEB_CONCURRENCY workers, half kept open and half overflow
+    POSTGRES_MAX_CONNECTIONS: int = 100
+    DB_RESERVED_CONNECTIONS: int = 10
+    WEB_CONCURRENCY: int = 4
+    DB_POOL_SIZE: int | None = None
+    DB_MAX_OVERFLOW: int | None = None
+    # Connections of the other engine in each worker, taken out of its share. It
+    # still serves login, rate limiting, exports and partition maintenance
+    DB_SECONDARY_POOL_SIZE: int = 4
+    DB_POOL_TIMEOUT: float = 10.0  # seconds to wait for a connection before a 500
+    DB_POOL_RECYCLE: int = 1800  # seconds, reconnect before idle timeouts on the way
+    DB_POOL_PRE_PING: bool = True
+    # Connections opened when a worker starts, so its first requests don't pay for
+    # the TCP and auth handshakes
+    DB_POOL_WARMUP: int = 2
+    # Statements slower than this are logged to app.slow_query with their route,
+    # None disables the log
+    DB_SLOW_QUERY_SECONDS: float | None = 0.5
+    # Server-Timing header with the auth, db, serialize and total times of each
+    # response, shown by browser dev tools
+    SERVER_TIMING_ENABLED: bool = True
+
+    @property
+    def _db_connections_per_worker(self) -> int:
+        available = self.POSTGRES_MAX_CONNECTIONS - self.DB_RESERVED_CONNECTIONS
+        per_worker = available // max(1, self.WEB_CONCURRENCY)
+        return max(2, per_worker - self.DB_SECONDARY_POOL_SIZE)
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def db_pool_size(self) -> int:
+        if self.DB_POOL_SIZE is not None:
+            return self.DB_POOL_SIZE
+        return self._db_connections_per_worker // 2
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def db_max_overflow(self) -> int:
+        if self.DB_MAX_OVERFLOW is not None:
+            return self.DB_MAX_OVERFLOW
+        return max(0, self._db_connections_per_worker - self.db_pool_size)
+
+    # Serve the item, user and notification routes with AsyncSession instead of
+    # the threadpool-bound sync Session
+    DB_ASYNC: bool = False
+
+    # Largest page of the list routes, their /export routes stream all the rows
+    PAGE_LIMIT_MAX: int = 1000
+    # Rows the /export routes fetch per round trip from their server-side cursor
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # Processes per web worker used for Argon2 hashing, 0 hashes in the caller
+    PASSWORD_HASH_WORKERS: int = 2
+    # Hash jobs allowed in flight per web worker before requests get a 503
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32
+    # Argon2id cost of new hashes, older hashes are upgraded on their next login.
+    # Calibrate with `python -m app.benchmarks.login --calibrate`
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+    # Jobs of the password hashing pool a bulk user import keeps queued, None is
+    # one per PASSWORD_HASH_WORKERS and 0 hashes in the caller. Rows are checked,
+    # hashed and loaded in batches
+    USER_IMPORT_HASH_WORKERS: int | None = None
+    USER_IMPORT_BATCH_SIZE: int = 1000
+
+    # Per worker cache of the authenticated user, 0 disables it. Bounds how long
+    # another worker can keep serving a deactivated user
+    USER_CACHE_TTL_SECONDS: int = 30
+    USER_CACHE_MAX_SIZE: int = 10_000
+    # Per worker cache of GET /users/search results, also sent as its max-age.
+    # Bounds how long a new user can be missing from the results
+    USER_SEARCH_CACHE_TTL_SECONDS: int = 10
+    # Shorter prefixes find no one for users other than superusers, so the
+    # directory can't be listed a letter at a time
+    USER_SEARCH_MIN_PREFIX_LENGTH: int = 3
+    USER_SEARCH_CACHE_MAX_SIZE: int = 10_000
+
+    # Put is_active, is_superuser and the user's token_version in access tokens,
+    # read-only routes then authorize from the claims plus a cached version check
+    ACCESS_TOKEN_CLAIMS: bool = False
+    TOKEN_VERSION_CACHE_TTL_SECONDS: int = 30
+
+    # Verified JWT payloads kept until their exp, 0 disables the cache
+    TOKEN_CACHE_MAX_SIZE: int = 10_000
+
+    # Token bucket limits on login, signup, password recovery and other expensive
+    # routes. "memory" buckets are per worker, "postgres" shares them between
+    # workers and hosts
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: Literal["memory", "postgres"] = "memory"
+    # Networks of the proxies in front, e.g. Traefik, whose X-Forwarded-For is
+    # believed for the client IP of the limits. Empty uses the connection's peer
+    TRUSTED_PROXIES: Annotated[
+        list[IPvAnyNetwork] | str, BeforeValidator(parse_cors)
+    ] = []
+
+    # Notifications are partitioned by month of created_at, partitions are made
+    # this many months ahead. Whole months older than the retention are dropped,
+    # None keeps them forever
+    NOTIFICATION_PARTITIONS_AHEAD: int = 3
+    NOTIFICATION_RETENTION_MONTHS: int | None = None
+
+    # Directory the workers write their metrics to, for /metrics to add up all of
+    # them. None serves the metrics of the worker answering the scrape only
+    METRICS_DIR: str | None = None
+    METRICS_WRITE_SECONDS: float = 5.0
+    # Bearer token /metrics requires. Without it /metrics is open with
+    # ENVIRONMENT=local and refused otherwise
+    METRICS_TOKEN: str | None = None
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -1,10 +1,305 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections.abc import MutableMapping
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Generic, TypeVar
+
+from pydantic import BaseModel
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection, QueuePool
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
 from app.models import User, UserCreate
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+E = TypeVar("E", Engine, AsyncEngine)
+
+slow_query_logger = logging.getLogger("app.slow_query")
+
+
+class PoolStats(BaseModel):
+    pool_size: int
+    max_overflow: int
+    checked_out: int
+    overflow: int
+    idle: int
+    checkouts: int
+    timeouts: int
+    wait_seconds_avg: float
+    wait_seconds_max: float
+
+
+class PoolTelemetry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, elapsed: float, *, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.wait_total += elapsed
+                self.wait_max = max(self.wait_max, elapsed)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.telemetry = PoolTelemetry()
+
+    def connect(self) -> PoolProxiedConnection:
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.telemetry.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.telemetry.record(time.perf_counter() - started, timed_out=False)
+        return connection
+
+    def recreate(self) -> QueuePool:
+        # engine.dispose() swaps in a new pool, keep counting across it
+        pool = super().recreate()
+        if isinstance(pool, InstrumentedQueuePool):
+            pool.telemetry = self.telemetry
+        return pool
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    pass
+
+
+def get_pool_stats(engine: Engine | AsyncEngine) -> PoolStats:
+    pool = engine.pool
+    assert isinstance(pool, InstrumentedQueuePool)
+    telemetry = pool.telemetry
+    return PoolStats(
+        pool_size=pool.size(),
+        max_overflow=pool._max_overflow,
+        checked_out=pool.checkedout(),
+        # overflow() counts up from -pool_size until the pool is full
+        overflow=max(0, pool.overflow()),
+        idle=pool.checkedin(),
+        checkouts=telemetry.checkouts,
+        timeouts=telemetry.timeouts,
+        wait_seconds_avg=(
+            telemetry.wait_total / telemetry.checkouts if telemetry.checkouts else 0.0
+        ),
+        wait_seconds_max=telemetry.wait_max,
+    )
+
+
+@dataclass
+class QueryStats:
+    statements: int = 0
+    seconds: float = 0.0
+    # ASGI scope of the request, holds the route once it is matched
+    scope: MutableMapping[str, Any] | None = None
+
+    @property
+    def route_id(self) -> str | None:
+        route = self.scope.get("route") if self.scope else None
+        return getattr(route, "unique_id", None)
+
+
+# Statements of the current request, set by app.api.profiling. Sync routes run
+# in a copy of the request's context, they add to the same QueryStats
+current_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "current_query_stats", default=None
+)
+
+PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# Expanded IN lists, so their length doesn't make a new fingerprint
+VALUE_LIST = re.compile(r"\(\?(?:, \?)+\)")
+
+
+def normalize_statement(statement: str) -> str:
+    """Statement with its parameters and literals replaced by ?."""
+    normalized = " ".join(statement.split())
+    normalized = LITERAL.sub("?", PLACEHOLDER.sub("?", normalized))
+    return VALUE_LIST.sub("(?)", normalized)
+
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha256(normalize_statement(statement).encode()).hexdigest()[:16]
+
+
+def count_parameters(parameters: Any, executemany: bool) -> int:
+    if executemany:
+        return sum(len(row) for row in parameters)
+    return len(parameters) if parameters else 0
+
+
+def log_slow_query(
+    statement: str, parameters: Any, executemany: bool, seconds: float
+) -> None:
+    stats = current_query_stats.get()
+    entry = {
+        "event": "slow_query",
+        "route": stats.route_id if stats else None,
+        "fingerprint": fingerprint(statement),
+        "parameters": count_parameters(parameters, executemany),
+        "duration_ms": round(seconds * 1000, 1),
+        "statement": normalize_statement(statement)[:1000],
+    }
+    slow_query_logger.warning(json.dumps(entry), extra={"slow_query": entry})
+
+
+# Listening on the Engine class counts every engine: the primary, the replicas
+# and the sync engines behind the async ones
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(*args: Any) -> None:
+    context = args[4]
+    context.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_query(*args: Any) -> None:
+    statement, parameters, context, executemany = args[2:6]
+    elapsed = time.perf_counter() - context.query_started
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += elapsed
+    threshold = settings.DB_SLOW_QUERY_SECONDS
+    if threshold is not None and elapsed >= threshold:
+        log_slow_query(statement, parameters, executemany, elapsed)
+
+
+common_pool_options: dict[str, Any] = {
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+}
+# Both engines are used whatever DB_ASYNC is, the one serving the routes gets
+# most of the worker's connections and the other DB_SECONDARY_POOL_SIZE
+primary_pool_options: dict[str, Any] = {
+    **common_pool_options,
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+}
+# Half kept open and half overflow, as the primary pool by default
+secondary_pool_size = settings.DB_SECONDARY_POOL_SIZE // 2
+secondary_pool_options: dict[str, Any] = {
+    **common_pool_options,
+    "pool_size": secondary_pool_size,
+    "max_overflow": settings.DB_SECONDARY_POOL_SIZE - secondary_pool_size,
+}
+if settings.DB_ASYNC:
+    sync_pool_options, async_pool_options = secondary_pool_options, primary_pool_options
+else:
+    sync_pool_options, async_pool_options = primary_pool_options, secondary_pool_options
+
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedQueuePool,
+    **sync_pool_options,
+)
+# psycopg 3 serves both engines
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedAsyncQueuePool,
+    **async_pool_options,
+)
+
+
+class ReplicaSet(Generic[E]):
+    """Round robin over replica engines, skipping those that recently failed."""
+
+    def __init__(self, engines: list[E], *, retry_seconds: float) -> None:
+        self.engines: list[E] = engines
+        self.retry_seconds = retry_seconds
+        self._down_until = [0.0] * len(engines)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def choose(self) -> E | None:
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.engines)):
+                index = self._next
+                self._next = (self._next + 1) % len(self.engines)
+                if self._down_until[index] <= now:
+                    return self.engines[index]
+        return None
+
+    def mark_down(self, engine: E) -> None:
+        with self._lock:
+            index = self.engines.index(engine)
+            self._down_until[index] = time.monotonic() + self.retry_seconds
+
+
+# A replica that is down should fail fast so the request can use the primary.
+# Each replica splits its connections between the engines like the primary
+replica_connect_args = {"connect_timeout": 2}
+
+replicas = ReplicaSet(
+    [
+        create_engine(
+            str(uri),
+            poolclass=InstrumentedQueuePool,
+            connect_args=replica_connect_args,
+            **sync_pool_options,
+        )
+        for uri in settings.SQLALCHEMY_REPLICA_URIS
+    ],
+    retry_seconds=settings.DB_REPLICA_RETRY_SECONDS,
+)
+async_replicas = ReplicaSet(
+    [
+        create_async_engine(
+            str(uri),
+            poolclass=InstrumentedAsyncQueuePool,
+            connect_args=replica_connect_args,
+            **async_pool_options,
+        )
+        for uri in settings.SQLALCHEMY_REPLICA_URIS
+    ],
+    retry_seconds=settings.DB_REPLICA_RETRY_SECONDS,
+)
+
+
+def get_engines() -> dict[str, Engine | AsyncEngine]:
+    """Every engine of this worker, by the name its pool stats are reported as."""
+    engines: dict[str, Engine | AsyncEngine] = {
+        "sync": engine,
+        "async": async_engine,
+    }
+    for i, replica in enumerate(replicas.engines):
+        engines[f"sync_replica_{i}"] = replica
+    for i, async_replica in enumerate(async_replicas.engines):
+        engines[f"async_replica_{i}"] = async_replica
+    return engines
+
+
+def warm_up_pool() -> None:
+    count = min(settings.DB_POOL_WARMUP, settings.db_pool_size)
+    connections = [engine.connect() for _ in range(count)]
+    for connection in connections:
+        connection.close()
+
+
+async def warm_up_async_pool() -> None:
+    count = min(settings.DB_POOL_WARMUP, settings.db_pool_size)
+    connections = [await async_engine.connect() for _ in range(count)]
+    for connection in connections:
+        await connection.close()
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
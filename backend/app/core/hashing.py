@@ -0,0 +1,162 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class HashingPoolBusyError(Exception):
+    """Raised when the hashing queue is full, surfaced to clients as a 503."""
+
+
+def _map_chunk(fn: Callable[[T], R], chunk: list[T]) -> list[R]:
+    return [fn(item) for item in chunk]
+
+
+class HashingPoolStats(BaseModel):
+    workers: int
+    queue_depth: int
+    queue_limit: int
+    completed: int
+    rejected: int
+    latency_seconds_avg: float
+    latency_seconds_max: float
+
+
+class HashingPool:
+    """
+    Bounded process pool for CPU bound password hashing.
+
+    Jobs beyond queue_limit are rejected immediately instead of piling up behind
+    the pool, so a login burst cannot hold every request thread.
+    """
+
+    def __init__(self, *, workers: int, queue_limit: int) -> None:
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._queue_depth = 0
+        self._completed = 0
+        self._rejected = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that holds DB connections and threads
+                # is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _acquire(self, *, wait: bool = False) -> float:
+        with self._lock:
+            if wait:
+                self._released.wait_for(
+                    lambda: self._queue_depth < max(self.queue_limit, 1)
+                )
+            elif self._queue_depth >= self.queue_limit:
+                self._rejected += 1
+                raise HashingPoolBusyError("Password hashing queue is full")
+            self._queue_depth += 1
+        return time.perf_counter()
+
+    def _release(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._queue_depth -= 1
+            self._completed += 1
+            self._latency_total += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+            self._released.notify()
+
+    def _submit(
+        self, fn: Callable[..., T], *args: Any, wait: bool = False
+    ) -> "Future[T]":
+        started = self._acquire(wait=wait)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._release(started)
+            raise
+        future.add_done_callback(lambda _: self._release(started))
+        return future
+
+    def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn in the pool, blocking the calling thread until it is done."""
+        if self.workers <= 0:
+            started = self._acquire()
+            try:
+                return fn(*args)
+            finally:
+                self._release(started)
+        return self._submit(fn, *args).result()
+
+    async def run_async(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn in the pool without blocking the event loop."""
+        if self.workers <= 0:
+            return self.run(fn, *args)
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def map(
+        self, fn: Callable[[T], R], items: list[T], *, chunksize: int, in_flight: int
+    ) -> list[R]:
+        """
+        Run fn on every item in the pool, chunksize items per job, blocking the
+        calling thread. For bulk work: at most in_flight jobs are queued at a
+        time and they wait for room in the queue instead of being rejected, the
+        rest of it stays free for requests.
+        """
+        if self.workers <= 0 or in_flight <= 0:
+            return _map_chunk(fn, items)
+        pending: deque[Future[list[R]]] = deque()
+        results: list[R] = []
+        for start in range(0, len(items), chunksize):
+            if len(pending) >= in_flight:
+                results += pending.popleft().result()
+            chunk = items[start : start + chunksize]
+            pending.append(self._submit(_map_chunk, fn, chunk, wait=True))
+        while pending:
+            results += pending.popleft().result()
+        return results
+
+    def stats(self) -> HashingPoolStats:
+        with self._lock:
+            return HashingPoolStats(
+                workers=self.workers,
+                queue_depth=self._queue_depth,
+                queue_limit=self.queue_limit,
+                completed=self._completed,
+                rejected=self._rejected,
+                latency_seconds_avg=(
+                    self._latency_total / self._completed if self._completed else 0.0
+                ),
+                latency_seconds_max=self._latency_max,
+            )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+hashing_pool = HashingPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_limit=settings.PASSWORD_HASH_QUEUE_LIMIT,
+)
@@ -0,0 +1,372 @@
+"""
+Prometheus metrics, in the text exposition format.
+
+Every worker keeps its own samples. With METRICS_DIR set, each one writes them
+to METRICS_DIR/worker-<id>.json every METRICS_WRITE_SECONDS and when it stops,
+and /metrics adds up the files of all workers. The files of exited workers are
+folded into exited.json, their counters and histograms keep counting there so
+they never go down, their gauges are dropped.
+
+prometheus_client's multiprocess mode does the same with mmap files, but it
+isn't a dependency, its files of exited workers are never compacted either and
+it has no per worker gauges labelled by pid, hence this small implementation.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from typing import Any, Literal, TypeVar
+
+from anyio import to_thread
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Kind = Literal["counter", "gauge", "histogram"]
+Labels = tuple[tuple[str, str], ...]
+
+# Request latencies, in seconds
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    7.5,
+    10.0,
+)
+
+
+# Files of live workers, and the one their samples are folded into once exited
+WORKER_FILES = "worker-*.json"
+EXITED_FILE = "exited.json"
+# Writes a live worker may miss before its file counts as one of an exited
+# worker, e.g. when its pid was reused
+MISSED_WRITES = 12
+
+# Unlike pids never reused, new in every forked worker
+worker_id = uuid.uuid4().hex
+
+
+def new_worker_id() -> None:
+    global worker_id
+    worker_id = uuid.uuid4().hex
+
+
+os.register_at_fork(after_in_child=new_worker_id)
+
+
+class Metric:
+    kind: Kind
+
+    def __init__(
+        self, name: str, description: str, *, per_worker: bool = False
+    ) -> None:
+        self.name = name
+        self.description = description
+        # Gauges that make no sense added up, exported with a pid label instead
+        self.per_worker = per_worker
+        self._lock = threading.Lock()
+
+    def samples(self) -> dict[Labels, Any]:
+        raise NotImplementedError
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class Counter(Metric):
+    kind: Kind = "counter"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels: str) -> None:
+        """Replace the value, for totals kept elsewhere and read by a collector."""
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def samples(self) -> dict[Labels, Any]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Counter):
+    kind: Kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, description: str, *, buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, description)
+        self.buckets = sorted(buckets)
+        # Per label set: the count of each bucket and of +Inf, not cumulative,
+        # then the sum of the observed values
+        self._values: dict[Labels, list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        index = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        with self._lock:
+            counts = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self) -> dict[Labels, Any]:
+        with self._lock:
+            return {key: list(counts) for key, counts in self._values.items()}
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+        # Called before each snapshot, to set gauges read from elsewhere
+        self.collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: M) -> M:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self.register(Counter(name, description))
+
+    def gauge(self, name: str, description: str, *, per_worker: bool = False) -> Gauge:
+        return self.register(Gauge(name, description, per_worker=per_worker))
+
+    def histogram(self, name: str, description: str) -> Histogram:
+        return self.register(Histogram(name, description))
+
+    def collect(self) -> None:
+        """
+        Run the collectors, on the event loop as the threadpool one reads it,
+        before write or render take the snapshot in a thread.
+        """
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception:
+                logger.exception("Metrics collector failed")
+
+    def snapshot(self) -> dict[str, Any]:
+        """This worker's samples, as written to METRICS_DIR."""
+        pid = str(os.getpid())
+        metrics = {}
+        for name, metric in self.metrics.items():
+            samples = []
+            for labels, value in metric.samples().items():
+                labels_dict = dict(labels)
+                if metric.per_worker:
+                    labels_dict["pid"] = pid
+                samples.append([labels_dict, value])
+            metrics[name] = {
+                "kind": metric.kind,
+                "description": metric.description,
+                "buckets": getattr(metric, "buckets", None),
+                "samples": samples,
+            }
+        return {"pid": os.getpid(), "worker": worker_id, "metrics": metrics}
+
+    def write(self, directory: str) -> None:
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        write_atomically(path / f"worker-{worker_id}.json", self.snapshot())
+
+    def render(self) -> str:
+        """All workers' metrics in the Prometheus text format."""
+        if settings.METRICS_DIR:
+            self.write(settings.METRICS_DIR)
+            compact(settings.METRICS_DIR)
+            snapshots = read_snapshots(settings.METRICS_DIR)
+        else:
+            snapshots = [self.snapshot()]
+        return render(merge(snapshots))
+
+
+def write_atomically(target: Path, snapshot: dict[str, Any]) -> None:
+    temporary = target.with_suffix(".tmp")
+    temporary.write_text(json.dumps(snapshot))
+    # Readers see the previous file or this one, never half of it
+    os.replace(temporary, target)
+
+
+def is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_snapshot(path: Path) -> dict[str, Any] | None:
+    try:
+        snapshot: dict[str, Any] = json.loads(path.read_text())
+    except (OSError, ValueError):
+        # Replaced or removed while reading
+        return None
+    return snapshot
+
+
+def read_snapshots(directory: str) -> list[dict[str, Any]]:
+    paths = [*Path(directory).glob(WORKER_FILES), Path(directory) / EXITED_FILE]
+    return [s for s in map(read_snapshot, paths) if s is not None]
+
+
+def has_exited(path: Path, snapshot: dict[str, Any]) -> bool:
+    if not is_alive(snapshot["pid"]):
+        return True
+    try:
+        age = time.time() - path.stat().st_mtime
+    except OSError:
+        return False
+    return age > MISSED_WRITES * settings.METRICS_WRITE_SECONDS
+
+
+def compact(directory: str) -> None:
+    """
+    Fold the files of exited workers into EXITED_FILE, without their gauges, and
+    remove them. The workers compacting at the same time take turns, and the ids
+    of the folded files are kept until they are gone, so that a file is never
+    folded twice.
+    """
+    path = Path(directory)
+    with (path / ".lock").open("w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited_path = path / EXITED_FILE
+        exited = read_snapshot(exited_path) or {
+            "pid": None,
+            "worker": None,
+            "compacted": [],
+            "metrics": {},
+        }
+        files = [(file, read_snapshot(file)) for file in path.glob(WORKER_FILES)]
+        dead = {
+            file: snapshot
+            for file, snapshot in files
+            if snapshot is not None and has_exited(file, snapshot)
+        }
+        if not dead:
+            return
+        compacted = set(exited["compacted"])
+        merged = merge(
+            [exited] + [s for s in dead.values() if s["worker"] not in compacted],
+            gauges=False,
+        )
+        exited["compacted"] = [s["worker"] for s in dead.values()]
+        exited["metrics"] = {
+            name: {
+                **metric,
+                "samples": [[dict(k), v] for k, v in metric["samples"].items()],
+            }
+            for name, metric in merged.items()
+        }
+        write_atomically(exited_path, exited)
+        for file in dead:
+            file.unlink(missing_ok=True)
+
+
+def merge(
+    snapshots: list[dict[str, Any]], *, gauges: bool = True
+) -> dict[str, dict[str, Any]]:
+    merged: dict[str, dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot["metrics"].items():
+            if metric["kind"] == "gauge" and not gauges:
+                continue
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(sorted(labels.items()))
+                if isinstance(value, list):
+                    previous = target["samples"].get(key, [0.0] * len(value))
+                    target["samples"][key] = [
+                        a + b for a, b in zip(previous, value, strict=True)
+                    ]
+                else:
+                    target["samples"][key] = target["samples"].get(key, 0.0) + value
+    return merged
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def render(metrics: dict[str, dict[str, Any]]) -> str:
+    lines = []
+    for name, metric in sorted(metrics.items()):
+        lines.append(f"# HELP {name} {metric['description']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for labels, value in sorted(metric["samples"].items()):
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                continue
+            cumulative = 0.0
+            for bound, count in zip(
+                [*metric["buckets"], math.inf], value[:-1], strict=True
+            ):
+                cumulative += count
+                bucket = format_labels((*labels, ("le", format_value(bound))))
+                lines.append(f"{name}_bucket{bucket} {format_value(cumulative)}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_value(value[-1])}")
+            lines.append(
+                f"{name}_count{format_labels(labels)} {format_value(cumulative)}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+async def write_metrics_periodically() -> None:
+    """Run by every worker with METRICS_DIR set."""
+    assert settings.METRICS_DIR
+    while True:
+        try:
+            registry.collect()
+            await to_thread.run_sync(registry.write, settings.METRICS_DIR)
+        except Exception:
+            logger.exception("Writing metrics failed")
+        await asyncio.sleep(settings.METRICS_WRITE_SECONDS)
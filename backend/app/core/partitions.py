@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlmodel import Session, col, delete
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Monthly partitions of notification cover [start, start + 1 month) in UTC, rows
+# outside all of them go to notification_default
+PARTITION_NAME = re.compile(r"notification_(p(?P<year>\d{4})_(?P<month>\d{2})|default)")
+DEFAULT_PARTITION = "notification_default"
+
+# pg_advisory_xact_lock key, one maintenance run at a time across workers
+MAINTENANCE_LOCK = 0x6E6F7469
+MAINTENANCE_INTERVAL_SECONDS = 6 * 60 * 60
+
+# Dropping a partition skips the delete trigger, take its unread notifications
+# off the counters first
+UNCOUNT_PARTITION = """
+    UPDATE notificationcounter AS c SET unread = c.unread - d.unread
+    FROM (
+        SELECT user_id, count(*) AS unread FROM {partition} WHERE NOT is_read
+        GROUP BY user_id
+    ) AS d
+    WHERE c.user_id = d.user_id
+"""
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"notification_p{month:%Y_%m}"
+
+
+def get_partitions(session: Session) -> dict[date, str]:
+    """Monthly partitions attached to notification, by first day of the month."""
+    names = session.execute(
+        text(
+            """
+            SELECT c.relname FROM pg_inherits AS i
+            JOIN pg_class AS c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'notification'::regclass
+            """
+        )
+    ).scalars()
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.fullmatch(name)
+        if match and match["year"]:
+            partitions[date(int(match["year"]), int(match["month"]), 1)] = name
+    return partitions
+
+
+def create_partition(session: Session, month: date) -> str:
+    """
+    Create and attach the partition of month, moving in the rows the default
+    partition got for it. Moving them partition to partition skips the triggers
+    on notification, unread counts are unchanged.
+    """
+    name = partition_name(month)
+    end = add_months(month, 1)
+    bounds = {
+        "start": datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+        "end": datetime(end.year, end.month, 1, tzinfo=timezone.utc),
+    }
+    session.execute(
+        text(f"CREATE TABLE {name} (LIKE notification INCLUDING ALL EXCLUDING INDEXES)")
+    )
+    session.execute(
+        text(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE created_at >= :start AND created_at < :end
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """
+        ),
+        bounds,
+    )
+    # Creates the parent's indexes and foreign key on it
+    session.execute(
+        text(
+            f"""
+            ALTER TABLE notification ATTACH PARTITION {name}
+            FOR VALUES FROM ('{bounds["start"].isoformat()}')
+            TO ('{bounds["end"].isoformat()}')
+            """
+        )
+    )
+    return name
+
+
+def drop_partitions(session: Session, *, before: date) -> list[str]:
+    """
+    Drop the monthly partitions that end by before, and delete the default
+    partition's rows created before it.
+    """
+    expired = [
+        name
+        for month, name in sorted(get_partitions(session).items())
+        if add_months(month, 1) <= before
+    ]
+    if expired:
+        # Taken up front, in the order readers and writers of notification do
+        session.execute(text("LOCK TABLE notification IN ACCESS EXCLUSIVE MODE"))
+    for name in expired:
+        session.execute(text(UNCOUNT_PARTITION.format(partition=name)))
+        session.execute(text(f"DROP TABLE {name}"))
+    # Only the default partition can have rows left before it, as a plain
+    # DELETE through notification its triggers keep the counters
+    cutoff = datetime(before.year, before.month, 1, tzinfo=timezone.utc)
+    session.exec(delete(Notification).where(col(Notification.created_at) < cutoff))
+    return expired
+
+
+def maintain_partitions(
+    session: Session, *, today: date | None = None
+) -> tuple[list[str], list[str]]:
+    """
+    Create the partitions of this month and NOTIFICATION_PARTITIONS_AHEAD months
+    ahead, and drop whole months past NOTIFICATION_RETENTION_MONTHS. Returns the
+    names of the created and dropped partitions.
+    """
+    this_month = (today or datetime.now(timezone.utc).date()).replace(day=1)
+    session.execute(
+        text("SELECT pg_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK}
+    )
+    existing = get_partitions(session)
+    created = [
+        create_partition(session, month)
+        for month in (
+            add_months(this_month, months)
+            for months in range(settings.NOTIFICATION_PARTITIONS_AHEAD + 1)
+        )
+        if month not in existing
+    ]
+    dropped = []
+    if settings.NOTIFICATION_RETENTION_MONTHS is not None:
+        before = add_months(this_month, -settings.NOTIFICATION_RETENTION_MONTHS)
+        dropped = drop_partitions(session, before=before)
+    session.commit()
+    return created, dropped
+
+
+def run_maintenance() -> None:
+    with Session(engine) as session:
+        created, dropped = maintain_partitions(session)
+    if created or dropped:
+        logger.info(f"Notification partitions created: {created}, dropped: {dropped}")
+
+
+async def maintain_partitions_periodically() -> None:
+    """Run by every worker, the advisory lock keeps runs from overlapping."""
+    while True:
+        try:
+            await run_in_threadpool(run_maintenance)
+        except Exception:
+            logger.exception("Notification partition maintenance failed")
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Maintaining notification partitions")
+    run_maintenance()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,15 @@ from pwdlib.hashers.argon2 import Argon2Hasher
 from pwdlib.hashers.bcrypt import BcryptHasher
 
 from app.core.config import settings
+from app.core.hashing import hashing_pool
 
 password_hash = PasswordHash(
     (
-        Argon2Hasher(),
+        Argon2Hasher(
+            time_cost=settings.ARGON2_TIME_COST,
+            memory_cost=settings.ARGON2_MEMORY_COST,
+            parallelism=settings.ARGON2_PARALLELISM,
+        ),
         BcryptHasher(),
     )
 )
@@ -19,18 +24,58 @@ password_hash = PasswordHash(
 ALGORITHM = "HS256"
 
 
-def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
+def create_access_token(
+    subject: str | Any,
+    expires_delta: timedelta,
+    claims: dict[str, Any] | None = None,
+) -> str:
     expire = datetime.now(timezone.utc) + expires_delta
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {**(claims or {}), "exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-def verify_password(
+# The two functions below run inside the hashing pool processes
+
+
+def _verify_password(
     plain_password: str, hashed_password: str
 ) -> tuple[bool, str | None]:
     return password_hash.verify_and_update(plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
+def _get_password_hash(password: str) -> str:
     return password_hash.hash(password)
+
+
+def verify_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return hashing_pool.run(_verify_password, plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    return hashing_pool.run(_get_password_hash, password)
+
+
+def hash_passwords(passwords: list[str], *, in_flight: int) -> list[str]:
+    """
+    Hash many passwords in the shared hashing pool, in_flight jobs at a time, 0
+    hashes in the caller.
+    """
+    # Each hash takes tens of milliseconds, a few per job hide the overhead
+    return hashing_pool.map(
+        _get_password_hash, passwords, chunksize=8, in_flight=in_flight
+    )
+
+
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await hashing_pool.run_async(
+        _verify_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await hashing_pool.run_async(_get_password_hash, password)
@@ -2,8 +2,16 @@ import uuid
 from typing import Any
 
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
+from app.core.cache import invalidate_user
+from app.core.config import settings
+from app.core.security import (
+    get_password_hash,
+    get_password_hash_async,
+    verify_password,
+    verify_password_async,
+)
 from app.models import Item, ItemCreate, User, UserCreate, UserUpdate
 
 
@@ -17,6 +25,19 @@ def create_user(*, session: Session, user_create: UserCreate) -> User:
     return db_obj
 
 
+def revoke_tokens(db_user: User) -> None:
+    """Invalidate every access token issued to the user, on the next flush."""
+    # Incremented in SQL, the instance may come from a stale cache entry
+    db_user.token_version = User.token_version + 1
+
+
+def _revokes_tokens(db_user: User, user_data: dict[str, Any]) -> bool:
+    return "password" in user_data or any(
+        field in user_data and user_data[field] != getattr(db_user, field)
+        for field in ("is_active", "is_superuser")
+    )
+
+
 def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
     user_data = user_in.model_dump(exclude_unset=True)
     extra_data = {}
@@ -24,9 +45,13 @@ def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
         password = user_data["password"]
         hashed_password = get_password_hash(password)
         extra_data["hashed_password"] = hashed_password
+    revoke = _revokes_tokens(db_user, user_data)
     db_user.sqlmodel_update(user_data, update=extra_data)
+    if revoke:
+        revoke_tokens(db_user)
     session.add(db_user)
     session.commit()
+    invalidate_user(db_user.id)
     session.refresh(db_user)
     return db_user
 
@@ -37,9 +62,51 @@ def get_user_by_email(*, session: Session, email: str) -> User | None:
     return session_user
 
 
+async def create_user_async(*, session: AsyncSession, user_create: UserCreate) -> User:
+    hashed_password = await get_password_hash_async(user_create.password)
+    db_obj = User.model_validate(
+        user_create, update={"hashed_password": hashed_password}
+    )
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def update_user_async(
+    *, session: AsyncSession, db_user: User, user_in: UserUpdate
+) -> Any:
+    user_data = user_in.model_dump(exclude_unset=True)
+    extra_data = {}
+    if "password" in user_data:
+        password = user_data["password"]
+        hashed_password = await get_password_hash_async(password)
+        extra_data["hashed_password"] = hashed_password
+    revoke = _revokes_tokens(db_user, user_data)
+    db_user.sqlmodel_update(user_data, update=extra_data)
+    if revoke:
+        revoke_tokens(db_user)
+    session.add(db_user)
+    await session.commit()
+    invalidate_user(db_user.id)
+    await session.refresh(db_user)
+    return db_user
+
+
+async def get_user_by_email_async(*, session: AsyncSession, email: str) -> User | None:
+    statement = select(User).where(User.email == email)
+    session_user = (await session.exec(statement)).first()
+    return session_user
+
+
 # Dummy hash to use for timing attack prevention when user is not found
-# This is an Argon2 hash of a random password, used to ensure constant-time comparison
-DUMMY_HASH = "$argon2id$v=19$m=65536,t=3,p=4$MjQyZWE1MzBjYjJlZTI0Yw$YTU4NGM5ZTZmYjE2NzZlZjY0ZWY3ZGRkY2U2OWFjNjk"
+# This is an Argon2 hash of a random password, used to ensure constant-time comparison.
+# It carries the configured cost parameters, which is what verification time depends on
+DUMMY_HASH = (
+    "$argon2id$v=19"
+    f"$m={settings.ARGON2_MEMORY_COST},t={settings.ARGON2_TIME_COST},p={settings.ARGON2_PARALLELISM}"
+    "$MjQyZWE1MzBjYjJlZTI0Yw$YTU4NGM5ZTZmYjE2NzZlZjY0ZWY3ZGRkY2U2OWFjNjk"
+)
 
 
 def authenticate(*, session: Session, email: str, password: str) -> User | None:
@@ -60,9 +127,39 @@ def authenticate(*, session: Session, email: str, password: str) -> User | None:
     return db_user
 
 
+async def authenticate_async(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    db_user = await get_user_by_email_async(session=session, email=email)
+    if not db_user:
+        await verify_password_async(password, DUMMY_HASH)
+        return None
+    verified, updated_password_hash = await verify_password_async(
+        password, db_user.hashed_password
+    )
+    if not verified:
+        return None
+    if updated_password_hash:
+        db_user.hashed_password = updated_password_hash
+        session.add(db_user)
+        await session.commit()
+        await session.refresh(db_user)
+    return db_user
+
+
 def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -> Item:
     db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
     session.add(db_item)
     session.commit()
     session.refresh(db_item)
     return db_item
+
+
+async def create_item_async(
+    *, session: AsyncSession, item_in: ItemCreate, owner_id: uuid.UUID
+) -> Item:
+    db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
+    session.add(db_item)
+    await session.commit()
+    await session.refresh(db_item)
+    return db_item
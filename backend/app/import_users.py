@@ -0,0 +1,43 @@
+import argparse
+import logging
+import sys
+from collections import Counter
+
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.services.user_import import detect_format, import_users, read_rows
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Create users from a CSV or NDJSON file, writing an NDJSON "
+        "report of each row to stdout."
+    )
+    parser.add_argument("path")
+    parser.add_argument(
+        "--format", choices=["csv", "ndjson"], help="Default from the file name"
+    )
+    args = parser.parse_args()
+    format = args.format or detect_format(args.path, None)
+
+    logger.info(f"Importing users from {args.path}")
+    statuses: Counter[str] = Counter()
+    with (
+        open(args.path, encoding="utf-8-sig", newline="") as file,
+        Session(engine) as session,
+    ):
+        for result in import_users(session, read_rows(file, format)):
+            statuses[result.status] += 1
+            sys.stdout.write(result.model_dump_json() + "\n")
+    logger.info(
+        "Imported users: "
+        + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items()))
+    )
+
+
+if __name__ == "__main__":
+    main()
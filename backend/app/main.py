@@ -1,10 +1,24 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 
+from app.api import metrics
 from app.api.main import api_router
+from app.api.profiling import ProfilingMiddleware
+from app.api.ratelimit import RateLimitMiddleware
+from app.api.replicas import HEADER, ReadYourWritesMiddleware
 from app.core.config import settings
+from app.core.db import async_engine, warm_up_async_pool, warm_up_pool
+from app.core.hashing import HashingPoolBusyError, hashing_pool
+from app.core.metrics import registry, write_metrics_periodically
+from app.core.partitions import maintain_partitions_periodically
 from app.websockets import notifications as ws_notifications
 
 
@@ -15,12 +29,45 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
+    if settings.DB_ASYNC:
+        await warm_up_async_pool()
+    else:
+        await run_in_threadpool(warm_up_pool)
+    partition_maintenance = asyncio.create_task(maintain_partitions_periodically())
+    metrics_writer = None
+    if settings.METRICS_DIR:
+        metrics_writer = asyncio.create_task(write_metrics_periodically())
+    yield
+    partition_maintenance.cancel()
+    if metrics_writer and settings.METRICS_DIR:
+        metrics_writer.cancel()
+        # Last counts of this worker, /metrics keeps adding them up after it exits
+        registry.collect()
+        registry.write(settings.METRICS_DIR)
+    # Async connections are bound to this event loop, close them with it
+    await async_engine.dispose()
+    hashing_pool.shutdown()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
 
+# Innermost, the statements counted and times are the routes' own
+app.add_middleware(ProfilingMiddleware)
+# Added before CORS so CORS headers are also set on its 429 responses
+app.add_middleware(RateLimitMiddleware)
+# Outside the rate limiter, its 429s are counted too
+app.add_middleware(metrics.MetricsMiddleware)
+# Keeps a client's reads on the primary after its writes, in every worker
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Set all CORS enabled origins
 if settings.all_cors_origins:
     app.add_middleware(
@@ -29,7 +76,22 @@ if settings.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Read by the frontend to send back in If-Match and X-Read-Your-Writes-Until
+        expose_headers=["ETag", HEADER],
     )
 
+
+@app.exception_handler(HashingPoolBusyError)
+async def hashing_pool_busy_handler(
+    _request: Request, _exc: HashingPoolBusyError
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please try again"},
+        headers={"Retry-After": "1"},
+    )
+
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
 app.include_router(ws_notifications.router)
+app.include_router(metrics.router)
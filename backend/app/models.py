@@ -1,9 +1,22 @@
+import os
+import time
 import uuid
 from datetime import datetime, timezone
 from enum import Enum
+from typing import Literal
 
 from pydantic import EmailStr
-from sqlalchemy import DateTime
+from sqlalchemy import (
+    Column,
+    Computed,
+    DateTime,
+    FetchedValue,
+    Index,
+    column,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -11,6 +24,26 @@ def get_datetime_utc() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def uuid7(at: datetime | None = None) -> uuid.UUID:
+    """
+    Time ordered UUID (RFC 9562 version 7): the Unix time in milliseconds, of at
+    or now, then random bits.
+    """
+    ms = time.time_ns() // 1_000_000 if at is None else int(at.timestamp() * 1000)
+    value = ms << 80 | int.from_bytes(os.urandom(10), "big")
+    # Version 7 and the RFC variant
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return uuid.UUID(int=value)
+
+
+def uuid7_time(id: uuid.UUID) -> datetime | None:
+    """When a uuid7 was made, None for other versions."""
+    if id.version != 7:
+        return None
+    return datetime.fromtimestamp((id.int >> 80) / 1000, timezone.utc)
+
+
 # Shared properties
 class UserBase(SQLModel):
     email: EmailStr = Field(unique=True, index=True, max_length=255)
@@ -48,12 +81,47 @@ class UpdatePassword(SQLModel):
 
 # Database model, database table inferred from class name
 class User(UserBase, table=True):
+    __table_args__ = (
+        # Keyset pagination, see app.api.pagination
+        Index("ix_user_created_at_id", "created_at", "id"),
+        # Case insensitive prefix search, see app.services.users. text_pattern_ops
+        # serve LIKE 'prefix%' whatever the database collation
+        Index(
+            "ix_user_email_prefix",
+            func.lower(column("email")).label("email"),
+            postgresql_ops={"email": "text_pattern_ops"},
+        ),
+        Index(
+            "ix_user_full_name_prefix",
+            func.lower(column("full_name")).label("full_name"),
+            postgresql_ops={"full_name": "text_pattern_ops"},
+        ),
+    )
+    # Fetch the version and updated_at the trigger sets with RETURNING
+    __mapper_args__ = {"eager_defaults": True}
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     hashed_password: str
     created_at: datetime | None = Field(
         default_factory=get_datetime_utc,
         sa_type=DateTime(timezone=True),  # type: ignore
     )
+    # Bumped to revoke issued access tokens, see crud.update_user
+    token_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Set by a trigger on every update, see the add_row_versions migration.
+    # version is in the ETag, see app.api.etag
+    version: int = Field(
+        default=0,
+        sa_column_kwargs={"server_default": "0", "server_onupdate": FetchedValue()},
+    )
+    updated_at: datetime | None = Field(
+        default_factory=get_datetime_utc,
+        sa_type=DateTime(timezone=True),  # type: ignore
+        sa_column_kwargs={
+            "server_default": func.now(),
+            "server_onupdate": FetchedValue(),
+        },
+    )
     items: list["Item"] = Relationship(back_populates="owner", cascade_delete=True)
 
 
@@ -61,11 +129,37 @@ class User(UserBase, table=True):
 class UserPublic(UserBase):
     id: uuid.UUID
     created_at: datetime | None = None
+    updated_at: datetime | None = None
 
 
 class UsersPublic(SQLModel):
     data: list[UserPublic]
-    count: int
+    # None when requested with include_count=false
+    count: int | None
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: str | None = None
+
+
+# A user found by GET /users/search, enough to show and @mention them
+class UserSearchResult(SQLModel):
+    id: uuid.UUID
+    email: str
+    full_name: str | None = None
+
+
+class UserSearchResults(SQLModel):
+    # Ordered by email
+    data: list[UserSearchResult]
+
+
+# Outcome of one row of a bulk user import: created, or skipped because its email
+# exists, came earlier in the file, or the row is invalid
+class UserImportResult(SQLModel):
+    line: int
+    email: str | None = None
+    status: Literal["created", "exists", "duplicate", "invalid"]
+    id: uuid.UUID | None = None
+    error: str | None = None
 
 
 # Shared properties
@@ -84,13 +178,50 @@ class ItemUpdate(ItemBase):
     title: str | None = Field(default=None, min_length=1, max_length=255)  # type: ignore
 
 
+# Text search configuration of item search, see app.services.items.build_search
+SEARCH_CONFIG = "english"
+
+# Words of the title and description, title matches rank higher. Generated by
+# Postgres and not mapped, so reading and writing items doesn't carry it
+item_search_vector = Column(
+    "search_vector",
+    TSVECTOR,
+    Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', title), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')",
+        persisted=True,
+    ),
+)
+
+
 # Database model, database table inferred from class name
 class Item(ItemBase, table=True):
+    __table_args__ = (
+        Index("ix_item_created_at_id", "created_at", "id"),
+        Index("ix_item_owner_id_created_at_id", "owner_id", "created_at", "id"),
+        item_search_vector,
+        Index("ix_item_search_vector", item_search_vector, postgresql_using="gin"),
+    )
+    __mapper_args__ = {"exclude_properties": ["search_vector"], "eager_defaults": True}
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     created_at: datetime | None = Field(
         default_factory=get_datetime_utc,
         sa_type=DateTime(timezone=True),  # type: ignore
     )
+    # Set by a trigger on every update, like User.version
+    version: int = Field(
+        default=0,
+        sa_column_kwargs={"server_default": "0", "server_onupdate": FetchedValue()},
+    )
+    updated_at: datetime | None = Field(
+        default_factory=get_datetime_utc,
+        sa_type=DateTime(timezone=True),  # type: ignore
+        sa_column_kwargs={
+            "server_default": func.now(),
+            "server_onupdate": FetchedValue(),
+        },
+    )
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
     )
@@ -102,10 +233,60 @@ class ItemPublic(ItemBase):
     id: uuid.UUID
     owner_id: uuid.UUID
     created_at: datetime | None = None
+    updated_at: datetime | None = None
 
 
 class ItemsPublic(SQLModel):
     data: list[ItemPublic]
+    # None when requested with include_count=false
+    count: int | None
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: str | None = None
+
+
+# An item found by GET /items/search, rank is how well it matches
+class ItemSearchResult(ItemPublic):
+    rank: float
+
+
+class ItemSearchResults(SQLModel):
+    # Best match first
+    data: list[ItemSearchResult]
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: str | None = None
+
+
+# Bulk item writes, applied in one transaction
+class ItemsCreate(SQLModel):
+    items: list[ItemCreate] = Field(min_length=1, max_length=1000)
+
+
+# A null title leaves it unchanged, the title can't be removed
+class ItemUpdateEntry(ItemUpdate):
+    id: uuid.UUID
+
+
+class ItemsUpdate(SQLModel):
+    items: list[ItemUpdateEntry] = Field(min_length=1, max_length=1000)
+
+
+class ItemIds(SQLModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=1000)
+
+
+# Result of one entry of a bulk write, with the status the single item route
+# would have answered. Entries with an error are skipped, the others applied
+class ItemResult(SQLModel):
+    id: uuid.UUID
+    status: int
+    item: ItemPublic | None = None
+    error: str | None = None
+
+
+class ItemsBulkResult(SQLModel):
+    # In the order of the entries
+    data: list[ItemResult]
+    # Entries applied
     count: int
 
 
@@ -123,6 +304,16 @@ class Token(SQLModel):
 # Contents of JWT token
 class TokenPayload(SQLModel):
     sub: str | None = None
+    # Authorization claims, only in tokens issued with ACCESS_TOKEN_CLAIMS
+    is_active: bool | None = None
+    is_superuser: bool | None = None
+    ver: int | None = None
+
+
+# Identity and privileges read-only routes authorize with, see deps.CurrentPrincipal
+class Principal(SQLModel):
+    id: uuid.UUID
+    is_superuser: bool = False
 
 
 class NewPassword(SQLModel):
@@ -150,12 +341,45 @@ class NotificationCreate(NotificationBase):
 
 # Database model
 class Notification(NotificationBase, table=True):
-    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    __table_args__ = (
+        Index("ix_notification_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Unread counts and mark-all-as-read only touch unread rows
+        Index(
+            "ix_notification_user_id_unread",
+            "user_id",
+            postgresql_where=text("NOT is_read"),
+        ),
+        # Monthly partitions, created ahead and dropped past the retention by
+        # app.core.partitions
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    __mapper_args__ = {"eager_defaults": True}
+
+    # Made with created_at, so a lookup by id can also bound created_at and only
+    # search its partitions, see app.services.notifications. Rows given another
+    # created_at need uuid7(created_at). Rows from before have uuid4 ids
+    id: uuid.UUID = Field(default_factory=uuid7, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
     is_read: bool = Field(default=False)
-    created_at: datetime | None = Field(
+    # In the primary key because a partitioned table's unique keys need the
+    # partition key
+    created_at: datetime = Field(
+        default_factory=get_datetime_utc,
+        primary_key=True,
+        sa_type=DateTime(timezone=True),  # type: ignore
+    )
+    # Set by a trigger on every update, like User.version
+    version: int = Field(
+        default=0,
+        sa_column_kwargs={"server_default": "0", "server_onupdate": FetchedValue()},
+    )
+    updated_at: datetime | None = Field(
         default_factory=get_datetime_utc,
         sa_type=DateTime(timezone=True),  # type: ignore
+        sa_column_kwargs={
+            "server_default": func.now(),
+            "server_onupdate": FetchedValue(),
+        },
     )
 
 
@@ -165,9 +389,50 @@ class NotificationPublic(NotificationBase):
     user_id: uuid.UUID
     is_read: bool
     created_at: datetime | None = None
+    updated_at: datetime | None = None
 
 
 class NotificationsPublic(SQLModel):
     data: list[NotificationPublic]
-    count: int
+    count: int | None
     unread_count: int
+    next_cursor: str | None = None
+
+
+# Ids of the current user's notifications for a bulk update, ids of other users'
+# notifications are skipped
+class NotificationIds(SQLModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=1000)
+
+
+# Bulk delete of the given ids, the ones created before a time, or both
+class NotificationsDelete(SQLModel):
+    ids: list[uuid.UUID] | None = Field(default=None, min_length=1, max_length=1000)
+    before: datetime | None = None
+
+
+class NotificationsAffected(SQLModel):
+    message: str
+    count: int
+
+
+# Unread notifications per user, kept exact by triggers on notification in the
+# writing transaction, see the add_notification_counter migration. A missing row
+# is 0, app/reconcile_unread_counts.py repairs drift
+class NotificationCounter(SQLModel, table=True):
+    user_id: uuid.UUID = Field(
+        foreign_key="user.id", primary_key=True, ondelete="CASCADE"
+    )
+    unread: int = Field(default=0)
+
+
+# Token buckets of the shared rate limit backend, see app.api.ratelimit.
+# UNLOGGED skips the WAL on every limited request, losing buckets in a crash is fine
+class RateLimitBucket(SQLModel, table=True):
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key: str = Field(primary_key=True, max_length=255)
+    tokens: float
+    allowed: bool
+    updated_at: datetime = Field(sa_type=DateTime(timezone=True))  # type: ignore
+    expires_at: datetime = Field(sa_type=DateTime(timezone=True), index=True)  # type: ignore
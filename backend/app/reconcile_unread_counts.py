@@ -0,0 +1,65 @@
+import logging
+import uuid
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.db import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Users whose notificationcounter row disagrees with their unread notifications
+FIND_DRIFT = text(
+    """
+    SELECT user_id
+    FROM (
+        SELECT user_id, count(*) AS unread
+        FROM notification WHERE NOT is_read GROUP BY user_id
+    ) AS n
+    FULL JOIN notificationcounter AS c USING (user_id)
+    WHERE coalesce(n.unread, 0) <> coalesce(c.unread, 0)
+    """
+)
+
+# Locks the counter row first: a transaction still writing the user's
+# notifications holds it from its trigger, so the recount that follows waits for
+# it and sees its rows, and later writers wait for the recount
+LOCK_COUNTER = text(
+    """
+    INSERT INTO notificationcounter AS c (user_id, unread)
+    SELECT id, 0 FROM "user" WHERE id = :user_id
+    ON CONFLICT (user_id) DO UPDATE SET unread = c.unread
+    """
+)
+RECOUNT = text(
+    """
+    UPDATE notificationcounter SET unread = (
+        SELECT count(*) FROM notification WHERE user_id = :user_id AND NOT is_read
+    )
+    WHERE user_id = :user_id
+    """
+)
+
+
+def reconcile(session: Session) -> list[uuid.UUID]:
+    """Recount the unread notifications of drifted users, return their ids."""
+    user_ids = list(session.execute(FIND_DRIFT).scalars())
+    session.commit()
+    for user_id in user_ids:
+        # One short transaction per user, so the rest stay writable
+        session.execute(LOCK_COUNTER, {"user_id": user_id})
+        session.execute(RECOUNT, {"user_id": user_id})
+        session.commit()
+    return user_ids
+
+
+def main() -> None:
+    logger.info("Reconciling unread notification counts")
+    with Session(engine) as session:
+        user_ids = reconcile(session)
+    logger.info(f"Repaired the unread count of {len(user_ids)} users")
+
+
+if __name__ == "__main__":
+    main()
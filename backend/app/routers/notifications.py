@@ -1,77 +1,132 @@
 import uuid
 from typing import Any
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import col, func, select
-
-from app.api.deps import CurrentUser, SessionDep
-from app.models import Message
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import ColumnElement
+from sqlmodel import col, delete, func, select, update
+
+from app.api.deps import CurrentPrincipal, CurrentUser, SessionDep
+from app.api.etag import IfNoneMatch, list_tag, not_modified
+from app.api.export import ExportFormat, export_response, select_public
+from app.api.pagination import Limit, exact_count, get_page, paginate
+from app.api.profiling import TimedRoute
+from app.models import Message, NotificationCounter
 from app.schemas.notification import (
     Notification,
+    NotificationIds,
     NotificationPublic,
+    NotificationsAffected,
+    NotificationsDelete,
     NotificationsPublic,
 )
+from app.services.notifications import created_at_bound, select_notification
 
-router = APIRouter(prefix="/notifications", tags=["notifications"])
+router = APIRouter(
+    prefix="/notifications", tags=["notifications"], route_class=TimedRoute
+)
 
 
 @router.get("/", response_model=NotificationsPublic)
 def read_notifications(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+    session: SessionDep,
+    current_user: CurrentPrincipal,
+    response: Response,
+    skip: int = 0,
+    limit: Limit = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
+    if_none_match: IfNoneMatch = None,
 ) -> Any:
     """
-    Retrieve notifications for current user.
+    Retrieve notifications for current user, newest first. Pass the next_cursor
+    of a page as cursor to get the next one, include_count=false skips counting
+    all of them.
+
+    Answers 304 Not Modified when If-None-Match has the ETag of the page, which
+    changes with its notifications and the counts.
     """
-    count_statement = (
-        select(func.count())
-        .select_from(Notification)
-        .where(Notification.user_id == current_user.id)
+    filters = [Notification.user_id == current_user.id]
+    unread = select(NotificationCounter.unread).where(
+        NotificationCounter.user_id == current_user.id
     )
-    count = session.exec(count_statement).one()
-
-    unread_statement = (
-        select(func.count())
-        .select_from(Notification)
-        .where(Notification.user_id == current_user.id)
-        .where(Notification.is_read == False)  # noqa: E712
+    counts: list[ColumnElement[int]] = [func.coalesce(unread.scalar_subquery(), 0)]
+    if include_count:
+        counts.append(exact_count(Notification, *filters))
+
+    statement = paginate(
+        select(Notification, *counts).where(*filters),
+        Notification,
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
     )
-    unread_count = session.exec(unread_statement).one()
-
-    statement = (
-        select(Notification)
-        .where(Notification.user_id == current_user.id)
-        .order_by(col(Notification.created_at).desc())
-        .offset(skip)
-        .limit(limit)
+    notifications, next_cursor, count_values = get_page(
+        session.exec(statement).all(), limit, counts=len(counts)
+    )
+    if count_values is None:
+        # Empty page, past the end or of a user without notifications
+        count_values = (0,) * len(counts)
+        if skip or cursor:
+            count_values = tuple(session.exec(select(c)).one() for c in counts)
+    unread_count, *count = count_values
+
+    tag = list_tag(
+        [(n.id, n.version) for n in notifications],
+        count,
+        unread_count,
+        next_cursor,
+    )
+    if unchanged := not_modified(response, tag, if_none_match):
+        return unchanged
+    return NotificationsPublic(
+        data=notifications,
+        count=count[0] if count else None,
+        unread_count=unread_count,
+        next_cursor=next_cursor,
     )
-    notifications = session.exec(statement).all()
-
-    return NotificationsPublic(data=notifications, count=count, unread_count=unread_count)
 
 
 @router.get("/unread-count")
-def get_unread_count(session: SessionDep, current_user: CurrentUser) -> dict[str, int]:
+def get_unread_count(session: SessionDep, current_user: CurrentPrincipal) -> dict[str, int]:
     """
-    Get unread notification count for bell icon badge.
+    Get unread notification count for bell icon badge, a single row kept up to
+    date by triggers on notification.
     """
-    statement = (
-        select(func.count())
-        .select_from(Notification)
-        .where(Notification.user_id == current_user.id)
-        .where(Notification.is_read == False)  # noqa: E712
+    statement = select(NotificationCounter.unread).where(
+        NotificationCounter.user_id == current_user.id
     )
-    unread_count = session.exec(statement).one()
+    unread_count = session.exec(statement).first() or 0
     return {"unread_count": unread_count}
 
 
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+def export_notifications(
+    request: Request, current_user: CurrentPrincipal, format: ExportFormat = "ndjson"
+) -> StreamingResponse:
+    """
+    Export all the current user's notifications, newest first, as NDJSON or CSV
+    with the fields of NotificationPublic. Streamed from a server-side cursor.
+    """
+    statement = select_public(Notification, NotificationPublic).where(
+        col(Notification.user_id) == current_user.id
+    )
+    return export_response(request, statement, format, "notifications")
+
+
 @router.get("/{id}", response_model=NotificationPublic)
 def read_notification(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+    session: SessionDep, current_user: CurrentPrincipal, id: uuid.UUID
 ) -> Any:
     """
     Get notification by ID.
     """
-    notification = session.get(Notification, id)
+    statement = select_notification(id)
+    notification = session.exec(statement).first()
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     if notification.user_id != current_user.id:
@@ -86,7 +141,8 @@ def mark_as_read(
     """
     Mark notification as read.
     """
-    notification = session.get(Notification, id)
+    statement = select_notification(id)
+    notification = session.exec(statement).first()
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     if notification.user_id != current_user.id:
@@ -98,22 +154,69 @@ def mark_as_read(
     return notification
 
 
-@router.put("/read-all")
-def mark_all_as_read(session: SessionDep, current_user: CurrentUser) -> Message:
+@router.put("/read-all", response_model=NotificationsAffected)
+def mark_all_as_read(session: SessionDep, current_user: CurrentUser) -> Any:
     """
     Mark all notifications as read.
     """
     statement = (
-        select(Notification)
-        .where(Notification.user_id == current_user.id)
-        .where(Notification.is_read == False)  # noqa: E712
+        update(Notification)
+        .where(col(Notification.user_id) == current_user.id)
+        .where(col(Notification.is_read) == False)  # noqa: E712
+        .values(is_read=True)
+    )
+    count = (session.exec(statement)).rowcount
+    session.commit()
+    return NotificationsAffected(
+        message="All notifications marked as read", count=count
+    )
+
+
+@router.put("/read", response_model=NotificationsAffected)
+def mark_many_as_read(
+    session: SessionDep, current_user: CurrentUser, notifications_in: NotificationIds
+) -> Any:
+    """
+    Mark the given notifications as read, count is how many were unread.
+    """
+    statement = (
+        update(Notification)
+        .where(col(Notification.user_id) == current_user.id)
+        .where(col(Notification.id).in_(notifications_in.ids))
+        .where(created_at_bound(notifications_in.ids))
+        .where(col(Notification.is_read) == False)  # noqa: E712
+        .values(is_read=True)
     )
-    notifications = session.exec(statement).all()
-    for notification in notifications:
-        notification.is_read = True
-        session.add(notification)
+    count = (session.exec(statement)).rowcount
+    session.commit()
+    return NotificationsAffected(message="Notifications marked as read", count=count)
+
+
+@router.delete("/", response_model=NotificationsAffected)
+def delete_notifications(
+    session: SessionDep,
+    current_user: CurrentUser,
+    notifications_in: NotificationsDelete,
+) -> Any:
+    """
+    Delete the given notifications, the ones created before a time, or the given
+    ones created before it.
+    """
+    if notifications_in.ids is None and notifications_in.before is None:
+        raise HTTPException(status_code=400, detail="Pass ids, before or both")
+    statement = delete(Notification).where(col(Notification.user_id) == current_user.id)
+    if notifications_in.ids is not None:
+        statement = statement.where(
+            col(Notification.id).in_(notifications_in.ids),
+            created_at_bound(notifications_in.ids),
+        )
+    if notifications_in.before is not None:
+        statement = statement.where(
+            col(Notification.created_at) < notifications_in.before
+        )
+    count = (session.exec(statement)).rowcount
     session.commit()
-    return Message(message="All notifications marked as read")
+    return NotificationsAffected(message="Notifications deleted", count=count)
 
 
 @router.delete("/{id}")
@@ -123,7 +226,8 @@ def delete_notification(
     """
     Delete a notification.
     """
-    notification = session.get(Notification, id)
+    statement = select_notification(id)
+    notification = session.exec(statement).first()
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     if notification.user_id != current_user.id:
@@ -0,0 +1,248 @@
+import uuid
+from typing import Any
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import ColumnElement
+from sqlmodel import col, delete, func, select, update
+
+from app.api.deps import AsyncCurrentPrincipal, AsyncCurrentUser, AsyncSessionDep
+from app.api.etag import IfNoneMatch, list_tag, not_modified
+from app.api.export import ExportFormat, export_response_async, select_public
+from app.api.pagination import Limit, exact_count, get_page, paginate
+from app.api.profiling import TimedRoute
+from app.models import Message, NotificationCounter
+from app.schemas.notification import (
+    Notification,
+    NotificationIds,
+    NotificationPublic,
+    NotificationsAffected,
+    NotificationsDelete,
+    NotificationsPublic,
+)
+from app.services.notifications import created_at_bound, select_notification
+
+# Async twin of app.routers.notifications, mounted instead of it when DB_ASYNC is set
+router = APIRouter(
+    prefix="/notifications", tags=["notifications"], route_class=TimedRoute
+)
+
+
+@router.get("/", response_model=NotificationsPublic)
+async def read_notifications(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentPrincipal,
+    response: Response,
+    skip: int = 0,
+    limit: Limit = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
+    if_none_match: IfNoneMatch = None,
+) -> Any:
+    """
+    Retrieve notifications for current user, newest first. Pass the next_cursor
+    of a page as cursor to get the next one, include_count=false skips counting
+    all of them.
+
+    Answers 304 Not Modified when If-None-Match has the ETag of the page, which
+    changes with its notifications and the counts.
+    """
+    filters = [Notification.user_id == current_user.id]
+    unread = select(NotificationCounter.unread).where(
+        NotificationCounter.user_id == current_user.id
+    )
+    counts: list[ColumnElement[int]] = [func.coalesce(unread.scalar_subquery(), 0)]
+    if include_count:
+        counts.append(exact_count(Notification, *filters))
+
+    statement = paginate(
+        select(Notification, *counts).where(*filters),
+        Notification,
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+    )
+    notifications, next_cursor, count_values = get_page(
+        (await session.exec(statement)).all(), limit, counts=len(counts)
+    )
+    if count_values is None:
+        # Empty page, past the end or of a user without notifications
+        count_values = (0,) * len(counts)
+        if skip or cursor:
+            count_values = tuple(
+                [(await session.exec(select(c))).one() for c in counts]
+            )
+    unread_count, *count = count_values
+
+    tag = list_tag(
+        [(n.id, n.version) for n in notifications],
+        count,
+        unread_count,
+        next_cursor,
+    )
+    if unchanged := not_modified(response, tag, if_none_match):
+        return unchanged
+    return NotificationsPublic(
+        data=notifications,
+        count=count[0] if count else None,
+        unread_count=unread_count,
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/unread-count")
+async def get_unread_count(
+    session: AsyncSessionDep, current_user: AsyncCurrentPrincipal
+) -> dict[str, int]:
+    """
+    Get unread notification count for bell icon badge, a single row kept up to
+    date by triggers on notification.
+    """
+    statement = select(NotificationCounter.unread).where(
+        NotificationCounter.user_id == current_user.id
+    )
+    unread_count = (await session.exec(statement)).first() or 0
+    return {"unread_count": unread_count}
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+async def export_notifications(
+    request: Request,
+    current_user: AsyncCurrentPrincipal,
+    format: ExportFormat = "ndjson",
+) -> StreamingResponse:
+    """
+    Export all the current user's notifications, newest first, as NDJSON or CSV
+    with the fields of NotificationPublic. Streamed from a server-side cursor.
+    """
+    statement = select_public(Notification, NotificationPublic).where(
+        col(Notification.user_id) == current_user.id
+    )
+    return export_response_async(request, statement, format, "notifications")
+
+
+@router.get("/{id}", response_model=NotificationPublic)
+async def read_notification(
+    session: AsyncSessionDep, current_user: AsyncCurrentPrincipal, id: uuid.UUID
+) -> Any:
+    """
+    Get notification by ID.
+    """
+    statement = select_notification(id)
+    notification = (await session.exec(statement)).first()
+    if not notification:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    if notification.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return notification
+
+
+@router.put("/{id}/read", response_model=NotificationPublic)
+async def mark_as_read(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
+) -> Any:
+    """
+    Mark notification as read.
+    """
+    statement = select_notification(id)
+    notification = (await session.exec(statement)).first()
+    if not notification:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    if notification.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    notification.is_read = True
+    session.add(notification)
+    await session.commit()
+    await session.refresh(notification)
+    return notification
+
+
+@router.put("/read-all", response_model=NotificationsAffected)
+async def mark_all_as_read(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser
+) -> Any:
+    """
+    Mark all notifications as read.
+    """
+    statement = (
+        update(Notification)
+        .where(col(Notification.user_id) == current_user.id)
+        .where(col(Notification.is_read) == False)  # noqa: E712
+        .values(is_read=True)
+    )
+    count = (await session.exec(statement)).rowcount
+    await session.commit()
+    return NotificationsAffected(
+        message="All notifications marked as read", count=count
+    )
+
+
+@router.put("/read", response_model=NotificationsAffected)
+async def mark_many_as_read(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    notifications_in: NotificationIds,
+) -> Any:
+    """
+    Mark the given notifications as read, count is how many were unread.
+    """
+    statement = (
+        update(Notification)
+        .where(col(Notification.user_id) == current_user.id)
+        .where(col(Notification.id).in_(notifications_in.ids))
+        .where(created_at_bound(notifications_in.ids))
+        .where(col(Notification.is_read) == False)  # noqa: E712
+        .values(is_read=True)
+    )
+    count = (await session.exec(statement)).rowcount
+    await session.commit()
+    return NotificationsAffected(message="Notifications marked as read", count=count)
+
+
+@router.delete("/", response_model=NotificationsAffected)
+async def delete_notifications(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    notifications_in: NotificationsDelete,
+) -> Any:
+    """
+    Delete the given notifications, the ones created before a time, or the given
+    ones created before it.
+    """
+    if notifications_in.ids is None and notifications_in.before is None:
+        raise HTTPException(status_code=400, detail="Pass ids, before or both")
+    statement = delete(Notification).where(col(Notification.user_id) == current_user.id)
+    if notifications_in.ids is not None:
+        statement = statement.where(
+            col(Notification.id).in_(notifications_in.ids),
+            created_at_bound(notifications_in.ids),
+        )
+    if notifications_in.before is not None:
+        statement = statement.where(
+            col(Notification.created_at) < notifications_in.before
+        )
+    count = (await session.exec(statement)).rowcount
+    await session.commit()
+    return NotificationsAffected(message="Notifications deleted", count=count)
+
+
+@router.delete("/{id}")
+async def delete_notification(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
+) -> Message:
+    """
+    Delete a notification.
+    """
+    statement = select_notification(id)
+    notification = (await session.exec(statement)).first()
+    if not notification:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    if notification.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    await session.delete(notification)
+    await session.commit()
+    return Message(message="Notification deleted successfully")
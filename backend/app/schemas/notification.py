@@ -3,7 +3,10 @@ from app.models import (
     Notification,
     NotificationBase,
     NotificationCreate,
+    NotificationIds,
     NotificationPublic,
+    NotificationsAffected,
+    NotificationsDelete,
     NotificationsPublic,
     NotificationType,
 )
@@ -12,7 +15,10 @@ __all__ = [
     "Notification",
     "NotificationBase",
     "NotificationCreate",
+    "NotificationIds",
     "NotificationPublic",
+    "NotificationsAffected",
+    "NotificationsDelete",
     "NotificationsPublic",
     "NotificationType",
 ]
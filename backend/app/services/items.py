@@ -0,0 +1,162 @@
+import uuid
+from collections.abc import Sequence
+from typing import Any
+
+from sqlalchemy import (
+    Boolean,
+    Float,
+    Insert,
+    Update,
+    case,
+    cast,
+    column,
+    func,
+    literal,
+    tuple_,
+    values,
+)
+from sqlalchemy.dialects.postgresql import REAL, REGCONFIG
+from sqlmodel import AutoString, Uuid, col, insert, select, update
+from sqlmodel.sql.expression import Select
+
+from app.api.pagination import RankCursor, encode_rank_cursor
+from app.models import (
+    SEARCH_CONFIG,
+    Item,
+    ItemPublic,
+    ItemResult,
+    ItemsBulkResult,
+    ItemSearchResult,
+    ItemSearchResults,
+    ItemUpdateEntry,
+    User,
+    item_search_vector,
+)
+
+
+def build_insert(items: list[Item]) -> Insert:
+    """One multi-row INSERT of items, their ids and times are set in Python."""
+    return insert(Item).values([item.model_dump() for item in items])
+
+
+def select_for_write(
+    ids: list[uuid.UUID],
+) -> Select[tuple[uuid.UUID, uuid.UUID, str | None]]:
+    """Owner and description of the items, locked until the transaction ends."""
+    return (
+        select(Item.id, Item.owner_id, col(Item.description))
+        .where(col(Item.id).in_(ids))
+        .with_for_update()
+    )
+
+
+def check_entries(
+    ids: list[uuid.UUID], owners: dict[uuid.UUID, uuid.UUID], current_user: User
+) -> list[ItemResult | None]:
+    """
+    Error result of each entry, as update_item and delete_item answer them, None
+    for the entries to apply.
+    """
+    results: list[ItemResult | None] = []
+    seen = set()
+    for id in ids:
+        if id in seen:
+            results.append(
+                ItemResult(id=id, status=400, error="Item given more than once")
+            )
+        elif id not in owners:
+            results.append(ItemResult(id=id, status=404, error="Item not found"))
+        elif not current_user.is_superuser and owners[id] != current_user.id:
+            results.append(
+                ItemResult(id=id, status=403, error="Not enough permissions")
+            )
+        else:
+            results.append(None)
+        seen.add(id)
+    return results
+
+
+def build_update(entries: list[ItemUpdateEntry]) -> Update:
+    """
+    One UPDATE ... FROM (VALUES ...) RETURNING of all the entries, the fields
+    not set in an entry keep their value.
+    """
+    data = values(
+        column("id", Uuid()),
+        column("title", AutoString()),
+        column("description", AutoString()),
+        column("set_title", Boolean()),
+        column("set_description", Boolean()),
+        name="data",
+    ).data(
+        [
+            (
+                entry.id,
+                entry.title,
+                entry.description,
+                entry.title is not None,
+                "description" in entry.model_fields_set,
+            )
+            for entry in entries
+        ]
+    )
+    return (
+        update(Item)
+        .where(col(Item.id) == data.c.id)
+        .values(
+            title=case((data.c.set_title, data.c.title), else_=col(Item.title)),
+            description=case(
+                (data.c.set_description, data.c.description),
+                else_=col(Item.description),
+            ),
+        )
+        .returning(Item)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def bulk_result(
+    ids: list[uuid.UUID], errors: Sequence[ItemResult | None], items: list[Item]
+) -> ItemsBulkResult:
+    by_id = {item.id: item for item in items}
+    data = [
+        error
+        or ItemResult(
+            id=id,
+            status=200,
+            item=ItemPublic.model_validate(by_id[id]) if id in by_id else None,
+        )
+        for id, error in zip(ids, errors, strict=True)
+    ]
+    return ItemsBulkResult(data=data, count=len(ids) - sum(map(bool, errors)))
+
+
+def build_search(
+    q: str, *, owner_id: uuid.UUID | None, after: RankCursor | None, limit: int
+) -> Select[tuple[Item, float]]:
+    """
+    Items matching q, best first, from the GIN index on their search vector. q
+    takes web search syntax: "quoted phrases", or, and -excluded words. One extra
+    row is fetched to tell if there is a next page, see search_results.
+    """
+    query = func.websearch_to_tsquery(literal(SEARCH_CONFIG, REGCONFIG), q)
+    rank = func.ts_rank(item_search_vector, query, type_=Float)
+    statement = select(Item, rank).where(item_search_vector.op("@@")(query))
+    if owner_id is not None:
+        statement = statement.where(col(Item.owner_id) == owner_id)
+    if after is not None:
+        # ts_rank is a real, compared as one the cursor matches its own row
+        position = tuple_(cast(after.rank, REAL), literal(after.id))
+        statement = statement.where(tuple_(rank, col(Item.id)) < position)
+    return statement.order_by(rank.desc(), col(Item.id).desc()).limit(limit + 1)
+
+
+def search_results(rows: Sequence[Any], limit: int) -> ItemSearchResults:
+    data = [
+        ItemSearchResult.model_validate(item, update={"rank": rank})
+        for item, rank in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit and data:
+        next_cursor = encode_rank_cursor(data[-1].rank, data[-1].id)
+    return ItemSearchResults(data=data, next_cursor=next_cursor)
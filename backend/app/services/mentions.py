@@ -1,7 +1,10 @@
 import re
 import uuid
+from collections.abc import Mapping
 
-from sqlmodel import Session, select
+from sqlalchemy import Insert
+from sqlmodel import Session, insert, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.models import Notification, NotificationType, User
 
@@ -19,16 +22,73 @@ def parse_mentions(text: str | None) -> list[str]:
     return list(set(matches))  # Remove duplicates
 
 
-def get_users_by_emails(session: Session, emails: list[str]) -> list[User]:
+def get_users_by_emails(
+    session: Session, emails: list[str], *, exclude: uuid.UUID | None = None
+) -> list[User]:
     """
-    Get users by their email addresses.
+    Get users by their email addresses, other than exclude.
     """
     if not emails:
         return []
     statement = select(User).where(User.email.in_(emails))  # type: ignore
+    if exclude is not None:
+        statement = statement.where(User.id != exclude)
     return list(session.exec(statement).all())
 
 
+def build_mention_notifications(
+    mentions: dict[uuid.UUID, list[str]], mentioned_users: list[User], mentioner: User
+) -> Insert | None:
+    """
+    One multi-row INSERT ... RETURNING of the notifications of mentioned_users,
+    from the emails mentioned by each reference id. None if there are none.
+    """
+    users = {user.email: user for user in mentioned_users}
+    rows = [
+        Notification(
+            user_id=users[email].id,
+            type=NotificationType.MENTION,
+            message=f"{mentioner.full_name or mentioner.email} mentioned you",
+            reference_id=reference_id,
+        ).model_dump()
+        for reference_id, emails in mentions.items()
+        for email in emails
+        if email in users
+    ]
+    if not rows:
+        return None
+    return insert(Notification).values(rows).returning(Notification)
+
+
+def parse_all_mentions(
+    texts: Mapping[uuid.UUID, str | None],
+) -> dict[uuid.UUID, list[str]]:
+    return {reference_id: parse_mentions(text) for reference_id, text in texts.items()}
+
+
+def all_emails(mentions: dict[uuid.UUID, list[str]]) -> list[str]:
+    return sorted({email for emails in mentions.values() for email in emails})
+
+
+def create_mention_notifications_batch(
+    session: Session, texts: Mapping[uuid.UUID, str | None], mentioner: User
+) -> list[Notification]:
+    """
+    Create notifications for the mentions in texts, by the id each text belongs
+    to, with one user lookup and one INSERT for all of them. In the session's
+    transaction, the caller commits.
+    """
+    mentions = parse_all_mentions(texts)
+    # Don't notify yourself
+    mentioned_users = get_users_by_emails(
+        session, all_emails(mentions), exclude=mentioner.id
+    )
+    statement = build_mention_notifications(mentions, mentioned_users, mentioner)
+    if statement is None:
+        return []
+    return list(session.exec(statement).scalars())
+
+
 def create_mention_notifications(
     session: Session,
     text: str | None,
@@ -36,30 +96,52 @@ def create_mention_notifications(
     reference_id: uuid.UUID,
 ) -> list[Notification]:
     """
-    Parse mentions from text and create notifications for mentioned users.
+    Parse mentions from text and create notifications for mentioned users, in
+    the session's transaction, the caller commits.
     Returns list of created notifications.
     """
-    emails = parse_mentions(text)
-    mentioned_users = get_users_by_emails(session, emails)
+    return create_mention_notifications_batch(session, {reference_id: text}, mentioner)
 
-    notifications = []
-    for user in mentioned_users:
-        # Don't notify yourself
-        if user.id == mentioner.id:
-            continue
 
-        notification = Notification(
-            user_id=user.id,
-            type=NotificationType.MENTION,
-            message=f"{mentioner.full_name or mentioner.email} mentioned you",
-            reference_id=reference_id,
-        )
-        session.add(notification)
-        notifications.append(notification)
+async def get_users_by_emails_async(
+    session: AsyncSession, emails: list[str], *, exclude: uuid.UUID | None = None
+) -> list[User]:
+    """
+    Get users by their email addresses, other than exclude.
+    """
+    if not emails:
+        return []
+    statement = select(User).where(User.email.in_(emails))  # type: ignore
+    if exclude is not None:
+        statement = statement.where(User.id != exclude)
+    return list((await session.exec(statement)).all())
+
+
+async def create_mention_notifications_batch_async(
+    session: AsyncSession, texts: Mapping[uuid.UUID, str | None], mentioner: User
+) -> list[Notification]:
+    """
+    Async version of create_mention_notifications_batch.
+    """
+    mentions = parse_all_mentions(texts)
+    mentioned_users = await get_users_by_emails_async(
+        session, all_emails(mentions), exclude=mentioner.id
+    )
+    statement = build_mention_notifications(mentions, mentioned_users, mentioner)
+    if statement is None:
+        return []
+    return list((await session.exec(statement)).scalars())
 
-    if notifications:
-        session.commit()
-        for notification in notifications:
-            session.refresh(notification)
 
-    return notifications
+async def create_mention_notifications_async(
+    session: AsyncSession,
+    text: str | None,
+    mentioner: User,
+    reference_id: uuid.UUID,
+) -> list[Notification]:
+    """
+    Async version of create_mention_notifications.
+    """
+    return await create_mention_notifications_batch_async(
+        session, {reference_id: text}, mentioner
+    )
@@ -0,0 +1,35 @@
+import uuid
+from collections.abc import Iterable
+from datetime import timedelta
+
+from sqlalchemy import ColumnElement, true
+from sqlmodel import col, select
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.models import Notification, uuid7_time
+
+# Between making a notification's uuid7 id and its created_at
+ID_TIME_SLACK = timedelta(minutes=1)
+
+
+def created_at_bound(ids: Iterable[uuid.UUID]) -> ColumnElement[bool]:
+    """
+    The range of created_at the notifications with ids fall in, from the times of
+    their uuid7 ids, so that only the partitions of that range are searched
+    instead of one index probe per month of retention. Always true when one of
+    them is an older uuid4 id, or there are none.
+    """
+    times = [uuid7_time(id) for id in ids]
+    if not times or None in times:
+        return true()
+    valid = [t for t in times if t is not None]
+    return col(Notification.created_at).between(
+        min(valid) - ID_TIME_SLACK, max(valid) + ID_TIME_SLACK
+    )
+
+
+def select_notification(id: uuid.UUID) -> SelectOfScalar[Notification]:
+    """The notification with id, bounded by created_at_bound."""
+    return select(Notification).where(
+        col(Notification.id) == id, created_at_bound([id])
+    )
@@ -0,0 +1,224 @@
+"""
+Bulk user import from CSV or NDJSON, for POST /users/import and
+app/import_users.py.
+
+Rows are handled in batches of USER_IMPORT_BATCH_SIZE, each in its own
+transaction: the emails already taken are found with one query, the passwords
+of the rest are hashed in the shared hashing pool, and the users are loaded
+with COPY.
+"""
+
+import csv
+import io
+import json
+import logging
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import IO, Any, Literal
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.hashing import hashing_pool
+from app.core.security import hash_passwords
+from app.models import User, UserCreate, UserImportResult
+from app.utils import generate_new_account_email, send_email
+
+logger = logging.getLogger(__name__)
+
+ImportFormat = Literal["csv", "ndjson"]
+
+# Columns COPY fills, the rest take their server defaults
+COLUMNS = (
+    "id",
+    "email",
+    "full_name",
+    "is_active",
+    "is_superuser",
+    "hashed_password",
+    "created_at",
+)
+
+CREATE_STAGING = text(
+    """
+    CREATE TEMP TABLE user_import (LIKE "user" INCLUDING DEFAULTS) ON COMMIT DROP
+    """
+)
+# Emails taken since the batch was checked are skipped, not failed
+INSERT_FROM_STAGING = text(
+    f"""
+    INSERT INTO "user" ({", ".join(COLUMNS)})
+    SELECT {", ".join(COLUMNS)} FROM user_import
+    ON CONFLICT (email) DO NOTHING
+    RETURNING email
+    """
+)
+
+# Welcome emails are sent in the background, the report doesn't wait for SMTP
+email_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="welcome-email")
+
+
+def detect_format(filename: str | None, content_type: str | None) -> ImportFormat:
+    name = (filename or "").lower()
+    if name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or content_type in (
+        "application/x-ndjson",
+        "application/jsonl",
+    ):
+        return "ndjson"
+    raise ValueError("Upload a .csv or .ndjson file")
+
+
+def read_rows(
+    file: IO[str], format: ImportFormat
+) -> Iterator[tuple[int, dict[str, Any] | str]]:
+    """
+    Line number and fields of each row, or the reason it couldn't be read. CSV
+    files have a header row, empty CSV fields take their default.
+    """
+    if format == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, {k: v for k, v in row.items() if k and v != ""}
+        return
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        if isinstance(row, dict):
+            yield line_number, row
+        else:
+            yield line_number, "Expected a JSON object"
+
+
+def format_errors(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors()
+    )
+
+
+def copy_users(session: Session, users: list[User]) -> set[str]:
+    """Load users with COPY, return the emails inserted."""
+    session.execute(CREATE_STAGING)
+    # psycopg's COPY, SQLAlchemy has no API for it
+    connection = session.connection().connection.driver_connection
+    assert connection is not None
+    with connection.cursor().copy(
+        f"COPY user_import ({', '.join(COLUMNS)}) FROM STDIN"
+    ) as copy:
+        for user in users:
+            copy.write_row([getattr(user, column) for column in COLUMNS])
+    return set(session.execute(INSERT_FROM_STAGING).scalars())
+
+
+def send_welcome_email(user_in: UserCreate) -> None:
+    email_data = generate_new_account_email(
+        email_to=user_in.email, username=user_in.email, password=user_in.password
+    )
+    try:
+        send_email(
+            email_to=user_in.email,
+            subject=email_data.subject,
+            html_content=email_data.html_content,
+        )
+    except Exception:
+        logger.exception(f"Welcome email to {user_in.email} failed")
+
+
+def import_batch(
+    session: Session,
+    rows: list[tuple[int, dict[str, Any] | str]],
+    seen: set[str],
+) -> list[UserImportResult]:
+    results: dict[int, UserImportResult] = {}
+    valid: dict[int, UserCreate] = {}
+    for line, row in rows:
+        if isinstance(row, str):
+            results[line] = UserImportResult(line=line, status="invalid", error=row)
+            continue
+        try:
+            user_in = UserCreate.model_validate(row)
+        except ValidationError as e:
+            results[line] = UserImportResult(
+                line=line,
+                email=row.get("email"),
+                status="invalid",
+                error=format_errors(e),
+            )
+            continue
+        if user_in.email in seen:
+            results[line] = UserImportResult(
+                line=line, email=user_in.email, status="duplicate"
+            )
+            continue
+        seen.add(user_in.email)
+        valid[line] = user_in
+
+    existing = set()
+    if valid:
+        emails = [user_in.email for user_in in valid.values()]
+        statement = select(User.email).where(col(User.email).in_(emails))
+        existing = set(session.exec(statement).all())
+    new = {line: u for line, u in valid.items() if u.email not in existing}
+
+    workers = settings.USER_IMPORT_HASH_WORKERS
+    hashes = hash_passwords(
+        [u.password for u in new.values()],
+        in_flight=hashing_pool.workers if workers is None else workers,
+    )
+    users = {
+        line: User.model_validate(user_in, update={"hashed_password": hashed})
+        for (line, user_in), hashed in zip(new.items(), hashes, strict=True)
+    }
+    created = copy_users(session, list(users.values())) if users else set()
+    session.commit()
+
+    for line, user_in in valid.items():
+        user = users.get(line)
+        if user is not None and user.email in created:
+            results[line] = UserImportResult(
+                line=line, email=user.email, status="created", id=user.id
+            )
+            if settings.emails_enabled:
+                email_executor.submit(send_welcome_email, user_in)
+        else:
+            results[line] = UserImportResult(
+                line=line, email=user_in.email, status="exists"
+            )
+    return [results[line] for line, _ in rows]
+
+
+def import_users(
+    session: Session, rows: Iterable[tuple[int, dict[str, Any] | str]]
+) -> Iterator[UserImportResult]:
+    """
+    Create the users of rows, yielding the result of each row as its batch is
+    committed. Stopping early keeps the batches already committed.
+    """
+    seen: set[str] = set()
+    iterator = iter(rows)
+    while batch := list(islice(iterator, settings.USER_IMPORT_BATCH_SIZE)):
+        yield from import_batch(session, batch, seen)
+
+
+def stream_report(upload: IO[bytes], format: ImportFormat) -> Iterator[str]:
+    """
+    NDJSON report of importing upload, which is closed after. Opens its own
+    session, the request's is closed before the response is streamed.
+    """
+    with upload, Session(engine) as session:
+        # Undecodable bytes fail their rows rather than the rest of the import
+        file = io.TextIOWrapper(
+            upload, encoding="utf-8-sig", errors="replace", newline=""
+        )
+        for result in import_users(session, read_rows(file, format)):
+            yield result.model_dump_json() + "\n"
@@ -0,0 +1,98 @@
+from typing import Any
+
+from sqlalchemy import text
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import user_search_cache
+from app.models import UserSearchResult
+
+# Users whose email or full name starts with a prefix, each from the first rows of
+# its prefix index, so the cost doesn't grow with the number of matches.
+# ORDER BY ... USING ~<~ is the order of the text_pattern_ops indexes
+SEARCH_USERS = text(
+    """
+    (
+        SELECT id, email, full_name FROM "user"
+        WHERE lower(email) LIKE :pattern AND (is_active OR :include_inactive)
+        ORDER BY lower(email) USING ~<~ LIMIT :limit
+    )
+    UNION
+    (
+        SELECT id, email, full_name FROM "user"
+        WHERE lower(full_name) LIKE :pattern AND (is_active OR :include_inactive)
+        ORDER BY lower(full_name) USING ~<~ LIMIT :limit
+    )
+    ORDER BY email LIMIT :limit
+    """
+)
+
+
+def normalize_prefix(prefix: str) -> str:
+    """Lowercase prefix, without the @ of a mention being typed."""
+    return prefix.strip().removeprefix("@").lower()
+
+
+def search_params(prefix: str, *, limit: int, include_inactive: bool) -> dict[str, Any]:
+    # Wildcards typed by the user match themselves
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return {
+        "pattern": f"{escaped}%",
+        "limit": limit,
+        "include_inactive": include_inactive,
+    }
+
+
+def find_users(
+    session: Session,
+    prefix: str,
+    *,
+    limit: int,
+    include_inactive: bool,
+    min_length: int = 1,
+) -> list[UserSearchResult]:
+    """
+    Users whose email or full name starts with prefix, ignoring case, from
+    user_search_cache when this worker answered the same search recently.
+    Prefixes shorter than min_length find no one.
+    """
+    prefix = normalize_prefix(prefix)
+    if len(prefix) < min_length:
+        return []
+    key = (prefix, limit, include_inactive)
+    results = user_search_cache.get(key)
+    if results is None:
+        results = []
+        if prefix:
+            params = search_params(
+                prefix, limit=limit, include_inactive=include_inactive
+            )
+            rows = session.execute(SEARCH_USERS, params).all()
+            results = [UserSearchResult.model_validate(row._asdict()) for row in rows]
+        user_search_cache.set(key, results)
+    return results
+
+
+async def find_users_async(
+    session: AsyncSession,
+    prefix: str,
+    *,
+    limit: int,
+    include_inactive: bool,
+    min_length: int = 1,
+) -> list[UserSearchResult]:
+    prefix = normalize_prefix(prefix)
+    if len(prefix) < min_length:
+        return []
+    key = (prefix, limit, include_inactive)
+    results = user_search_cache.get(key)
+    if results is None:
+        results = []
+        if prefix:
+            params = search_params(
+                prefix, limit=limit, include_inactive=include_inactive
+            )
+            rows = (await session.execute(SEARCH_USERS, params)).all()
+            results = [UserSearchResult.model_validate(row._asdict()) for row in rows]
+        user_search_cache.set(key, results)
+    return results
@@ -9,5 +9,8 @@ python app/backend_pre_start.py
 # Run migrations
 alembic upgrade head
 
+# Create the coming months' notification partitions, workers keep doing it
+python -m app.core.partitions
+
 # Create initial data in DB
 python app/initial_data.py
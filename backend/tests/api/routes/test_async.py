@@ -0,0 +1,237 @@
+import json
+import uuid
+from collections.abc import Generator
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app import crud
+from app.api.routes import items_async, login, users_async
+from app.core.config import settings
+from app.main import custom_generate_unique_id, lifespan
+from app.models import Notification, NotificationType
+from app.routers import notifications_async
+from tests.utils.user import create_random_user, user_authentication_headers
+from tests.utils.utils import random_email, random_lower_string
+
+
+@pytest.fixture(scope="module")
+def client() -> Generator[TestClient, None, None]:
+    # Same API surface as app.main.app with DB_ASYNC enabled
+    async_app = FastAPI(
+        lifespan=lifespan, generate_unique_id_function=custom_generate_unique_id
+    )
+    for router in (
+        login.router,
+        users_async.router,
+        items_async.router,
+        notifications_async.router,
+    ):
+        async_app.include_router(router, prefix=settings.API_V1_STR)
+    with TestClient(async_app) as c:
+        yield c
+
+
+def test_read_user_me(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=superuser_token_headers)
+    assert r.status_code == 200
+    assert r.json()["email"] == settings.FIRST_SUPERUSER
+
+
+def test_item_lifecycle(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    mentioned_user, mentioned_password = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+
+    data = {"title": "Async", "description": f"Hi @{mentioned_user.email}"}
+    r = client.post(f"{settings.API_V1_STR}/items/", headers=headers, json=data)
+    assert r.status_code == 200
+    item_id = r.json()["id"]
+
+    r = client.put(
+        f"{settings.API_V1_STR}/items/{item_id}",
+        headers=headers,
+        json={"title": "Async updated"},
+    )
+    assert r.status_code == 200
+    assert r.json()["title"] == "Async updated"
+
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 200
+    assert r.json()["count"] == 1
+
+    mentioned_headers = user_authentication_headers(
+        client=client, email=mentioned_user.email, password=mentioned_password
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/notifications/unread-count", headers=mentioned_headers
+    )
+    assert r.json() == {"unread_count": 1}
+
+    r = client.delete(f"{settings.API_V1_STR}/items/{item_id}", headers=headers)
+    assert r.status_code == 200
+    r = client.get(f"{settings.API_V1_STR}/items/{item_id}", headers=headers)
+    assert r.status_code == 404
+
+
+def test_bulk_items(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    mentioned, _ = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    url = f"{settings.API_V1_STR}/items/bulk"
+    data = {"items": [{"title": "A"}, {"title": "B", "description": "Hi"}]}
+    r = client.post(url, headers=headers, json=data)
+    assert r.json()["count"] == 2
+    ids = [result["id"] for result in r.json()["data"]]
+
+    data = {
+        "items": [
+            {"id": ids[1], "description": f"Hi @{mentioned.email}"},
+            {"id": str(uuid.uuid4()), "title": "Missing"},
+        ]
+    }
+    r = client.put(url, headers=headers, json=data)
+    assert [result["status"] for result in r.json()["data"]] == [200, 404]
+    assert r.json()["data"][0]["item"]["title"] == "B"
+    mentions = select(Notification).where(Notification.user_id == mentioned.id)
+    assert len(db.exec(mentions).all()) == 1
+
+    r = client.request("DELETE", url, headers=headers, json={"ids": ids})
+    assert r.json()["count"] == 2
+
+
+def test_bulk_notifications(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    notifications = [
+        Notification(user_id=user.id, type=NotificationType.MENTION, message=f"{i}")
+        for i in range(3)
+    ]
+    db.add_all(notifications)
+    db.commit()
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    url = f"{settings.API_V1_STR}/notifications"
+    ids = [str(notifications[0].id)]
+
+    r = client.put(f"{url}/read", headers=headers, json={"ids": ids})
+    assert r.json()["count"] == 1
+    r = client.put(f"{url}/read-all", headers=headers)
+    assert r.json()["count"] == 2
+    r = client.request("DELETE", f"{url}/", headers=headers, json={"ids": ids})
+    assert r.json()["count"] == 1
+    r = client.get(f"{url}/", headers=headers)
+    assert r.json()["count"] == 2
+    assert r.json()["unread_count"] == 0
+
+
+def test_signup_and_delete_me(client: TestClient) -> None:
+    data = {"email": "async-signup@example.com", "password": "asyncpassword"}
+    r = client.post(f"{settings.API_V1_STR}/users/signup", json=data)
+    assert r.status_code == 200
+    headers = user_authentication_headers(
+        client=client, email=data["email"], password=data["password"]
+    )
+    r = client.delete(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+    assert r.json()["message"] == "User deleted successfully"
+
+
+def test_import_users(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "USER_IMPORT_HASH_WORKERS", 0)
+    email = random_email()
+    content = f"email,password\n{email},{random_lower_string()}\n{email},x\n"
+    r = client.post(
+        f"{settings.API_V1_STR}/users/import",
+        headers=superuser_token_headers,
+        files={"file": ("users.csv", content.encode())},
+    )
+    assert r.status_code == 200
+    assert [json.loads(line)["status"] for line in r.text.splitlines()] == [
+        "created",
+        "invalid",
+    ]
+    assert crud.get_user_by_email(session=db, email=email)
+
+
+def test_export_items(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    r = client.post(
+        f"{settings.API_V1_STR}/items/", headers=headers, json={"title": "Export"}
+    )
+    item = r.json()
+    r = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=headers,
+        params={"format": "csv"},
+    )
+    assert r.status_code == 200
+    assert r.text.splitlines()[1].startswith(f"Export,,{item['id']},")
+    r = client.get(f"{settings.API_V1_STR}/notifications/export", headers=headers)
+    assert r.status_code == 200
+    assert r.text == ""
+
+
+def test_search_users(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/users/search",
+        headers=headers,
+        params={"prefix": user.email[:20].upper()},
+    )
+    assert r.status_code == 200
+    assert [found["id"] for found in r.json()["data"]] == [str(user.id)]
+
+
+def test_conditional_requests(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user, password = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    r = client.post(
+        f"{settings.API_V1_STR}/items/", headers=headers, json={"title": "Tagged"}
+    )
+    url = f"{settings.API_V1_STR}/items/{r.json()['id']}"
+    etag = client.get(url, headers=headers).headers["ETag"]
+    r = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304
+
+    r = client.put(url, headers={**headers, "If-Match": etag}, json={"title": "New"})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    r = client.put(url, headers={**headers, "If-Match": etag}, json={"title": "Old"})
+    assert r.status_code == 412
+
+    for path in ("/notifications/", "/users/me"):
+        url = f"{settings.API_V1_STR}{path}"
+        etag = client.get(url, headers=headers).headers["ETag"]
+        r = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert r.status_code == 304
+
+    url = f"{settings.API_V1_STR}/users/{user.id}"
+    headers = {**superuser_token_headers, "If-Match": etag}
+    r = client.patch(url, headers=headers, json={"full_name": "New"})
+    assert r.status_code == 200
+    r = client.patch(url, headers=headers, json={"full_name": "Old"})
+    assert r.status_code == 412
@@ -1,10 +1,21 @@
+import csv
+import io
+import json
 import uuid
+from typing import Any
 
+import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlalchemy import event
+from sqlmodel import Session, select
 
+from app import crud
 from app.core.config import settings
+from app.core.db import engine
+from app.models import ItemCreate, Notification
 from tests.utils.item import create_random_item
+from tests.utils.user import create_random_user, user_authentication_headers
+from tests.utils.utils import random_lower_string
 
 
 def test_create_item(
@@ -40,6 +51,30 @@ def test_read_item(
     assert content["owner_id"] == str(item.owner_id)
 
 
+def test_read_item_not_modified(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    response = client.get(url, headers=superuser_token_headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    headers = {**superuser_token_headers, "If-None-Match": f'W/"other", {etag}'}
+    response = client.get(url, headers=headers)
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    response = client.put(url, headers=superuser_token_headers, json={"title": "New"})
+    assert response.headers["ETag"] != etag
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["title"] == "New"
+    assert response.json()["updated_at"] > response.json()["created_at"]
+
+
 def test_read_item_not_found(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -79,6 +114,223 @@ def test_read_items(
     assert len(content["data"]) >= 2
 
 
+def test_read_items_cursor_pagination(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    items = [
+        crud.create_item(
+            session=db,
+            item_in=ItemCreate(title=random_lower_string()),
+            owner_id=user.id,
+        )
+        for _ in range(3)
+    ]
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=headers, params={"limit": 2}
+    )
+    assert response.status_code == 200
+    page = response.json()
+    assert [item["id"] for item in page["data"]] == [
+        str(items[2].id),
+        str(items[1].id),
+    ]
+    assert page["count"] == 3
+    assert page["next_cursor"]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"limit": 2, "cursor": page["next_cursor"]},
+    )
+    assert response.status_code == 200
+    page = response.json()
+    assert [item["id"] for item in page["data"]] == [str(items[0].id)]
+    assert page["next_cursor"] is None
+
+
+def test_read_items_limit_is_capped(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    for limit in (0, settings.PAGE_LIMIT_MAX + 1):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            params={"limit": limit},
+        )
+        assert response.status_code == 422
+
+
+def test_export_items(
+    client: TestClient, db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Rows span batches
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    user, password = create_random_user(db)
+    for i in range(3):
+        crud.create_item(
+            session=db,
+            item_in=ItemCreate(title=f"Item {i}", description='a, "b"\n'),
+            owner_id=user.id,
+        )
+    # Someone else's, not exported
+    create_random_item(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    page = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()
+
+    response = client.get(f"{settings.API_V1_STR}/items/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert 'filename="items.ndjson"' in response.headers["content-disposition"]
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == page["data"]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=headers,
+        params={"format": "csv"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert rows == [
+        {key: str(value) for key, value in item.items()} for item in page["data"]
+    ]
+
+
+def test_export_items_empty_csv(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    response = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=headers,
+        params={"format": "csv"},
+    )
+    assert response.text.splitlines() == [
+        "title,description,id,owner_id,created_at,updated_at"
+    ]
+
+
+def test_search_items(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user, password = create_random_user(db)
+    word = random_lower_string()
+    in_description, in_title, in_both = (
+        crud.create_item(session=db, item_in=item_in, owner_id=user.id)
+        for item_in in (
+            ItemCreate(title="Other", description=f"Mentions {word}"),
+            ItemCreate(title=f"Running {word}"),
+            ItemCreate(title=f"{word} runs", description=f"{word} again"),
+        )
+    )
+    crud.create_item(
+        session=db, item_in=ItemCreate(title="Unrelated"), owner_id=user.id
+    )
+    # Someone else's, only found by superusers
+    others = create_random_item(db)
+    others.title = word
+    db.add(others)
+    db.commit()
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    url = f"{settings.API_V1_STR}/items/search"
+
+    ids = []
+    cursor = None
+    while True:
+        params: dict[str, str | int] = {"q": word, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(url, headers=headers, params=params)
+        assert response.status_code == 200
+        page = response.json()
+        ids += [item["id"] for item in page["data"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    # Title matches first
+    assert ids == [str(in_both.id), str(in_title.id), str(in_description.id)]
+
+    # Stemmed, with web search syntax
+    response = client.get(url, headers=headers, params={"q": f"{word} -run"})
+    assert [item["id"] for item in response.json()["data"]] == [str(in_description.id)]
+
+    response = client.get(url, headers=superuser_token_headers, params={"q": word})
+    assert len(response.json()["data"]) == 4
+
+    response = client.get(url, headers=headers, params={"q": word, "cursor": "x"})
+    assert response.status_code == 400
+
+
+def test_read_items_counts_in_one_round_trip(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    create_random_item(db)
+    statements: list[str] = []
+
+    def record(*args: Any) -> None:
+        statements.append(args[2])
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(
+            f"{settings.API_V1_STR}/items/", headers=superuser_token_headers
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert response.json()["count"] >= 1
+    assert len([s for s in statements if "FROM item" in s]) == 1
+
+
+def test_read_items_count_modes(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    create_random_item(db)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"include_count": False},
+    )
+    assert response.json()["count"] is None
+    assert len(response.json()["data"]) >= 1
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"estimate_count": True, "limit": 1},
+    )
+    assert response.json()["count"] >= 0
+
+    # Past the last page the count still comes back
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"skip": 1_000_000},
+    )
+    assert response.json()["data"] == []
+    assert response.json()["count"] >= 1
+
+
+def test_read_items_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"cursor": "not-a-cursor"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
 def test_update_item(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -126,6 +378,44 @@ def test_update_item_not_enough_permissions(
     assert content["detail"] == "Not enough permissions"
 
 
+def test_update_item_if_match(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    etag = client.get(url, headers=superuser_token_headers).headers["ETag"]
+
+    headers = {**superuser_token_headers, "If-Match": etag}
+    response = client.put(url, headers=headers, json={"title": "First"})
+    assert response.status_code == 200
+    new_etag = response.headers["ETag"]
+    assert new_etag != etag
+
+    # Written meanwhile by someone else, here with the previous ETag
+    response = client.put(url, headers=headers, json={"title": "Second"})
+    assert response.status_code == 412
+    # Weak tags never match If-Match
+    headers["If-Match"] = f"W/{new_etag}"
+    response = client.put(url, headers=headers, json={"title": "Second"})
+    assert response.status_code == 412
+    assert client.get(url, headers=superuser_token_headers).json()["title"] == "First"
+
+    # Bulk updates bump the version too
+    client.put(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=superuser_token_headers,
+        json={"items": [{"id": str(item.id), "title": "Bulk"}]},
+    )
+    headers["If-Match"] = new_etag
+    response = client.put(url, headers=headers, json={"title": "Second"})
+    assert response.status_code == 412
+
+    headers["If-Match"] = "*"
+    response = client.put(url, headers=headers, json={"title": "Second"})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Second"
+
+
 def test_delete_item(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -162,3 +452,80 @@ def test_delete_item_not_enough_permissions(
     assert response.status_code == 403
     content = response.json()
     assert content["detail"] == "Not enough permissions"
+
+
+def test_bulk_item_lifecycle(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    mentioned, _ = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    url = f"{settings.API_V1_STR}/items/bulk"
+    data = {
+        "items": [
+            {"title": "Bulk 0", "description": f"Hi @{mentioned.email}"},
+            {"title": "Bulk 1"},
+            {"title": "Bulk 2", "description": f"Also @{mentioned.email}"},
+        ]
+    }
+    response = client.post(url, headers=headers, json=data)
+    assert response.status_code == 200
+    content = response.json()
+    assert content["count"] == 3
+    assert [r["status"] for r in content["data"]] == [200, 200, 200]
+    assert [r["item"]["title"] for r in content["data"]] == [
+        "Bulk 0",
+        "Bulk 1",
+        "Bulk 2",
+    ]
+    ids = [r["id"] for r in content["data"]]
+    mentions = select(Notification).where(Notification.user_id == mentioned.id)
+    assert len(db.exec(mentions).all()) == 2
+
+    other_item = create_random_item(db)
+    missing = str(uuid.uuid4())
+    data = {
+        "items": [
+            {"id": ids[0], "title": "Bulk 0 updated"},
+            {"id": ids[1], "description": f"Now @{mentioned.email}"},
+            {"id": ids[2], "description": None},
+            {"id": str(other_item.id), "title": "Not mine"},
+            {"id": missing, "title": "Missing"},
+            {"id": ids[0], "title": "Twice"},
+        ]
+    }
+    response = client.put(url, headers=headers, json=data)
+    assert response.status_code == 200
+    content = response.json()
+    assert content["count"] == 3
+    assert [r["status"] for r in content["data"]] == [200, 200, 200, 403, 404, 400]
+    updated = [r["item"] for r in content["data"][:3]]
+    assert updated[0]["title"] == "Bulk 0 updated"
+    assert updated[0]["description"] == f"Hi @{mentioned.email}"
+    assert updated[1]["title"] == "Bulk 1"
+    assert updated[2]["description"] is None
+    assert content["data"][3]["error"] == "Not enough permissions"
+    # Only the mention new to its description is notified
+    db.expire_all()
+    assert len(db.exec(mentions).all()) == 3
+    db.refresh(other_item)
+    assert other_item.title != "Not mine"
+
+    data = {"ids": [ids[0], ids[1], str(other_item.id)]}
+    response = client.request("DELETE", url, headers=headers, json=data)
+    assert response.status_code == 200
+    content = response.json()
+    assert content["count"] == 2
+    assert [r["status"] for r in content["data"]] == [200, 200, 403]
+    response = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert [item["id"] for item in response.json()["data"]] == [ids[2]]
+
+
+def test_bulk_items_limit(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    data = {"items": [{"title": "Too many"}] * 1001}
+    response = client.post(
+        f"{settings.API_V1_STR}/items/bulk", headers=superuser_token_headers, json=data
+    )
+    assert response.status_code == 422
@@ -1,15 +1,17 @@
 from unittest.mock import patch
 
+import jwt
 from fastapi.testclient import TestClient
 from pwdlib.hashers.bcrypt import BcryptHasher
 from sqlmodel import Session
 
 from app.core.config import settings
-from app.core.security import get_password_hash, verify_password
+from app.core.hashing import hashing_pool
+from app.core.security import ALGORITHM, get_password_hash, verify_password
 from app.crud import create_user
 from app.models import User, UserCreate
 from app.utils import generate_password_reset_token
-from tests.utils.user import user_authentication_headers
+from tests.utils.user import create_random_user, user_authentication_headers
 from tests.utils.utils import random_email, random_lower_string
 
 
@@ -34,6 +36,17 @@ def test_get_access_token_incorrect_password(client: TestClient) -> None:
     assert r.status_code == 400
 
 
+def test_get_access_token_hashing_pool_busy(client: TestClient) -> None:
+    login_data = {
+        "username": settings.FIRST_SUPERUSER,
+        "password": settings.FIRST_SUPERUSER_PASSWORD,
+    }
+    with patch.object(hashing_pool, "queue_limit", 0):
+        r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+
 def test_use_access_token(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -189,3 +202,57 @@ def test_login_with_argon2_password_keeps_hash(client: TestClient, db: Session)
 
     assert user.hashed_password == original_hash
     assert user.hashed_password.startswith("$argon2")
+
+
+def test_claims_token_authorizes_and_is_revoked_on_password_change(
+    client: TestClient, db: Session
+) -> None:
+    user, password = create_random_user(db)
+    with patch("app.core.config.settings.ACCESS_TOKEN_CLAIMS", True):
+        headers = user_authentication_headers(
+            client=client, email=user.email, password=password
+        )
+    payload = jwt.decode(
+        headers["Authorization"].split()[1],
+        settings.SECRET_KEY,
+        algorithms=[ALGORITHM],
+    )
+    assert payload["is_active"] is True
+    assert payload["is_superuser"] is False
+    assert payload["ver"] == 0
+
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 200
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me/password",
+        headers=headers,
+        json={"current_password": password, "new_password": random_lower_string()},
+    )
+    assert r.status_code == 200
+
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 403
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 403
+
+
+def test_claims_token_is_revoked_on_deactivation(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user, password = create_random_user(db)
+    with patch("app.core.config.settings.ACCESS_TOKEN_CLAIMS", True):
+        headers = user_authentication_headers(
+            client=client, email=user.email, password=password
+        )
+    r = client.get(f"{settings.API_V1_STR}/notifications/unread-count", headers=headers)
+    assert r.status_code == 200
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        json={"is_active": False},
+    )
+    assert r.status_code == 200
+    r = client.get(f"{settings.API_V1_STR}/notifications/unread-count", headers=headers)
+    assert r.status_code == 403
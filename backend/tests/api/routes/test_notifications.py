@@ -1,12 +1,14 @@
+import json
 import uuid
+from datetime import datetime, timedelta, timezone
 
 from fastapi.testclient import TestClient
 from sqlmodel import Session, select
 
 from app.core.config import settings
-from app.models import Notification, NotificationType, User
-from app.services.mentions import parse_mentions
-from tests.utils.user import create_random_user
+from app.models import Item, Notification, NotificationType, User, uuid7
+from app.services.mentions import create_mention_notifications, parse_mentions
+from tests.utils.user import create_random_user, user_authentication_headers
 
 
 def test_parse_mentions_single() -> None:
@@ -121,6 +123,26 @@ def test_create_item_self_mention_no_notification(
     assert count_after == count_before
 
 
+def test_mention_notifications_share_the_item_transaction(db: Session) -> None:
+    """Test that notifications are inserted at once, uncommitted with the item."""
+    mentioner, _ = create_random_user(db)
+    mentioned = [create_random_user(db)[0] for _ in range(2)]
+    item = Item(title="Mentions", owner_id=mentioner.id)
+    db.add(item)
+    text = " ".join(f"@{user.email}" for user in [*mentioned, mentioner])
+
+    notifications = create_mention_notifications(
+        session=db, text=text, mentioner=mentioner, reference_id=item.id
+    )
+    assert {n.user_id for n in notifications} == {user.id for user in mentioned}
+    assert all(n.reference_id == item.id and not n.is_read for n in notifications)
+
+    db.rollback()
+    assert db.get(Item, item.id) is None
+    statement = select(Notification).where(Notification.reference_id == item.id)
+    assert db.exec(statement).all() == []
+
+
 def test_read_notifications(client: TestClient, db: Session) -> None:
     """Test reading notifications for a user."""
     # Create a user and a notification for them
@@ -157,6 +179,109 @@ def test_read_notifications(client: TestClient, db: Session) -> None:
     assert content["count"] >= 1
 
 
+def test_read_notifications_cursor_pagination(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    notifications = [
+        Notification(
+            user_id=user.id, type=NotificationType.MENTION, message=f"Mention {i}"
+        )
+        for i in range(3)
+    ]
+    db.add_all(notifications)
+    db.commit()
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+
+    messages = []
+    cursor = None
+    while True:
+        params: dict[str, str | int] = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(
+            f"{settings.API_V1_STR}/notifications/", headers=headers, params=params
+        )
+        assert response.status_code == 200
+        page = response.json()
+        messages += [notification["message"] for notification in page["data"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert messages == ["Mention 2", "Mention 1", "Mention 0"]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/notifications/",
+        headers=headers,
+        params={"include_count": False, "skip": 3},
+    )
+    content = response.json()
+    assert content["data"] == []
+    assert content["count"] is None
+    assert content["unread_count"] == 3
+
+
+def test_read_notifications_not_modified(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    notifications = [
+        Notification(
+            user_id=user.id, type=NotificationType.MENTION, message=f"Mention {i}"
+        )
+        for i in range(2)
+    ]
+    db.add_all(notifications)
+    db.commit()
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    url = f"{settings.API_V1_STR}/notifications/"
+
+    etag = client.get(url, headers=headers).headers["ETag"]
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    # Other pages have other ETags
+    response = client.get(
+        url, headers={**headers, "If-None-Match": etag}, params={"limit": 1}
+    )
+    assert response.status_code == 200
+
+    # Reading one changes it and the unread count
+    client.put(f"{url}{notifications[0].id}/read", headers=headers)
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["unread_count"] == 1
+    etag = response.headers["ETag"]
+
+    # So does a new notification
+    db.add(Notification(user_id=user.id, type=NotificationType.LIKE, message="Like"))
+    db.commit()
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["count"] == 3
+
+
+def test_export_notifications(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    other, _ = create_random_user(db)
+    db.add_all(
+        Notification(user_id=owner.id, type=NotificationType.LIKE, message="Like")
+        for owner in (user, user, other)
+    )
+    db.commit()
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    page = client.get(f"{settings.API_V1_STR}/notifications/", headers=headers).json()
+
+    response = client.get(
+        f"{settings.API_V1_STR}/notifications/export", headers=headers
+    )
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == page["data"]
+    assert len(exported) == 2
+
+
 def test_get_unread_count(client: TestClient, db: Session) -> None:
     """Test getting unread notification count."""
     # Create a user with unread notifications
@@ -299,7 +424,8 @@ def test_delete_notification(client: TestClient, db: Session) -> None:
 
     # Verify it's deleted
     db.expire_all()
-    deleted = db.get(Notification, notification_id)
+    statement = select(Notification).where(Notification.id == notification_id)
+    deleted = db.exec(statement).first()
     assert deleted is None
 
 
@@ -381,3 +507,100 @@ def test_update_item_with_new_mention_creates_notification(
     notification = db.exec(statement).first()
     assert notification is not None
     assert "mentioned you" in notification.message
+
+
+def test_unread_count_follows_every_write(client: TestClient, db: Session) -> None:
+    """Test the unread counter stays exact through each way of changing it."""
+    user, password = create_random_user(db)
+    notifications = [
+        Notification(user_id=user.id, type=NotificationType.MENTION, message=f"{i}")
+        for i in range(4)
+    ]
+    db.add_all(notifications)
+    db.commit()
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    url = f"{settings.API_V1_STR}/notifications"
+
+    def unread_count() -> int:
+        count = client.get(f"{url}/unread-count", headers=headers).json()
+        listed = client.get(f"{url}/", headers=headers).json()
+        assert listed["unread_count"] == count["unread_count"]
+        return int(count["unread_count"])
+
+    assert unread_count() == 4
+    client.put(f"{url}/{notifications[0].id}/read", headers=headers)
+    assert unread_count() == 3
+    # Read ones don't count when deleted, nor twice when read again
+    client.delete(f"{url}/{notifications[0].id}", headers=headers)
+    client.delete(f"{url}/{notifications[1].id}", headers=headers)
+    assert unread_count() == 2
+    client.put(f"{url}/read-all", headers=headers)
+    assert unread_count() == 0
+    client.put(f"{url}/read-all", headers=headers)
+    assert unread_count() == 0
+
+
+def test_bulk_mark_as_read_and_delete(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    other, _ = create_random_user(db)
+    old = datetime.now(timezone.utc) - timedelta(days=30)
+    notifications = [
+        Notification(user_id=user.id, type=NotificationType.MENTION, message=f"{i}")
+        for i in range(5)
+    ]
+    for notification in notifications[:2]:
+        notification.id = uuid7(old)
+        notification.created_at = old
+    others = Notification(user_id=other.id, type=NotificationType.LIKE, message="")
+    db.add_all([*notifications, others])
+    db.commit()
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    url = f"{settings.API_V1_STR}/notifications"
+
+    ids = [str(n.id) for n in notifications[:3]] + [str(others.id)]
+    response = client.put(f"{url}/read", headers=headers, json={"ids": ids})
+    assert response.status_code == 200
+    assert response.json()["count"] == 3
+    # Already read ones aren't counted again
+    response = client.put(f"{url}/read", headers=headers, json={"ids": ids})
+    assert response.json()["count"] == 0
+
+    before = (old + timedelta(days=1)).isoformat()
+    response = client.request(
+        "DELETE", f"{url}/", headers=headers, json={"before": before}
+    )
+    assert response.status_code == 200
+    assert response.json()["count"] == 2
+    response = client.request("DELETE", f"{url}/", headers=headers, json={"ids": ids})
+    assert response.json()["count"] == 1
+
+    response = client.put(f"{url}/read-all", headers=headers)
+    assert response.json()["count"] == 2
+    db.refresh(others)
+    assert others.is_read is False
+    remaining = db.exec(
+        select(Notification).where(Notification.user_id == user.id)
+    ).all()
+    assert {n.id for n in remaining} == {n.id for n in notifications[3:]}
+
+
+def test_bulk_delete_needs_a_filter(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    response = client.request(
+        "DELETE",
+        f"{settings.API_V1_STR}/notifications/",
+        headers=normal_user_token_headers,
+        json={},
+    )
+    assert response.status_code == 400
+    response = client.put(
+        f"{settings.API_V1_STR}/notifications/read",
+        headers=normal_user_token_headers,
+        json={"ids": []},
+    )
+    assert response.status_code == 422
@@ -0,0 +1,135 @@
+"""
+Query budgets: the most statements each route may run, with cold auth caches.
+Lower a budget when a change saves queries, raising one needs a reason.
+"""
+
+import uuid
+from typing import Any
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.cache import (
+    token_cache,
+    token_version_cache,
+    user_cache,
+    user_search_cache,
+)
+from app.core.config import settings
+from app.models import Item, Notification, NotificationType
+from tests.utils.queries import query_budget
+from tests.utils.user import create_random_user, user_authentication_headers
+
+
+@pytest.fixture(scope="module")
+def owner(client: TestClient, db: Session) -> dict[str, Any]:
+    user, password = create_random_user(db)
+    mentioned = [create_random_user(db)[0] for _ in range(3)]
+    items = [Item(title=f"Item {i}", owner_id=user.id) for i in range(3)]
+    notifications = [
+        Notification(user_id=user.id, type=NotificationType.MENTION, message=f"{i}")
+        for i in range(3)
+    ]
+    db.add_all([*items, *notifications])
+    db.commit()
+    return {
+        "headers": user_authentication_headers(
+            client=client, email=user.email, password=password
+        ),
+        "item": items[0].id,
+        "notification": notifications[0].id,
+        "mentions": " ".join(f"@{u.email}" for u in mentioned),
+    }
+
+
+@pytest.fixture(autouse=True)
+def cold_caches() -> None:
+    user_cache.clear()
+    token_cache.clear()
+    token_version_cache.clear()
+    user_search_cache.clear()
+
+
+def request(
+    client: TestClient, method: str, path: str, headers: dict[str, str], **kwargs: Any
+) -> httpx.Response:
+    response = client.request(
+        method, f"{settings.API_V1_STR}{path}", headers=headers, **kwargs
+    )
+    assert response.status_code == 200, response.text
+    return response
+
+
+@pytest.mark.parametrize(
+    "method,path,budget",
+    [
+        ("GET", "/items/", 2),
+        ("GET", "/items/?limit=1", 2),
+        ("GET", "/items/search?q=item", 2),
+        ("GET", "/items/{item}", 2),
+        ("GET", "/notifications/", 2),
+        ("GET", "/notifications/unread-count", 2),
+        ("GET", "/notifications/{notification}", 2),
+        ("PUT", "/notifications/{notification}/read", 4),
+        ("PUT", "/notifications/read-all", 2),
+        ("GET", "/users/me", 1),
+        ("GET", "/users/search?prefix=a", 2),
+    ],
+)
+def test_route_query_budget(
+    client: TestClient, owner: dict[str, Any], method: str, path: str, budget: int
+) -> None:
+    path = path.format(**owner)
+    with query_budget(budget):
+        request(client, method, path, owner["headers"])
+
+
+def test_create_item_query_budget(client: TestClient, owner: dict[str, Any]) -> None:
+    # The same for any number of mentions: one lookup and one INSERT of them all.
+    # The answer is built from the INSERT's RETURNING, not read again after commit
+    data = {"title": "Budget", "description": f"Hi {owner['mentions']}"}
+    with query_budget(4):
+        request(client, "POST", "/items/", owner["headers"], json=data)
+
+
+def test_update_item_query_budget(client: TestClient, owner: dict[str, Any]) -> None:
+    data = {"description": f"Hello {owner['mentions']} {uuid.uuid4()}"}
+    with query_budget(5):
+        request(client, "PUT", f"/items/{owner['item']}", owner["headers"], json=data)
+
+
+def test_bulk_items_query_budget(client: TestClient, owner: dict[str, Any]) -> None:
+    # The same for any number of items and mentions
+    url = "/items/bulk"
+    entries = [
+        {"title": f"Bulk {i}", "description": owner["mentions"]} for i in range(5)
+    ]
+    with query_budget(4):
+        response = request(
+            client, "POST", url, owner["headers"], json={"items": entries}
+        )
+    ids = [result["id"] for result in response.json()["data"]]
+    updates = [{"id": id, "description": f"{owner['mentions']} {id}"} for id in ids]
+    user_cache.clear()
+    with query_budget(5):
+        request(client, "PUT", url, owner["headers"], json={"items": updates})
+    user_cache.clear()
+    with query_budget(3):
+        request(client, "DELETE", url, owner["headers"], json={"ids": ids})
+
+
+def test_superuser_list_query_budget(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    for path in ("/users/", "/items/"):
+        with query_budget(2):
+            request(client, "GET", path, superuser_token_headers)
+
+
+def test_query_count_headers(client: TestClient, owner: dict[str, Any]) -> None:
+    # With cold caches, the one statement is the authenticated user's lookup
+    response = client.get(f"{settings.API_V1_STR}/users/me", headers=owner["headers"])
+    assert response.headers["X-DB-Queries"] == "1"
+    assert float(response.headers["X-DB-Time-Ms"]) > 0
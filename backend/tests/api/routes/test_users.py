@@ -1,14 +1,19 @@
+import json
 import uuid
+from typing import Any
 from unittest.mock import patch
 
+import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, select
+from sqlalchemy import text
+from sqlmodel import Session, func, select
 
 from app import crud
+from app.core.cache import user_cache
 from app.core.config import settings
 from app.core.security import verify_password
 from app.models import User, UserCreate
-from tests.utils.user import create_random_user
+from tests.utils.user import create_random_user, user_authentication_headers
 from tests.utils.utils import random_email, random_lower_string
 
 
@@ -176,6 +181,163 @@ def test_create_user_by_normal_user(
     assert r.status_code == 403
 
 
+def test_search_users(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+    db: Session,
+) -> None:
+    prefix = random_lower_string()[:12]
+    password = random_lower_string()
+    users = [
+        crud.create_user(session=db, user_create=user_in)
+        for user_in in (
+            UserCreate(email=f"{prefix}.b@example.com", password=password),
+            UserCreate(email=f"{prefix}.a@example.com", password=password),
+            UserCreate(
+                email=random_email(),
+                full_name=f"{prefix.title()} Smith",
+                password=password,
+            ),
+            UserCreate(
+                email=f"{prefix}.inactive@example.com",
+                is_active=False,
+                password=password,
+            ),
+        )
+    ]
+    url = f"{settings.API_V1_STR}/users/search"
+
+    r = client.get(url, headers=normal_user_token_headers, params={"prefix": prefix})
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == (
+        f"private, max-age={settings.USER_SEARCH_CACHE_TTL_SECONDS}"
+    )
+    found = r.json()["data"]
+    ids = [user["id"] for user in found]
+    assert set(ids) == {str(user.id) for user in users[:3]}
+    # By email
+    assert ids.index(str(users[1].id)) < ids.index(str(users[0].id))
+    assert set(found[0]) == {"id", "email", "full_name"}
+
+    # Case insensitive, with the @ of a mention being typed
+    params = {"prefix": f"@{prefix.upper()}.A", "limit": 1}
+    r = client.get(url, headers=normal_user_token_headers, params=params)
+    assert [user["email"] for user in r.json()["data"]] == [users[1].email]
+
+    # Superusers also find inactive users
+    r = client.get(url, headers=superuser_token_headers, params={"prefix": prefix})
+    assert len(r.json()["data"]) == 4
+
+    # Wildcards match themselves
+    r = client.get(url, headers=normal_user_token_headers, params={"prefix": "%"})
+    assert r.json()["data"] == []
+
+    # Short prefixes find no one but for superusers
+    params = {"prefix": prefix[: settings.USER_SEARCH_MIN_PREFIX_LENGTH - 1]}
+    r = client.get(url, headers=normal_user_token_headers, params=params)
+    assert r.status_code == 200
+    assert r.json()["data"] == []
+    r = client.get(url, headers=superuser_token_headers, params=params)
+    assert r.json()["data"]
+
+    r = client.get(url, headers=normal_user_token_headers, params={"limit": 21})
+    assert r.status_code == 422
+
+
+def import_users(
+    client: TestClient, headers: dict[str, str], filename: str, content: str
+) -> list[dict[str, Any]]:
+    r = client.post(
+        f"{settings.API_V1_STR}/users/import",
+        headers=headers,
+        files={"file": (filename, content.encode())},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in r.text.splitlines()]
+
+
+def test_import_users_csv(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "USER_IMPORT_HASH_WORKERS", 0)
+    # Rows span batches
+    monkeypatch.setattr(settings, "USER_IMPORT_BATCH_SIZE", 2)
+    existing, _ = create_random_user(db)
+    new = [random_email() for _ in range(2)]
+    password = random_lower_string()
+    content = (
+        "email,password,full_name,is_superuser\n"
+        f"{new[0]},{password},First,\n"
+        f"{existing.email},{password},,\n"
+        f"{new[0]},{password},Again,\n"
+        f"not-an-email,{password},,\n"
+        f"{new[1]},short,,\n"
+        f"{new[1]},{password},,true\n"
+    )
+    results = import_users(client, superuser_token_headers, "users.csv", content)
+
+    assert [(r["line"], r["status"]) for r in results] == [
+        (2, "created"),
+        (3, "exists"),
+        (4, "duplicate"),
+        (5, "invalid"),
+        (6, "invalid"),
+        (7, "created"),
+    ]
+    assert "password" in results[4]["error"]
+    first = crud.get_user_by_email(session=db, email=new[0])
+    assert first and str(first.id) == results[0]["id"]
+    assert first.full_name == "First"
+    assert first.is_active and not first.is_superuser
+    assert verify_password(password, first.hashed_password)[0]
+    second = crud.get_user_by_email(session=db, email=new[1])
+    assert second and second.is_superuser
+
+
+def test_import_users_ndjson(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    content = "\n".join(
+        [
+            json.dumps({"email": email, "password": password}),
+            "",
+            "{not json",
+            "[]",
+        ]
+    )
+    # Passwords hashed by the process pool
+    results = import_users(client, superuser_token_headers, "users.ndjson", content)
+
+    assert [(r["line"], r["status"]) for r in results] == [
+        (1, "created"),
+        (3, "invalid"),
+        (4, "invalid"),
+    ]
+    user = crud.get_user_by_email(session=db, email=email)
+    assert user and verify_password(password, user.hashed_password)[0]
+
+
+def test_import_users_errors(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+) -> None:
+    url = f"{settings.API_V1_STR}/users/import"
+    files = {"file": ("users.csv", b"email,password\n")}
+    r = client.post(url, headers=normal_user_token_headers, files=files)
+    assert r.status_code == 403
+    files = {"file": ("users.xlsx", b"")}
+    r = client.post(url, headers=superuser_token_headers, files=files)
+    assert r.status_code == 400
+
+
 def test_retrieve_users(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -198,6 +360,42 @@ def test_retrieve_users(
         assert "email" in item
 
 
+def test_retrieve_users_cursor_pagination(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(2):
+        create_random_user(db)
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 1},
+    )
+    first_page = r.json()
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 1, "cursor": first_page["next_cursor"]},
+    )
+    second_page = r.json()
+    assert len(second_page["data"]) == 1
+    assert second_page["data"][0]["id"] != first_page["data"][0]["id"]
+    assert second_page["data"][0]["created_at"] <= first_page["data"][0]["created_at"]
+
+
+def test_retrieve_users_estimated_count(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    db.execute(text('ANALYZE "user"'))
+    db.commit()
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"estimate_count": True},
+    )
+    assert r.status_code == 200
+    assert r.json()["count"] == db.exec(select(func.count()).select_from(User)).one()
+
+
 def test_update_user_me(
     client: TestClient, normal_user_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -221,6 +419,72 @@ def test_update_user_me(
     assert user_db.full_name == full_name
 
 
+def test_read_user_me_is_cached_until_update(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    hits = user_cache.stats().hits
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+    assert user_cache.stats().hits == hits + 1
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me",
+        headers=headers,
+        json={"full_name": "Cached Name"},
+    )
+    assert r.status_code == 200
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.json()["full_name"] == "Cached Name"
+
+
+def test_read_user_me_not_modified(client: TestClient, db: Session) -> None:
+    user, password = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    url = f"{settings.API_V1_STR}/users/me"
+    etag = client.get(url, headers=headers).headers["ETag"]
+    r = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304
+
+    client.patch(url, headers=headers, json={"full_name": "Versioned Name"})
+    r = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert r.json()["full_name"] == "Versioned Name"
+
+    # Another user with the same version has another ETag
+    other, password = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=other.email, password=password
+    )
+    assert client.get(url, headers=headers).headers["ETag"] != etag
+
+
+def test_deactivated_user_cache_is_invalidated(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user, password = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        json={"is_active": False},
+    )
+    assert r.status_code == 200
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Inactive user"
+
+
 def test_update_password_me(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -381,6 +645,33 @@ def test_update_user(
     assert user_db.full_name == "Updated_full_name"
 
 
+def test_update_user_if_match(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user, _ = create_random_user(db)
+    url = f"{settings.API_V1_STR}/users/{user.id}"
+    r = client.patch(url, headers=superuser_token_headers, json={"full_name": "One"})
+    etag = r.headers["ETag"]
+
+    headers = {**superuser_token_headers, "If-Match": etag}
+    r = client.patch(url, headers=headers, json={"full_name": "Two"})
+    assert r.status_code == 200
+    r = client.patch(url, headers=headers, json={"full_name": "Three"})
+    assert r.status_code == 412
+    db.refresh(user)
+    assert user.full_name == "Two"
+
+    # The superuser updating themselves, with the ETag of /users/me
+    me = client.get(f"{settings.API_V1_STR}/users/me", headers=superuser_token_headers)
+    headers["If-Match"] = me.headers["ETag"]
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/{me.json()['id']}",
+        headers=headers,
+        json={"full_name": me.json()["full_name"]},
+    )
+    assert r.status_code == 200
+
+
 def test_update_user_not_exists(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -0,0 +1,56 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_password_hashing_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/password-hashing/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    stats = r.json()
+    assert stats["workers"] == settings.PASSWORD_HASH_WORKERS
+    assert stats["queue_limit"] == settings.PASSWORD_HASH_QUEUE_LIMIT
+    assert stats["completed"] > 0
+
+
+def test_password_hashing_stats_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/password-hashing/",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 403
+
+
+def test_cache_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/caches/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    stats = r.json()["user"]
+    assert stats["max_size"] == settings.USER_CACHE_MAX_SIZE
+    assert stats["hits"] + stats["misses"] > 0
+
+
+def test_db_pool_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-pool/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    stats = r.json()["sync"]
+    assert stats["pool_size"] == settings.db_pool_size
+    assert stats["max_overflow"] == settings.db_max_overflow
+    assert stats["checked_out"] >= 1
+    assert stats["checkouts"] > 0
+    assert stats["timeouts"] == 0
@@ -0,0 +1,200 @@
+import time
+import uuid
+from collections.abc import Generator
+from datetime import timedelta
+from typing import Any
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, create_engine, event
+from sqlmodel import Session
+
+from app.api import deps
+from app.api.deps import get_token_data
+from app.api.replicas import COOKIE, HEADER, wrote_recently
+from app.core.cache import TTLCache, token_cache
+from app.core.config import settings
+from app.core.db import InstrumentedQueuePool, ReplicaSet, get_pool_stats
+from app.core.security import create_access_token
+from tests.utils.user import create_random_user, user_authentication_headers
+from tests.utils.utils import random_lower_string
+
+
+def test_get_token_data_is_cached() -> None:
+    user_id = uuid.uuid4()
+    token = create_access_token(user_id, expires_delta=timedelta(minutes=5))
+    hits = token_cache.stats().hits
+    assert get_token_data(token).sub == str(user_id)
+    assert get_token_data(token).sub == str(user_id)
+    assert token_cache.stats().hits == hits + 1
+
+
+def test_get_token_data_invalid_token_is_not_cached() -> None:
+    size = token_cache.stats().size
+    with pytest.raises(HTTPException) as exc_info:
+        get_token_data("not-a-token")
+    assert exc_info.value.status_code == 403
+    assert token_cache.stats().size == size
+
+
+def test_get_token_data_expired_token() -> None:
+    token = create_access_token(uuid.uuid4(), expires_delta=timedelta(minutes=-1))
+    with pytest.raises(HTTPException):
+        get_token_data(token)
+
+
+@pytest.fixture
+def replica(monkeypatch: pytest.MonkeyPatch) -> Generator[Engine, None, None]:
+    # The test database stands in for a replica, next to one that is down
+    replica = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI), poolclass=InstrumentedQueuePool
+    )
+    down = create_engine(
+        settings.SQLALCHEMY_DATABASE_URI.unicode_string().replace(
+            f":{settings.POSTGRES_PORT}/", ":1/"
+        ),
+        poolclass=InstrumentedQueuePool,
+    )
+    replicas = ReplicaSet([down, replica], retry_seconds=60)
+    monkeypatch.setattr(settings, "POSTGRES_REPLICA_SERVERS", ["down", "replica"])
+    monkeypatch.setattr(deps, "replicas", replicas)
+    yield replica
+    replica.dispose()
+    down.dispose()
+
+
+def test_reads_use_replica_until_user_writes(
+    client: TestClient, normal_user_token_headers: dict[str, str], replica: Engine
+) -> None:
+    checkouts = get_pool_stats(replica).checkouts
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    assert r.status_code == 200
+    assert get_pool_stats(replica).checkouts == checkouts + 1
+    # The replica that is down was tried first and is now skipped
+    assert deps.replicas.choose() is replica
+
+    full_name = random_lower_string()
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me",
+        headers=normal_user_token_headers,
+        json={"full_name": full_name},
+    )
+    assert r.status_code == 200
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    assert r.json()["full_name"] == full_name
+    assert get_pool_stats(replica).checkouts == checkouts + 1
+
+
+def test_reads_use_primary_when_replicas_are_down(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    replica: Engine,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    replicas = ReplicaSet([replica], retry_seconds=60)
+    replicas.mark_down(replica)
+    monkeypatch.setattr(deps, "replicas", replicas)
+    checkouts = get_pool_stats(replica).checkouts
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    assert r.status_code == 200
+    assert get_pool_stats(replica).checkouts == checkouts
+
+
+def test_reads_use_primary_after_a_write_in_another_worker(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    replica: Engine,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    full_name = random_lower_string()
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me",
+        headers=normal_user_token_headers,
+        json={"full_name": full_name},
+    )
+    assert r.status_code == 200
+    assert COOKIE in r.cookies
+    try:
+        # The next read is served by a worker whose cache didn't see the write
+        other_worker_cache: TTLCache[str, bool] = TTLCache(
+            max_size=100, ttl=settings.READ_YOUR_WRITES_SECONDS
+        )
+        monkeypatch.setattr(deps, "read_your_writes_cache", other_worker_cache)
+        checkouts = get_pool_stats(replica).checkouts
+        r = client.get(
+            f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers
+        )
+        assert r.json()["full_name"] == full_name
+        assert get_pool_stats(replica).checkouts == checkouts
+
+        # Without the cookie it goes to a replica
+        client.cookies.clear()
+        client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+        assert get_pool_stats(replica).checkouts == checkouts + 1
+    finally:
+        client.cookies.clear()
+
+
+def test_reads_use_primary_with_the_header_of_a_write(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    replica: Engine,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    full_name = random_lower_string()
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me",
+        headers=normal_user_token_headers,
+        json={"full_name": full_name},
+    )
+    until = r.headers[HEADER]
+    # A client on another origin: no cookies, the header echoed to another worker
+    client.cookies.clear()
+    monkeypatch.setattr(
+        deps,
+        "read_your_writes_cache",
+        TTLCache(max_size=100, ttl=settings.READ_YOUR_WRITES_SECONDS),
+    )
+    checkouts = get_pool_stats(replica).checkouts
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me",
+        headers={**normal_user_token_headers, HEADER: until},
+    )
+    assert r.json()["full_name"] == full_name
+    assert get_pool_stats(replica).checkouts == checkouts
+
+    client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    assert get_pool_stats(replica).checkouts == checkouts + 1
+
+
+def test_exports_use_replica(client: TestClient, db: Session, replica: Engine) -> None:
+    user, password = create_random_user(db)
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    # Logging in is a write, its cookie would keep the reads on the primary
+    client.cookies.clear()
+    statements: list[str] = []
+
+    def record(*args: Any) -> None:
+        statements.append(args[2])
+
+    event.listen(replica, "before_cursor_execute", record)
+    try:
+        for path in ("/items/export", "/notifications/export"):
+            r = client.get(f"{settings.API_V1_STR}{path}", headers=headers)
+            assert r.status_code == 200
+    finally:
+        event.remove(replica, "before_cursor_execute", record)
+    assert any("FROM item" in statement for statement in statements)
+    assert any("FROM notification" in statement for statement in statements)
+
+
+def test_forged_read_your_writes_cookie_is_ignored() -> None:
+    now = time.time()
+    assert wrote_recently(str(now + 1))
+    assert not wrote_recently(str(now - 1))
+    assert not wrote_recently(str(now + 3600))
+    assert not wrote_recently("forever")
+    assert not wrote_recently(None)
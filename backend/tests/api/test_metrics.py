@@ -0,0 +1,155 @@
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.metrics import Registry, merge, render
+
+
+def sample(text: str, name: str, **labels: str) -> float | None:
+    """Value of the sample with name and at least labels, None if missing."""
+    for line in text.splitlines():
+        match = re.fullmatch(r"(\w+)(?:\{(.*)\})? (\S+)", line)
+        if not match or match[1] != name:
+            continue
+        found = dict(re.findall(r'(\w+)="([^"]*)"', match[2] or ""))
+        if labels.items() <= found.items():
+            return float(match[3])
+    return None
+
+
+def test_metrics(client: TestClient) -> None:
+    before = client.get("/metrics").text
+    client.get(f"{settings.API_V1_STR}/utils/health-check/")
+    client.get(f"{settings.API_V1_STR}/nothing-here")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    text = response.text
+
+    health = {"route": "utils-health_check", "method": "GET"}
+    count = sample(text, "http_requests_total", status="200", **health)
+    previous = sample(before, "http_requests_total", status="200", **health) or 0
+    assert count == previous + 1
+    assert sample(text, "http_requests_total", route="unmatched", status="404")
+    assert sample(text, "http_request_duration_seconds_bucket", le="+Inf", **health)
+    assert sample(text, "http_request_duration_seconds_count", **health) == count
+    # This scrape is in progress
+    assert sample(text, "http_requests_in_progress") == 1
+    pid = str(os.getpid())
+    assert sample(text, "threadpool_tokens_total", pid=pid) == 40
+    assert sample(text, "websocket_connections", pid=pid) == 0
+    assert sample(text, "db_pool_size", engine="sync") == settings.db_pool_size
+
+
+def test_metrics_token(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "secret")
+    assert client.get("/metrics").status_code == 401
+    headers = {"Authorization": "Bearer secret"}
+    assert client.get("/metrics", headers=headers).status_code == 200
+
+
+def test_metrics_token_required_outside_local(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "ENVIRONMENT", "production")
+    assert client.get("/metrics").status_code == 401
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "secret")
+    headers = {"Authorization": "Bearer secret"}
+    assert client.get("/metrics", headers=headers).status_code == 200
+
+
+def test_metrics_wait_for_other_workers_off_the_event_loop(
+    client: TestClient, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "METRICS_DIR", str(tmp_path))
+    statuses: dict[str, int] = {}
+
+    def get(name: str, url: str) -> threading.Thread:
+        def run() -> None:
+            statuses[name] = client.get(url).status_code
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    with (tmp_path / ".lock").open("w") as lock:
+        # Another worker compacting
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        scrape = get("scrape", "/metrics")
+        time.sleep(0.2)
+        health = get("health", f"{settings.API_V1_STR}/utils/health-check/")
+        health.join(timeout=5)
+        assert statuses == {"health": 200}
+    scrape.join(timeout=5)
+    assert statuses == {"health": 200, "scrape": 200}
+
+
+def test_metrics_added_up_across_workers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.")
+    in_progress = registry.gauge("in_progress", "In progress.")
+    latency = registry.histogram("latency_seconds", "Latency.")
+    requests.inc(route="a")
+    in_progress.inc()
+    latency.observe(0.02, route="a")
+
+    # An exited worker, its counters still count but not its gauges
+    exited = registry.snapshot()
+    # Above the largest pid Linux allows
+    exited["pid"] = 2**22 + 1
+    exited["worker"] = "exited"
+    (tmp_path / "worker-exited.json").write_text(json.dumps(exited))
+    monkeypatch.setattr(settings, "METRICS_DIR", str(tmp_path))
+
+    for _ in range(2):
+        text = registry.render()
+        assert sample(text, "requests_total", route="a") == 2
+        assert sample(text, "in_progress") == 1
+        assert sample(text, "latency_seconds_bucket", route="a", le="0.01") == 0
+        assert sample(text, "latency_seconds_bucket", route="a", le="0.025") == 2
+        assert sample(text, "latency_seconds_count", route="a") == 2
+        assert sample(text, "latency_seconds_sum", route="a") == pytest.approx(0.04)
+        # Folded into exited.json once, not again by the next scrape
+        assert not (tmp_path / "worker-exited.json").exists()
+        assert (tmp_path / "exited.json").exists()
+
+
+def test_stale_metrics_of_reused_pid_are_compacted(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    registry = Registry()
+    registry.counter("requests_total", "Requests.").inc()
+    registry.gauge("in_progress", "In progress.").inc()
+    # A worker long gone, whose pid is this live process now
+    stale = registry.snapshot()
+    stale["worker"] = "stale"
+    path = tmp_path / "worker-stale.json"
+    path.write_text(json.dumps(stale))
+    written = time.time() - 100 * settings.METRICS_WRITE_SECONDS
+    os.utime(path, (written, written))
+    monkeypatch.setattr(settings, "METRICS_DIR", str(tmp_path))
+
+    text = registry.render()
+    assert sample(text, "requests_total") == 2
+    assert sample(text, "in_progress") == 1
+    assert not path.exists()
+
+
+def test_render_escapes_labels() -> None:
+    registry = Registry()
+    registry.counter("things_total", "Things.").inc(name='a "b"\n')
+    text = render(merge([registry.snapshot()]))
+    assert text.splitlines() == [
+        "# HELP things_total Things.",
+        "# TYPE things_total counter",
+        'things_total{name="a \\"b\\"\\n"} 1.0',
+    ]
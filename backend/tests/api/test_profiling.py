@@ -0,0 +1,89 @@
+import json
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import db
+from app.core.config import settings
+from app.core.db import count_parameters, fingerprint, normalize_statement
+
+
+def server_timing(header: str) -> dict[str, str]:
+    return {entry.split(";")[0]: entry for entry in header.split(", ")}
+
+
+def test_server_timing_header(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers
+    )
+    assert response.status_code == 200
+    entries = server_timing(response.headers["Server-Timing"])
+    assert list(entries) == ["auth", "db", "serialize", "total"]
+    assert 'desc="' in entries["db"]
+
+
+def test_server_timing_disabled(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "SERVER_TIMING_ENABLED", False)
+    response = client.get(f"{settings.API_V1_STR}/utils/health-check/")
+    assert "Server-Timing" not in response.headers
+
+
+def test_slow_query_log(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_SECONDS", 0)
+    with caplog.at_level(logging.WARNING, logger=db.slow_query_logger.name):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/?limit=5", headers=normal_user_token_headers
+        )
+    assert response.status_code == 200
+    entries = [json.loads(record.getMessage()) for record in caplog.records]
+    items = [e for e in entries if "FROM item" in e["statement"]]
+    assert items
+    assert {e["route"] for e in entries} == {"items-read_items"}
+    # The limit is bound, the page size doesn't change the fingerprint
+    assert "LIMIT ?" in items[0]["statement"]
+    assert items[0]["parameters"] >= 2
+    assert items[0]["fingerprint"] == fingerprint(items[0]["statement"])
+
+
+def test_slow_query_log_disabled(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_SECONDS", None)
+    with caplog.at_level(logging.WARNING, logger=db.slow_query_logger.name):
+        client.get(f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers)
+    assert caplog.records == []
+
+
+def test_fingerprint_ignores_values() -> None:
+    statement = """
+        SELECT item.id FROM item
+        WHERE item.owner_id = %(owner_id_1)s AND item.title = 'a''b'
+          AND item.id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s)
+        LIMIT %(param_1)s
+    """
+    assert normalize_statement(statement) == (
+        "SELECT item.id FROM item WHERE item.owner_id = ? AND item.title = ? "
+        "AND item.id IN (?) LIMIT ?"
+    )
+    other = statement.replace("'a''b'", "'c'").replace(", %(id_1_3)s", "")
+    assert fingerprint(other) == fingerprint(statement)
+    assert fingerprint("SELECT 1") != fingerprint(statement)
+
+
+def test_count_parameters() -> None:
+    assert count_parameters({"a": 1, "b": 2}, False) == 2
+    assert count_parameters(None, False) == 0
+    assert count_parameters([{"a": 1}, {"a": 2}], True) == 2
@@ -0,0 +1,289 @@
+"""
+Query plan regression tests: the hot routes run against enough seeded rows that
+the planner has to use an index, and every statement they execute is EXPLAINed.
+A sequential scan on one of the big tables fails the test.
+"""
+
+import json
+import re
+from collections.abc import Generator, Iterator
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.partitions import PARTITION_NAME
+from app.models import Item, Notification, NotificationType, uuid7
+from tests.utils.user import create_random_user, user_authentication_headers
+
+SEEDED_USERS = 2000
+ITEMS_PER_USER = 5
+NOTIFICATIONS_PER_USER = 10
+
+TABLES = {"user", "item", "notification"}
+
+
+@pytest.fixture(scope="module")
+def seeded(db: Session) -> Generator[None, None, None]:
+    db.execute(
+        text(
+            """
+            INSERT INTO "user" (id, email, hashed_password, is_active,
+                                is_superuser, created_at, token_version)
+            SELECT gen_random_uuid(), 'plan-' || n || '@example.com', '', true,
+                   false, now() - n * interval '1 minute', 0
+            FROM generate_series(1, :users) AS n
+            """
+        ),
+        {"users": SEEDED_USERS},
+    )
+    db.execute(
+        text(
+            """
+            INSERT INTO item (id, title, owner_id, created_at)
+            SELECT gen_random_uuid(), 'item ' || n, u.id,
+                   now() - n * interval '1 second'
+            FROM "user" AS u, generate_series(1, :items) AS n
+            WHERE u.email LIKE 'plan-%'
+            """
+        ),
+        {"items": ITEMS_PER_USER},
+    )
+    db.execute(
+        text(
+            """
+            INSERT INTO notification (id, type, message, user_id, is_read,
+                                      created_at)
+            SELECT gen_random_uuid(), 'MENTION', 'notification ' || n, u.id,
+                   n % 2 = 0, now() - n * interval '1 second'
+            FROM "user" AS u, generate_series(1, :notifications) AS n
+            WHERE u.email LIKE 'plan-%'
+            """
+        ),
+        {"notifications": NOTIFICATIONS_PER_USER},
+    )
+    db.commit()
+    for table in TABLES:
+        db.execute(text(f'ANALYZE "{table}"'))
+    db.commit()
+    yield
+    # Items and notifications go with their owner
+    db.execute(text("""DELETE FROM "user" WHERE email LIKE 'plan-%'"""))
+    db.commit()
+
+
+@pytest.fixture(scope="module")
+def user_headers(
+    client: TestClient,
+    db: Session,
+    seeded: None,  # noqa: ARG001
+) -> dict[str, str]:
+    user, password = create_random_user(db)
+    for i in range(3):
+        db.add(Item(title=f"Item {i}", owner_id=user.id))
+        db.add(
+            Notification(user_id=user.id, type=NotificationType.MENTION, message=f"{i}")
+        )
+    db.commit()
+    return user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+
+
+def recorded_statements(
+    client: TestClient, method: str, url: str, **kwargs: Any
+) -> list[tuple[str, Any]]:
+    statements: list[tuple[str, Any]] = []
+
+    def record(*args: Any) -> None:
+        statement, parameters, executemany = args[2], args[3], args[5]
+        if executemany:
+            # Batched writes by primary key
+            return
+        if any(table in statement for table in TABLES):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.request(method, url, **kwargs)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200, response.text
+    assert statements
+    return statements
+
+
+def plan_nodes(plan: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def table_of(relation: str) -> str:
+    return "notification" if PARTITION_NAME.fullmatch(relation) else relation
+
+
+def assert_no_seq_scans(statements: list[tuple[str, Any]]) -> None:
+    with engine.connect() as connection:
+        # Scanning a partition without rows costs nothing
+        empty = set(
+            connection.exec_driver_sql(
+                "SELECT relname FROM pg_class WHERE reltuples = 0"
+            ).scalars()
+        )
+        for statement, parameters in statements:
+            result = connection.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters
+            )
+            plan = result.scalar_one()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            seq_scans = [
+                node["Relation Name"]
+                for node in plan_nodes(plan[0]["Plan"])
+                if node["Node Type"] == "Seq Scan"
+                and table_of(node["Relation Name"]) in TABLES
+                and node["Relation Name"] not in empty
+            ]
+            assert not seq_scans, f"Seq Scan on {seq_scans} for:\n{statement}"
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/notifications/",
+        "/notifications/?limit=2",
+        "/notifications/unread-count",
+        "/items/",
+        "/items/?limit=2",
+    ],
+)
+def test_user_reads_use_indexes(
+    client: TestClient, user_headers: dict[str, str], url: str
+) -> None:
+    statements = recorded_statements(
+        client, "GET", f"{settings.API_V1_STR}{url}", headers=user_headers
+    )
+    assert_no_seq_scans(statements)
+
+
+@pytest.mark.parametrize("path", ["/notifications/", "/items/"])
+def test_user_next_page_uses_indexes(
+    client: TestClient, user_headers: dict[str, str], path: str
+) -> None:
+    url = f"{settings.API_V1_STR}{path}"
+    response = client.get(url, headers=user_headers, params={"limit": 1})
+    cursor = response.json()["next_cursor"]
+    statements = recorded_statements(
+        client, "GET", url, headers=user_headers, params={"limit": 1, "cursor": cursor}
+    )
+    assert_no_seq_scans(statements)
+
+
+def test_mark_all_as_read_uses_indexes(
+    client: TestClient, user_headers: dict[str, str]
+) -> None:
+    statements = recorded_statements(
+        client,
+        "PUT",
+        f"{settings.API_V1_STR}/notifications/read-all",
+        headers=user_headers,
+    )
+    assert_no_seq_scans(statements)
+
+
+@pytest.mark.usefixtures("seeded")
+@pytest.mark.parametrize("path", ["/items/", "/users/"])
+def test_superuser_lists_use_indexes(
+    client: TestClient, superuser_token_headers: dict[str, str], path: str
+) -> None:
+    # An exact count of a whole table is a full scan by nature, leave it out
+    statements = recorded_statements(
+        client,
+        "GET",
+        f"{settings.API_V1_STR}{path}",
+        headers=superuser_token_headers,
+        params={"include_count": False},
+    )
+    assert_no_seq_scans(statements)
+
+
+@pytest.mark.usefixtures("seeded")
+def test_login_uses_indexes(client: TestClient) -> None:
+    statements = recorded_statements(
+        client,
+        "POST",
+        f"{settings.API_V1_STR}/login/access-token",
+        data={
+            "username": settings.FIRST_SUPERUSER,
+            "password": settings.FIRST_SUPERUSER_PASSWORD,
+        },
+    )
+    assert_no_seq_scans(statements)
+
+
+def scanned_partitions(statement: str, parameters: Any) -> set[str]:
+    with engine.connect() as connection:
+        result = connection.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        )
+        plan = result.scalar_one()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return {
+        node["Relation Name"]
+        for node in plan_nodes(plan[0]["Plan"])
+        if PARTITION_NAME.fullmatch(node.get("Relation Name", ""))
+    }
+
+
+def assert_prunes_partitions(statements: list[tuple[str, Any]]) -> None:
+    with engine.connect() as connection:
+        partitions = connection.exec_driver_sql(
+            "SELECT count(*) FROM pg_inherits "
+            "WHERE inhparent = 'notification'::regclass"
+        ).scalar_one()
+    assert partitions > 2
+    on_notifications = [
+        (statement, parameters)
+        for statement, parameters in statements
+        if re.search(r"(FROM|UPDATE) notification\b", statement)
+    ]
+    assert on_notifications
+    for statement, parameters in on_notifications:
+        # The one of the ids' time, or its neighbour near a month's end
+        assert 1 <= len(scanned_partitions(statement, parameters)) <= 2
+
+
+def test_read_notification_prunes_partitions(
+    client: TestClient, user_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/notifications/"
+    notification = client.get(url, headers=user_headers).json()["data"][0]
+    statements = recorded_statements(
+        client, "GET", f"{url}{notification['id']}", headers=user_headers
+    )
+    assert_no_seq_scans(statements)
+    assert_prunes_partitions(statements)
+
+
+def test_bulk_notification_writes_prune_partitions(
+    client: TestClient, user_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/notifications/"
+    ids = [n["id"] for n in client.get(url, headers=user_headers).json()["data"]]
+    statements = recorded_statements(
+        client, "PUT", f"{url}read", headers=user_headers, json={"ids": ids}
+    )
+    assert_no_seq_scans(statements)
+    assert_prunes_partitions(statements)
+
+    # Ids of no notification, to leave the ones of the other tests
+    missing = [str(uuid7()) for _ in range(3)]
+    statements = recorded_statements(
+        client, "DELETE", url, headers=user_headers, json={"ids": missing}
+    )
+    assert_no_seq_scans(statements)
+    assert_prunes_partitions(statements)
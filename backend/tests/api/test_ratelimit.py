@@ -0,0 +1,198 @@
+import asyncio
+from collections.abc import Generator
+from ipaddress import ip_network
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.api import ratelimit
+from app.api.ratelimit import Limit, MemoryBackend, PostgresBackend
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.hashing import hashing_pool
+from app.main import app
+from tests.utils.utils import random_email, random_lower_string
+
+
+@pytest.fixture
+def rate_limits(monkeypatch: pytest.MonkeyPatch) -> Generator[None, None, None]:
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "backend", MemoryBackend())
+    yield
+
+
+@pytest.mark.usefixtures("rate_limits")
+def test_login_limited_per_email_before_hashing(client: TestClient) -> None:
+    data = {"username": random_email(), "password": random_lower_string()}
+    for _ in range(5):
+        r = client.post(f"{settings.API_V1_STR}/login/access-token", data=data)
+        assert r.status_code == 400
+    completed = hashing_pool.stats().completed
+    r = client.post(f"{settings.API_V1_STR}/login/access-token", data=data)
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) > 0
+    assert hashing_pool.stats().completed == completed
+
+    # Other emails still have their own bucket
+    data["username"] = random_email()
+    r = client.post(f"{settings.API_V1_STR}/login/access-token", data=data)
+    assert r.status_code == 400
+
+
+@pytest.mark.usefixtures("rate_limits")
+def test_login_limited_per_ip(client: TestClient) -> None:
+    statuses = [
+        client.post(
+            f"{settings.API_V1_STR}/login/access-token",
+            data={"username": random_email(), "password": random_lower_string()},
+        ).status_code
+        for _ in range(22)
+    ]
+    # The bucket refills by a token every 3 seconds while the logins run
+    assert statuses[:20] == [400] * 20
+    assert statuses[-1] == 429
+
+
+def test_long_email_limited_by_postgres_backend(
+    client: TestClient, db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "backend", PostgresBackend())
+    # Longer than ratelimitbucket.key, the backend must not fail open on it
+    data = {"username": "a" * 250 + random_email(), "password": "x" * 8}
+    statuses = [
+        client.post(f"{settings.API_V1_STR}/login/access-token", data=data).status_code
+        for _ in range(6)
+    ]
+    assert statuses[-1] == 429
+
+    db.execute(text("DELETE FROM ratelimitbucket WHERE key LIKE 'login:%'"))
+    db.commit()
+
+
+@pytest.mark.usefixtures("rate_limits")
+def test_clients_behind_trusted_proxy_limited_apart(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "TRUSTED_PROXIES", [ip_network("172.16.0.0/12")])
+    proxy = TestClient(app, client=("172.18.0.2", 50000))
+    url = f"{settings.API_V1_STR}/password-recovery/"
+
+    def recover(forwarded_for: str) -> int:
+        headers = {"X-Forwarded-For": forwarded_for}
+        # A new email each time, only the IP limit applies
+        email = random_email()
+        r = proxy.post(f"{url}{email}", headers=headers)
+        return r.status_code
+
+    for _ in range(5):
+        assert recover("203.0.113.1") == 200
+    assert recover("203.0.113.1") == 429
+    # Another client through the same proxy has its own bucket
+    assert recover("203.0.113.2") == 200
+    # Spoofed hops the client prepends are skipped
+    assert recover("203.0.113.2, 203.0.113.1") == 429
+
+    # Untrusted peers are the client themselves, whatever they forward
+    monkeypatch.setattr(settings, "TRUSTED_PROXIES", [])
+    statuses = [recover(f"203.0.113.{i}") for i in range(10, 16)]
+    assert statuses == [200] * 5 + [429]
+
+
+@pytest.mark.usefixtures("rate_limits")
+def test_password_recovery_limited_per_email(client: TestClient) -> None:
+    email = random_email()
+    statuses = [
+        client.post(f"{settings.API_V1_STR}/password-recovery/{email}").status_code
+        for _ in range(4)
+    ]
+    assert statuses == [200, 200, 200, 429]
+
+
+@pytest.mark.usefixtures("rate_limits")
+def test_update_password_limited_per_user(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    superuser_token_headers: dict[str, str],
+) -> None:
+    data = {"current_password": "wrong-password", "new_password": "new-password"}
+    for _ in range(5):
+        r = client.patch(
+            f"{settings.API_V1_STR}/users/me/password",
+            headers=normal_user_token_headers,
+            json=data,
+        )
+        assert r.status_code == 400
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me/password",
+        headers=normal_user_token_headers,
+        json=data,
+    )
+    assert r.status_code == 429
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me/password",
+        headers=superuser_token_headers,
+        json=data,
+    )
+    assert r.status_code == 400
+
+
+@pytest.mark.usefixtures("rate_limits")
+def test_user_search_limited_per_user(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    superuser_token_headers: dict[str, str],
+) -> None:
+    url = f"{settings.API_V1_STR}/users/search"
+    for i in range(60):
+        r = client.get(
+            url, headers=normal_user_token_headers, params={"prefix": f"{i:03}"}
+        )
+        assert r.status_code == 200
+    r = client.get(url, headers=normal_user_token_headers, params={"prefix": "abc"})
+    assert r.status_code == 429
+    r = client.get(url, headers=superuser_token_headers, params={"prefix": "abc"})
+    assert r.status_code == 200
+
+
+def test_rate_limits_disabled(client: TestClient) -> None:
+    email = random_email()
+    for _ in range(5):
+        r = client.post(f"{settings.API_V1_STR}/password-recovery/{email}")
+        assert r.status_code == 200
+
+
+def test_memory_backend_refills() -> None:
+    backend = MemoryBackend()
+    limit = Limit("ip", 2, 0.1)
+    assert asyncio.run(backend.take("key", limit)) == 0
+    assert asyncio.run(backend.take("key", limit)) == 0
+    retry_after = asyncio.run(backend.take("key", limit))
+    assert 0 < retry_after <= 0.05
+    asyncio.run(asyncio.sleep(retry_after))
+    assert asyncio.run(backend.take("key", limit)) == 0
+
+
+def test_postgres_backend_is_shared(db: Session) -> None:
+    key = f"test:ip:{random_lower_string()}"
+    limit = Limit("ip", 2, 60)
+
+    async def take_from_two_workers() -> list[float]:
+        first, second = PostgresBackend(), PostgresBackend()
+        try:
+            return [
+                await first.take(key, limit),
+                await second.take(key, limit),
+                await first.take(key, limit),
+            ]
+        finally:
+            await async_engine.dispose()
+
+    first, second, third = asyncio.run(take_from_two_workers())
+    assert first == second == 0
+    assert 29 < third <= 30
+
+    db.execute(text("DELETE FROM ratelimitbucket WHERE key = :key"), {"key": key})
+    db.commit()
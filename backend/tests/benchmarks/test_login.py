@@ -0,0 +1,24 @@
+from app.benchmarks.login import Candidate, Latency, percentile, select_params
+
+
+def test_percentile() -> None:
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 99) == 99
+    assert percentile([3.0], 99) == 3.0
+
+
+def test_select_params_prefers_strongest_within_target() -> None:
+    candidates = [
+        Candidate(1, 19456, Latency(p50_ms=20, p99_ms=25)),
+        Candidate(2, 65536, Latency(p50_ms=90, p99_ms=110)),
+        Candidate(3, 47104, Latency(p50_ms=80, p99_ms=95)),
+        Candidate(4, 131072, Latency(p50_ms=300, p99_ms=320)),
+    ]
+    selected = select_params(candidates, target_p99_ms=100)
+    assert [(c.time_cost, c.memory_cost) for c in selected] == [(3, 47104), (1, 19456)]
+
+
+def test_select_params_nothing_within_target() -> None:
+    candidates = [Candidate(1, 19456, Latency(p50_ms=20, p99_ms=25))]
+    assert select_params(candidates, target_p99_ms=10) == []
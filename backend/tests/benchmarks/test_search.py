@@ -0,0 +1,15 @@
+from app.benchmarks.search import queries, vocabulary
+
+
+def test_vocabulary_is_the_same_every_run() -> None:
+    words = vocabulary(100)
+    assert words == vocabulary(100)
+    assert len(set(words)) == 100
+
+
+def test_queries_use_seeded_words() -> None:
+    words = set(vocabulary(20_000))
+    q = queries()
+    assert q["common word"] in words
+    assert q["rare word"] in words
+    assert q["no match"] not in words
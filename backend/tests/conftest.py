@@ -26,6 +26,12 @@ def db() -> Generator[Session, None, None]:
         session.commit()
 
 
+@pytest.fixture(scope="session", autouse=True)
+def disable_rate_limits() -> None:
+    # Tests log in far more often than the policies allow, see test_ratelimit.py
+    settings.RATE_LIMIT_ENABLED = False
+
+
 @pytest.fixture(scope="module")
 def client() -> Generator[TestClient, None, None]:
     with TestClient(app) as c:
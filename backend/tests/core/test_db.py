@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.core import db
+from app.core.config import settings
+from app.core.db import InstrumentedQueuePool, get_pool_stats
+
+
+def test_pool_stats_count_checkouts_and_timeouts() -> None:
+    engine = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    try:
+        with engine.connect():
+            stats = get_pool_stats(engine)
+            assert stats.checked_out == 1
+            assert stats.idle == 0
+            with pytest.raises(PoolTimeoutError):
+                engine.connect()
+        engine.dispose()
+
+        stats = get_pool_stats(engine)
+        assert stats.checked_out == 0
+        assert stats.checkouts == 1
+        assert stats.timeouts == 1
+        assert stats.wait_seconds_max > 0
+    finally:
+        engine.dispose()
+
+
+def test_worker_connections_fit_max_connections() -> None:
+    # Both engines hold connections in either mode, together they stay within
+    # the worker's share
+    available = settings.POSTGRES_MAX_CONNECTIONS - settings.DB_RESERVED_CONNECTIONS
+    per_worker = available // settings.WEB_CONCURRENCY
+    connections = 0
+    for engine in (db.engine, db.async_engine):
+        stats = get_pool_stats(engine)
+        connections += stats.pool_size + stats.max_overflow
+    assert connections <= per_worker
+    secondary = db.engine if settings.DB_ASYNC else db.async_engine
+    stats = get_pool_stats(secondary)
+    assert stats.pool_size + stats.max_overflow == settings.DB_SECONDARY_POOL_SIZE
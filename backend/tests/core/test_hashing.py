@@ -0,0 +1,52 @@
+import pytest
+
+from app.core.hashing import HashingPool, HashingPoolBusyError
+from app.core.security import _get_password_hash, _verify_password
+
+
+def test_hashing_pool_runs_in_worker_process() -> None:
+    pool = HashingPool(workers=1, queue_limit=4)
+    try:
+        hashed = pool.run(_get_password_hash, "password123")
+        verified, updated_hash = pool.run(_verify_password, "password123", hashed)
+    finally:
+        pool.shutdown()
+    assert verified
+    assert updated_hash is None
+    stats = pool.stats()
+    assert stats.completed == 2
+    assert stats.queue_depth == 0
+    assert stats.latency_seconds_max > 0
+
+
+def test_hashing_pool_inline() -> None:
+    pool = HashingPool(workers=0, queue_limit=4)
+    assert pool.run(_get_password_hash, "password123").startswith("$argon2")
+    assert pool.stats().completed == 1
+
+
+def test_hashing_pool_rejects_when_queue_full() -> None:
+    pool = HashingPool(workers=0, queue_limit=0)
+    with pytest.raises(HashingPoolBusyError):
+        pool.run(_get_password_hash, "password123")
+    assert pool.stats().rejected == 1
+
+
+def test_hashing_pool_map_waits_for_room_in_queue() -> None:
+    pool = HashingPool(workers=1, queue_limit=1)
+    try:
+        # More jobs in flight than the queue allows wait instead of failing
+        results = pool.map(abs, [-5, -4, -3, -2, -1], chunksize=2, in_flight=3)
+    finally:
+        pool.shutdown()
+    assert results == [5, 4, 3, 2, 1]
+    stats = pool.stats()
+    assert stats.completed == 3
+    assert stats.rejected == 0
+    assert stats.queue_depth == 0
+
+
+def test_hashing_pool_map_inline() -> None:
+    pool = HashingPool(workers=1, queue_limit=1)
+    assert pool.map(abs, [-1, -2], chunksize=8, in_flight=0) == [1, 2]
+    assert pool.stats().completed == 0
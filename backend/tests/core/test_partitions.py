@@ -0,0 +1,134 @@
+import time
+from collections.abc import Generator
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.partitions import (
+    create_partition,
+    drop_partitions,
+    get_partitions,
+    maintain_partitions,
+)
+from app.models import (
+    Notification,
+    NotificationCounter,
+    NotificationType,
+    uuid7,
+    uuid7_time,
+)
+from tests.utils.user import create_random_user
+
+# Far from the months the rest of the tests write to
+PAST = date(2001, 1, 1)
+FUTURE = date(2031, 5, 1)
+
+
+@pytest.fixture
+def cleanup(db: Session) -> Generator[None, None, None]:
+    yield
+    db.rollback()
+    db.execute(
+        text("DELETE FROM notification WHERE created_at < '2002-01-01'"),
+    )
+    db.execute(
+        text("DELETE FROM notification WHERE created_at >= '2031-01-01'"),
+    )
+    for month, name in get_partitions(db).items():
+        if month.year in (PAST.year, FUTURE.year):
+            db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
+
+
+def partition_of(db: Session, notification: Notification) -> str:
+    return db.execute(
+        text("SELECT tableoid::regclass::text FROM notification WHERE id = :id"),
+        {"id": notification.id},
+    ).scalar_one()
+
+
+def unread_count(db: Session, notification: Notification) -> int:
+    db.expire_all()
+    counter = db.get(NotificationCounter, notification.user_id)
+    return counter.unread if counter else 0
+
+
+@pytest.mark.usefixtures("cleanup")
+def test_partitions_created_ahead(db: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "NOTIFICATION_PARTITIONS_AHEAD", 1)
+    user, _ = create_random_user(db)
+    # Lands in the default partition until its month is created
+    early = Notification(
+        user_id=user.id,
+        type=NotificationType.MENTION,
+        message="",
+        created_at=datetime(2031, 6, 15, tzinfo=timezone.utc),
+    )
+    db.add(early)
+    db.commit()
+    assert partition_of(db, early) == "notification_default"
+
+    created, dropped = maintain_partitions(db, today=FUTURE.replace(day=17))
+    assert created == ["notification_p2031_05", "notification_p2031_06"]
+    assert dropped == []
+    assert partition_of(db, early) == "notification_p2031_06"
+    assert unread_count(db, early) == 1
+
+    created, _ = maintain_partitions(db, today=FUTURE)
+    assert created == []
+
+
+@pytest.mark.usefixtures("cleanup")
+def test_retention_drops_whole_partitions(db: Session) -> None:
+    for month in (1, 2, 3):
+        create_partition(db, PAST.replace(month=month))
+    db.commit()
+    user, _ = create_random_user(db)
+    notifications = [
+        Notification(
+            user_id=user.id,
+            type=NotificationType.MENTION,
+            message="",
+            created_at=datetime(year, month, 10, tzinfo=timezone.utc),
+        )
+        for year, month in ((2000, 6), (2001, 1), (2001, 2), (2001, 3))
+    ]
+    db.add_all(notifications)
+    db.commit()
+    assert unread_count(db, notifications[0]) == 4
+
+    dropped = drop_partitions(db, before=PAST.replace(month=3))
+    db.commit()
+    assert dropped == ["notification_p2001_01", "notification_p2001_02"]
+    # The default partition's old row is deleted, and every dropped one uncounted
+    assert partition_of(db, notifications[3]) == "notification_p2001_03"
+    remaining = db.execute(
+        text("SELECT count(*) FROM notification WHERE user_id = :id"),
+        {"id": user.id},
+    ).scalar_one()
+    assert remaining == 1
+    assert unread_count(db, notifications[0]) == 1
+
+
+def test_uuid7_layout() -> None:
+    before = time.time_ns() // 1_000_000
+    ids = [uuid7() for _ in range(100)]
+    after = time.time_ns() // 1_000_000
+    for id in ids:
+        assert id.version == 7
+        # The RFC variant, 0b10
+        assert id.int >> 62 & 0x3 == 0x2
+        assert before <= id.int >> 80 <= after
+        created_at = uuid7_time(id)
+        assert created_at is not None
+        assert created_at.tzinfo == timezone.utc
+        assert created_at.timestamp() * 1000 == pytest.approx(id.int >> 80)
+    assert len(set(ids)) == len(ids)
+    # Random bits below the timestamp
+    assert len({id.int & (1 << 62) - 1 for id in ids}) == len(ids)
+    # Made for a given time, e.g. a backdated created_at
+    at = datetime(2031, 6, 15, 12, 30, 1, 250000, tzinfo=timezone.utc)
+    assert uuid7_time(uuid7(at)) == at
@@ -1,8 +1,10 @@
 from fastapi.encoders import jsonable_encoder
+from pwdlib.hashers.argon2 import Argon2Hasher
 from pwdlib.hashers.bcrypt import BcryptHasher
 from sqlmodel import Session
 
 from app import crud
+from app.core.config import settings
 from app.core.security import verify_password
 from app.models import User, UserCreate, UserUpdate
 from tests.utils.utils import random_email, random_lower_string
@@ -128,3 +130,22 @@ def test_authenticate_user_with_bcrypt_upgrades_to_argon2(db: Session) -> None:
     assert verified
     # Should not need another update since it's already argon2
     assert updated_hash is None
+
+
+def test_authenticate_user_with_weaker_argon2_cost_is_rehashed(db: Session) -> None:
+    """Test that hashes made with outdated Argon2 parameters are upgraded on login."""
+    email = random_email()
+    password = random_lower_string()
+    weak_hash = Argon2Hasher(time_cost=1, memory_cost=8192).hash(password)
+    user = User(email=email, hashed_password=weak_hash)
+    db.add(user)
+    db.commit()
+
+    authenticated_user = crud.authenticate(session=db, email=email, password=password)
+    assert authenticated_user
+    db.refresh(authenticated_user)
+    assert authenticated_user.hashed_password != weak_hash
+    assert (
+        f"m={settings.ARGON2_MEMORY_COST},t={settings.ARGON2_TIME_COST}"
+        in authenticated_user.hashed_password
+    )
@@ -0,0 +1,30 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.import_users import main
+from tests.utils.utils import random_email, random_lower_string
+
+
+def test_import_users_script(
+    db: Session,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.setattr(settings, "USER_IMPORT_HASH_WORKERS", 0)
+    email = random_email()
+    path = tmp_path / "users.txt"
+    path.write_text(json.dumps({"email": email, "password": random_lower_string()}))
+    monkeypatch.setattr(sys, "argv", ["import_users", str(path), "--format", "ndjson"])
+
+    main()
+
+    [result] = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert result["status"] == "created"
+    assert crud.get_user_by_email(session=db, email=email)
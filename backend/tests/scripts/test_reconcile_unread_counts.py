@@ -0,0 +1,46 @@
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.models import Notification, NotificationCounter, NotificationType
+from app.reconcile_unread_counts import reconcile
+from tests.utils.user import create_random_user
+
+
+def test_reconcile_repairs_drift(db: Session) -> None:
+    drifted, _ = create_random_user(db)
+    missing, _ = create_random_user(db)
+    for user in (drifted, missing):
+        db.add_all(
+            Notification(user_id=user.id, type=NotificationType.MENTION, message="")
+            for _ in range(2)
+        )
+    db.commit()
+    db.execute(
+        text("UPDATE notificationcounter SET unread = 7 WHERE user_id = :id"),
+        {"id": drifted.id},
+    )
+    db.execute(
+        text("DELETE FROM notificationcounter WHERE user_id = :id"),
+        {"id": missing.id},
+    )
+    db.commit()
+
+    assert set(reconcile(db)) == {drifted.id, missing.id}
+    for user in (drifted, missing):
+        counter = db.exec(
+            select(NotificationCounter.unread).where(
+                NotificationCounter.user_id == user.id
+            )
+        ).one()
+        assert counter == 2
+    assert reconcile(db) == []
+
+
+def test_deleting_user_drops_counter(db: Session) -> None:
+    user, _ = create_random_user(db)
+    db.add(Notification(user_id=user.id, type=NotificationType.MENTION, message=""))
+    db.commit()
+    db.delete(user)
+    db.commit()
+    counter = db.get(NotificationCounter, user.id)
+    assert counter is None
@@ -0,0 +1,28 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from sqlalchemy import Engine, event
+
+
+@contextmanager
+def query_budget(budget: int) -> Iterator[list[str]]:
+    """
+    Fail if the block runs more than budget SQL statements, on any engine and in
+    any thread, e.g. the app's when called through the TestClient. Yields the
+    statements run so far.
+    """
+    statements: list[str] = []
+
+    def record(*args: Any) -> None:
+        statements.append(args[2])
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    assert len(statements) <= budget, (
+        f"{len(statements)} statements, over the budget of {budget}:\n"
+        + "\n\n".join(statements)
+    )
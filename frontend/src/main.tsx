@@ -18,6 +18,24 @@ OpenAPI.TOKEN = async () => {
   return localStorage.getItem("access_token") || ""
 }
 
+// After a write the API answers with until when reads must skip the database
+// replicas, sent back so that any backend worker sees the write
+const READ_YOUR_WRITES = "x-read-your-writes-until"
+OpenAPI.interceptors.response.use((response) => {
+  const until = response.headers[READ_YOUR_WRITES]
+  if (until) {
+    localStorage.setItem(READ_YOUR_WRITES, until)
+  }
+  return response
+})
+OpenAPI.interceptors.request.use((config) => {
+  const until = localStorage.getItem(READ_YOUR_WRITES)
+  if (until && Number(until) * 1000 > Date.now()) {
+    config.headers = { ...config.headers, [READ_YOUR_WRITES]: until }
+  }
+  return config
+})
+
 const handleApiError = (error: Error) => {
   if (error instanceof ApiError && [401, 403].includes(error.status)) {
     localStorage.removeItem("access_token")